@@ -0,0 +1,63 @@
+"""
+Microbenchmark of the per-request overhead of role checks.
+
+Compares building a :class:`~flask_principal.Permission` per role on every
+request (what ``roles_required`` and ``roles_accepted`` used to do) against
+testing the :class:`RoleRules` compiled at decoration time.
+
+Usage::
+
+    python benchmarks/role_rules.py
+"""
+import timeit
+
+from flask import Flask, g
+from flask_principal import Identity, Permission, Principal, RoleNeed, UserNeed
+
+from flask_security_bundle.decorators.role_rules import RoleRules, _get_identity
+
+NUMBER = 20000
+
+
+def permission_per_role_required(roles):
+    for perm in [Permission(RoleNeed(role)) for role in roles]:
+        if not perm.can():
+            return False
+    return True
+
+
+def permission_per_role_accepted(roles):
+    return Permission(*[RoleNeed(role) for role in roles]).can()
+
+
+def bench(fn):
+    return timeit.timeit(fn, number=NUMBER) / NUMBER * 1e6
+
+
+def main():
+    app = Flask(__name__)
+    Principal(app, use_sessions=False)
+
+    with app.test_request_context():
+        for count in (1, 10, 100):
+            roles = ['ROLE_%d' % i for i in range(count)]
+            g.identity = Identity(1)
+            g.identity.provides.add(UserNeed(1))
+            g.identity.provides.update(RoleNeed(role) for role in roles)
+
+            required, accepted = RoleRules(required=roles), RoleRules(one_of=roles)
+            # put the only matching role last for the worst case of roles_accepted
+            g.identity.provides.difference_update(RoleNeed(r) for r in roles[:-1])
+            old_accepted = bench(lambda: permission_per_role_accepted(roles))
+            new_accepted = bench(lambda: accepted.allows(_get_identity()))
+            g.identity.provides.update(RoleNeed(role) for role in roles)
+            old_required = bench(lambda: permission_per_role_required(roles))
+            new_required = bench(lambda: required.allows(_get_identity()))
+
+            print(f'{count:>3} roles  '
+                  f'roles_required: {old_required:8.2f}us -> {new_required:6.2f}us  '
+                  f'roles_accepted: {old_accepted:8.2f}us -> {new_accepted:6.2f}us')
+
+
+if __name__ == '__main__':
+    main()
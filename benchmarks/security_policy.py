@@ -0,0 +1,89 @@
+"""
+Microbenchmark of the per-call config overhead of ``hash_password`` (before the
+actual hashing) and ``get_token_status`` (before loading the token).
+
+Compares looking up, validating and parsing the settings from the app config on
+every call (what ``SecurityUtilsService`` used to do) against reading them from
+the :class:`SecurityPolicy` built once by ``Security.init_app``.
+
+Usage::
+
+    python benchmarks/security_policy.py
+"""
+import base64
+import hashlib
+import hmac
+import timeit
+
+from datetime import timedelta
+from flask import Flask, current_app
+
+from flask_security_bundle.policy import SecurityPolicy
+
+NUMBER = 100000
+
+CONFIG = dict(
+    SECRET_KEY='not-so-secret',
+    SECURITY_PASSWORD_HASH='bcrypt',
+    SECURITY_PASSWORD_SALT='security-password-salt',
+    SECURITY_PASSWORD_SINGLE_HASH=False,
+    SECURITY_PASSWORD_HASH_OPTIONS={'bcrypt': {'rounds': 12}},
+    SECURITY_CONFIRM_EMAIL_WITHIN='5 days',
+    SECURITY_RESET_PASSWORD_WITHIN='5 days',
+)
+
+
+def config_hash_password_overhead(password):
+    single_hash = current_app.config.get('SECURITY_PASSWORD_SINGLE_HASH')
+    salt = current_app.config.get('SECURITY_PASSWORD_SALT')
+    if single_hash and salt:
+        raise RuntimeError()
+    is_plaintext = current_app.config.get('SECURITY_PASSWORD_HASH') == 'plaintext'
+    if not (is_plaintext or single_hash):
+        h = hmac.new(salt.encode('utf-8'), password.encode('utf-8'), hashlib.sha512)
+        password = base64.b64encode(h.digest()).decode('ascii')
+    options = current_app.config.get('SECURITY_PASSWORD_HASH_OPTIONS').get(
+        current_app.config.get('SECURITY_PASSWORD_HASH'), {})
+    return password, options
+
+
+def policy_hash_password_overhead(policy, password):
+    if policy.double_hash:
+        h = hmac.new(policy.password_salt, password.encode('utf-8'), hashlib.sha512)
+        password = base64.b64encode(h.digest()).decode('ascii')
+    return password, policy.hash_options
+
+
+def config_token_max_age(key):
+    values = current_app.config.get(key).split()
+    td = timedelta(**{values[1]: int(values[0])})
+    return td.seconds + td.days * 24 * 3600
+
+
+def policy_token_max_age(policy, key):
+    return policy.max_ages[key]
+
+
+def bench(fn):
+    return timeit.timeit(fn, number=NUMBER) / NUMBER * 1e6
+
+
+def main():
+    app = Flask(__name__)
+    app.config.update(CONFIG)
+
+    with app.app_context():
+        policy = SecurityPolicy.from_config(app.config)
+        key = 'SECURITY_RESET_PASSWORD_WITHIN'
+
+        old_hash = bench(lambda: config_hash_password_overhead('password'))
+        new_hash = bench(lambda: policy_hash_password_overhead(policy, 'password'))
+        old_status = bench(lambda: config_token_max_age(key))
+        new_status = bench(lambda: policy_token_max_age(policy, key))
+
+    print(f'hash_password overhead:    {old_hash:6.2f}us -> {new_hash:6.2f}us')
+    print(f'get_token_status overhead: {old_status:6.2f}us -> {new_status:6.2f}us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark of token sizes and ``dumps``/``loads`` throughput.
+
+Compares the default JSON payloads of itsdangerous' ``URLSafeTimedSerializer``
+against the :class:`CompactSerializer` enabled by
+``SECURITY_TOKEN_SERIALIZER = 'compact'``, for each kind of token the bundle
+issues.
+
+Usage::
+
+    python benchmarks/token_codec.py
+"""
+import timeit
+
+from itsdangerous import URLSafeTimedSerializer
+from passlib.hash import sha512_crypt
+
+from flask_security_bundle.codec import CompactSerializer
+
+NUMBER = 20000
+
+SECRET_KEY = 'not-so-secret'
+
+HMAC = 'q5b0pG2x8mR1dXk4ZcVt0w'  # a truncated, urlsafe Base64 HMAC+SHA256
+
+TOKENS = {
+    'legacy auth': ['1234', sha512_crypt.using(rounds=5000).hash('password-hash')],
+    'hmac-v2 auth': ['v2', '1234', HMAC],
+    'hmac-v2 auth + claims': ['v2', '1234', HMAC,
+                              {'roles': ['ROLE_ADMIN', 'ROLE_USER'],
+                               'roles_version': '5f3c9a1b'}],
+    'confirm email': ['1234', sha512_crypt.using(rounds=5000).hash('a@example.com')],
+    'reset password': ['1234', HMAC],
+}
+
+
+def bench(fn):
+    return timeit.timeit(fn, number=NUMBER) / NUMBER * 1e6
+
+
+def main():
+    json_serializer = URLSafeTimedSerializer(SECRET_KEY, salt='remember-salt')
+    compact_serializer = URLSafeTimedSerializer(SECRET_KEY, salt='remember-salt',
+                                                serializer=CompactSerializer())
+
+    print(f'{"":<22} {"size (bytes)":>15}   {"dumps (us)":>17}   {"loads (us)":>17}')
+    for name, data in TOKENS.items():
+        json_token = json_serializer.dumps(data)
+        compact_token = compact_serializer.dumps(data)
+        assert compact_serializer.loads(compact_token) == data
+
+        json_dumps = bench(lambda: json_serializer.dumps(data))
+        compact_dumps = bench(lambda: compact_serializer.dumps(data))
+        json_loads = bench(lambda: json_serializer.loads(json_token))
+        compact_loads = bench(lambda: compact_serializer.loads(compact_token))
+
+        print(f'{name:<22} {len(json_token):>6} -> {len(compact_token):>5}   '
+              f'{json_dumps:>6.2f} -> {compact_dumps:>6.2f}   '
+              f'{json_loads:>6.2f} -> {compact_loads:>6.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -18,15 +18,17 @@ from .decorators import (
     auth_required,
     auth_required_same_user,
 )
-from .models import AnonymousUser, User, Role, UserRole
-from .services import SecurityService, UserManager, RoleManager
+from .models import AnonymousUser, ApiKey, User, Role, UserRole, UserSession
+from .services import (ApiKeyService, SecurityService, UserManager, RoleManager,
+                       RoleRegistry, UserSessionService)
 from .signals import (user_registered, user_confirmed, confirm_instructions_sent,
                       login_instructions_sent, password_reset, password_changed,
-                      reset_password_instructions_sent)
+                      reset_password_instructions_sent, login_shed, roles_changed)
+from .user_cache import UserCache, LocalUserCache, SharedUserCache
 from .utils import current_user
 from .views import SecurityController, UserResource
 
 
 class FlaskSecurityBundle(Bundle):
     blueprint_names = []
-    command_group_names = ['users', 'roles']
+    command_group_names = ['users', 'roles', 'security']
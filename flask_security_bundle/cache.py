@@ -0,0 +1,116 @@
+import time
+
+from collections import OrderedDict
+from threading import RLock
+from typing import *
+
+
+class TTLCache:
+    """
+    A thread-safe, in-process cache with least-recently-used eviction and a
+    per-entry time-to-live. Keeps track of hit and miss counts.
+
+    A ``maxsize`` of zero (or ``None``) disables the cache entirely: every
+    :meth:`get` misses (without being counted) and :meth:`set` does nothing.
+
+    :param maxsize: The maximum number of entries to keep.
+    :param ttl: The number of seconds an entry stays valid for.
+    :param timer: The clock to use. Defaults to :func:`time.monotonic`.
+    """
+    def __init__(self,
+                 maxsize: Optional[int] = 1024,
+                 ttl: Optional[float] = 300,
+                 timer: Callable[[], float] = time.monotonic,
+                 ):
+        self.maxsize = maxsize or 0
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = RLock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key, default=None):
+        """
+        Returns the value for ``key`` if present and not yet expired, otherwise
+        ``default``.
+        """
+        if not self.enabled:
+            return default
+
+        with self._lock:
+            try:
+                expires_at, value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires_at is not None and expires_at <= self.timer():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value) -> None:
+        """
+        Store ``value`` for ``key``, evicting the least recently used entry if
+        the cache is full.
+        """
+        if not self.enabled:
+            return
+
+        expires_at = self.timer() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key) -> bool:
+        """
+        Remove the entry for ``key``. Returns whether or not it was present.
+        """
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def delete_where(self, predicate: Callable[[Any, Any], bool]) -> int:
+        """
+        Remove every entry for which ``predicate(key, value)`` returns ``True``.
+        Returns the number of entries removed.
+        """
+        with self._lock:
+            keys = [key for key, (_, value) in self._data.items()
+                    if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        """
+        Remove all entries (the hit and miss counts are left as-is).
+        """
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns a dictionary of the ``hits``, ``misses``, current ``size`` and
+        ``maxsize`` of the cache.
+        """
+        return dict(hits=self.hits, misses=self.misses,
+                    size=len(self), maxsize=self.maxsize)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+        return entry is not None and (entry[0] is None or entry[0] > self.timer())
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,197 @@
+import base64
+import json
+import re
+
+from typing import *
+
+# the first byte of compact payloads (JSON payloads start with ``[`` or ``{``)
+_VERSION = b'\x01'
+
+(_NONE, _FALSE, _TRUE, _INT, _STR, _NUMERIC_STR, _BASE64_STR, _CRYPT_STR,
+ _LIST, _DICT) = range(10)
+
+_NUMERIC_RE = re.compile(r'(0|[1-9][0-9]*)\Z')
+_BASE64_RE = re.compile(r'[A-Za-z0-9_-]{8,}\Z')
+
+# the "hash64" alphabet of crypt hash checksums, and the (standard) Base64
+# characters with the same 6 bit values, so checksums can be packed by base64
+_HASH64 = './0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+_BASE64 = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
+_HASH64_TO_BASE64 = str.maketrans(_HASH64, _BASE64)
+_BASE64_TO_HASH64 = str.maketrans(_BASE64, _HASH64)
+_CRYPT_RE = re.compile(r'(.*)\$([./0-9A-Za-z]{8,})\Z', re.DOTALL)
+
+
+class CompactSerializer:
+    """
+    A binary replacement for the JSON serializer of itsdangerous' serializers,
+    for shorter (and faster to load) tokens. Token data is packed into a tagged
+    layout of varints and length-prefixed strings, and strings that are decimal
+    numbers (eg user ids) or unpadded urlsafe Base64 (eg HMACs and roles
+    versions) are stored as the integer or bytes they represent, as are the
+    checksums of crypt hashes (eg ``$6$rounds=5000$<salt>$<checksum>``).
+
+    Payloads starting with ``[`` or ``{`` are loaded as JSON, so that tokens
+    issued before switching ``SECURITY_TOKEN_SERIALIZER`` stay valid.
+    """
+    def dumps(self, obj) -> bytes:
+        buf = bytearray(_VERSION)
+        _pack(obj, buf)
+        return bytes(buf)
+
+    def loads(self, data: bytes):
+        if data[:1] in (b'[', b'{'):
+            return json.loads(data.decode('utf-8'))
+        if data[:1] != _VERSION:
+            raise ValueError('Unknown payload version')
+
+        obj, pos = _unpack(data, 1)
+        if pos != len(data):
+            raise ValueError('Unexpected trailing data')
+        return obj
+
+
+def _pack(obj, buf: bytearray) -> None:
+    if obj is None:
+        buf.append(_NONE)
+    elif obj is True or obj is False:
+        buf.append(_TRUE if obj else _FALSE)
+    elif isinstance(obj, int):
+        buf.append(_INT)
+        _pack_varint(obj << 1 if obj >= 0 else (-obj << 1) - 1, buf)  # zigzag
+    elif isinstance(obj, str):
+        _pack_str(obj, buf)
+    elif isinstance(obj, (list, tuple)):
+        buf.append(_LIST)
+        _pack_varint(len(obj), buf)
+        for item in obj:
+            _pack(item, buf)
+    elif isinstance(obj, dict):
+        buf.append(_DICT)
+        _pack_varint(len(obj), buf)
+        for key, value in obj.items():
+            _pack_str(str(key), buf)
+            _pack(value, buf)
+    else:
+        raise TypeError(f'Cannot serialize objects of type {type(obj).__name__}')
+
+
+def _pack_str(value: str, buf: bytearray) -> None:
+    if _NUMERIC_RE.match(value):
+        buf.append(_NUMERIC_STR)
+        _pack_varint(int(value), buf)
+        return
+
+    raw = _decode_base64(value)
+    if raw is not None:
+        buf.append(_BASE64_STR)
+        _pack_bytes(raw, buf)
+        return
+
+    match = _CRYPT_RE.match(value) if '$' in value else None
+    if match:
+        head, checksum = match.groups()
+        padding = '.' * (-len(checksum) % 4)  # leading zeros
+        buf.append(_CRYPT_STR)
+        _pack_bytes(head.encode('utf-8'), buf)
+        _pack_varint(len(checksum), buf)
+        buf += base64.b64decode((padding + checksum).translate(_HASH64_TO_BASE64))
+        return
+
+    buf.append(_STR)
+    _pack_bytes(value.encode('utf-8'), buf)
+
+
+def _pack_bytes(raw: bytes, buf: bytearray) -> None:
+    _pack_varint(len(raw), buf)
+    buf += raw
+
+
+def _unpack(data: bytes, pos: int) -> Tuple[Any, int]:
+    tag = data[pos]
+    pos += 1
+    if tag == _NONE:
+        return None, pos
+    elif tag == _FALSE or tag == _TRUE:
+        return tag == _TRUE, pos
+    elif tag == _INT:
+        value, pos = _unpack_varint(data, pos)
+        return (value >> 1 if not value & 1 else -((value + 1) >> 1)), pos
+    elif tag == _NUMERIC_STR:
+        value, pos = _unpack_varint(data, pos)
+        return str(value), pos
+    elif tag == _STR:
+        raw, pos = _unpack_bytes(data, pos)
+        return raw.decode('utf-8'), pos
+    elif tag == _BASE64_STR:
+        raw, pos = _unpack_bytes(data, pos)
+        return _encode_base64(raw), pos
+    elif tag == _CRYPT_STR:
+        head, pos = _unpack_bytes(data, pos)
+        length, pos = _unpack_varint(data, pos)
+        padding = -length % 4
+        size = (length + padding) * 3 // 4
+        if len(data) < pos + size:
+            raise ValueError('Truncated payload')
+        checksum = base64.b64encode(data[pos:pos + size]).decode('ascii') \
+            .translate(_BASE64_TO_HASH64)[padding:]
+        return f'{head.decode("utf-8")}${checksum}', pos + size
+    elif tag == _LIST:
+        count, pos = _unpack_varint(data, pos)
+        items = []
+        for _ in range(count):
+            item, pos = _unpack(data, pos)
+            items.append(item)
+        return items, pos
+    elif tag == _DICT:
+        count, pos = _unpack_varint(data, pos)
+        obj = {}
+        for _ in range(count):
+            key, pos = _unpack(data, pos)
+            obj[key], pos = _unpack(data, pos)
+        return obj, pos
+    raise ValueError(f'Unknown tag {tag}')
+
+
+def _unpack_bytes(data: bytes, pos: int) -> Tuple[bytes, int]:
+    length, pos = _unpack_varint(data, pos)
+    raw = data[pos:pos + length]
+    if len(raw) != length:
+        raise ValueError('Truncated payload')
+    return raw, pos + length
+
+
+def _pack_varint(value: int, buf: bytearray) -> None:
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _unpack_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _decode_base64(value: str) -> Union[bytes, None]:
+    """
+    Returns the bytes the (unpadded, urlsafe) Base64 string represents, or
+    ``None`` if it isn't one (or wouldn't encode back to exactly the same string).
+    """
+    if len(value) % 4 == 1 or not _BASE64_RE.match(value):
+        return None
+    raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+    return raw if _encode_base64(raw) == value else None
+
+
+def _encode_base64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+compact_serializer = CompactSerializer()
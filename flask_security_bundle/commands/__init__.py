@@ -1,2 +1,3 @@
 from .roles import roles
+from .security import security
 from .users import users
@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from flask_unchained import unchained
+from flask_unchained.cli import cli, click
+from flask_unchained.commands.utils import print_table
+from typing import *
+
+# the cost settings to try for each scheme, from cheapest to most expensive
+COST_SETTINGS = {
+    'argon2': [dict(time_cost=time_cost, memory_cost=memory_cost)
+               for time_cost, memory_cost in [(1, 32768), (2, 65536),
+                                              (2, 131072), (3, 262144)]],
+    'bcrypt': [dict(rounds=rounds) for rounds in range(10, 15)],
+    'pbkdf2_sha256': [dict(rounds=rounds)
+                      for rounds in (29000, 100000, 250000, 500000)],
+    'pbkdf2_sha512': [dict(rounds=rounds)
+                      for rounds in (25000, 100000, 250000, 500000)],
+}
+
+CALIBRATION_SECRET = 'correct horse battery staple'
+
+
+@cli.group()
+def security():
+    """
+    Security commands.
+    """
+
+
+@security.command(name='calibrate-hash')
+@click.option('--target-ms', default=250, type=float, show_default=True,
+              help='The latency budget (in milliseconds) for hashing a password.')
+@click.option('--scheme', 'schemes', multiple=True,
+              help='The scheme(s) to benchmark. Defaults to all of '
+                   '`SECURITY_PASSWORD_SCHEMES`.')
+@click.option('--concurrency', default='1,2,4', show_default=True,
+              help='Comma-separated list of concurrency levels to benchmark.')
+@click.option('--samples', default=5, type=int, show_default=True,
+              help='The number of hashes to time per thread.')
+def calibrate_hash(target_ms, schemes, concurrency, samples):
+    """
+    Benchmark and tune the password hashing schemes.
+    """
+    pwd_context = unchained.extensions.security.pwd_context
+    schemes = schemes or [scheme for scheme
+                          in current_app.config.get('SECURITY_PASSWORD_SCHEMES')
+                          if scheme != 'plaintext']
+    concurrency_levels = [int(x) for x in concurrency.split(',') if x.strip()]
+    cpu_count = os.cpu_count() or 1
+
+    rows = []
+    recommended = {}
+    for scheme in schemes:
+        handler = _get_handler(pwd_context, scheme)
+        if handler is None:
+            click.echo(f'Skipping {scheme}: no backend is available.')
+            continue
+
+        for settings in _get_cost_settings(handler):
+            hasher = handler.using(**settings)
+            for level in concurrency_levels:
+                latencies, elapsed = _benchmark(hasher.hash, level, samples)
+                p50 = _percentile(latencies, 50) * 1000
+                p99 = _percentile(latencies, 99) * 1000
+                per_core = len(latencies) / elapsed / min(level, cpu_count)
+                rows.append((scheme, _format_settings(settings), level,
+                             p50, p99, per_core))
+
+                # recommend the most expensive settings that an uncontended
+                # hash can run at within the budget
+                if level == min(concurrency_levels) and settings \
+                        and p99 <= target_ms:
+                    recommended[scheme] = settings
+
+    if not rows:
+        click.echo('No schemes to benchmark.')
+        return
+
+    print_table(['Scheme', 'Settings', 'Threads', 'p50 (ms)', 'p99 (ms)',
+                 'Hashes/sec/core'],
+                [(scheme, settings, level, round(p50, 1), round(p99, 1),
+                  round(per_core, 1))
+                 for scheme, settings, level, p50, p99, per_core in rows])
+
+    click.echo()
+    if recommended:
+        click.echo(f'Recommended for a {target_ms:g}ms budget:')
+        click.echo(f'SECURITY_PASSWORD_HASH_OPTIONS = {recommended!r}')
+    else:
+        click.echo(f'None of the benchmarked settings fit within {target_ms:g}ms.')
+
+
+@security.command(name='check-indexes')
+def check_indexes():
+    """
+    Check that users can be efficiently looked up by their identity attributes.
+    """
+    security_utils_service = unchained.services.security_utils_service
+    unindexed = security_utils_service.get_unindexed_identity_attributes()
+    if unindexed:
+        click.secho(f'ERROR: The SECURITY_USER_IDENTITY_ATTRIBUTES '
+                    f'{", ".join(unindexed)} are not indexed; looking up users by '
+                    f'them requires a full scan of the users table.',
+                    fg='white', bg='red')
+        sys.exit(1)
+    click.echo('All of the SECURITY_USER_IDENTITY_ATTRIBUTES are indexed.')
+
+
+def _get_handler(pwd_context, scheme):
+    handler = pwd_context.handler(scheme)
+    try:
+        if hasattr(handler, 'has_backend') and not handler.has_backend():
+            return None
+    except Exception:
+        return None
+    return handler
+
+
+def _get_cost_settings(handler) -> List[Dict[str, Any]]:
+    if handler.name in COST_SETTINGS:
+        return COST_SETTINGS[handler.name]
+    if 'rounds' in handler.setting_kwds and getattr(handler, 'default_rounds', None):
+        return [dict(rounds=int(handler.default_rounds * factor))
+                for factor in (0.5, 1, 2, 4)]
+    return [{}]
+
+
+def _benchmark(fn, threads: int, samples: int) -> Tuple[List[float], float]:
+    """
+    Call ``fn`` ``samples`` times on each of ``threads`` threads at once.
+    Returns the individual latencies and the total elapsed time (in seconds).
+    """
+    def run():
+        latencies = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            fn(CALIBRATION_SECRET)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        start = time.perf_counter()
+        futures = [executor.submit(run) for _ in range(threads)]
+        latencies = [latency for future in futures for latency in future.result()]
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    values = sorted(values)
+    idx = max(0, -(-len(values) * percentile // 100) - 1)  # nearest rank
+    return values[int(idx)]
+
+
+def _format_settings(settings: Dict[str, Any]) -> str:
+    return ', '.join(f'{k}={v}' for k, v in settings.items()) or 'default'
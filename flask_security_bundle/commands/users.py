@@ -1,13 +1,22 @@
+import os
+import sys
+import time
+
 from flask_unchained import unchained
 from flask_unchained.cli import cli, click
 from flask_unchained.commands.utils import print_table
 
 from .utils import _query_to_role, _query_to_user
 from ..extensions import Security
-from ..services import SecurityService, UserManager
+from ..hashing import HashingPool, is_wrapped_hash
+from ..services import (ApiKeyService, SecurityService, SecurityUtilsService,
+                        UserManager)
 
 security: Security = unchained.extensions.security
+api_key_service: ApiKeyService = unchained.services.api_key_service
 security_service: SecurityService = unchained.services.security_service
+security_utils_service: SecurityUtilsService = \
+    unchained.services.security_utils_service
 user_manager: UserManager = unchained.services.user_manager
 
 
@@ -197,3 +206,177 @@ def remove_role_from_user(user, role):
         click.echo(f'Successfully removed {role!r} from {user!r}')
     else:
         click.echo('Cancelled.')
+
+
+@users.command('issue-api-key')
+@click.argument('query', nargs=1, help='The query to search for a user by. For example, '
+                                       '`id=5`, `email=a@a.com` or '
+                                       '`first_name=A,last_name=B`.')
+@click.option('--name', default=None, help='What the API key is for.')
+def issue_api_key(query, name):
+    """
+    Issue a new API key for a user.
+    """
+    _check_api_keys_enabled()
+    user = _query_to_user(query)
+    if click.confirm(f'Are you sure you want to issue an API key for {user!r}?'):
+        api_key, key = api_key_service.create_api_key(user, name=name, commit=True)
+        click.echo(f'Successfully issued {api_key!r}. The API key is:')
+        click.echo(key)
+        click.echo('Store it somewhere safe; it cannot be shown again.')
+    else:
+        click.echo('Cancelled.')
+
+
+@users.command('list-api-keys')
+@click.argument('query', nargs=1, required=False,
+                help='The query to search for a user by. For example, `id=5`, '
+                     '`email=a@a.com` or `first_name=A,last_name=B`.')
+def list_api_keys(query):
+    """
+    List API keys (of a user).
+    """
+    _check_api_keys_enabled()
+    user = _query_to_user(query) if query else None
+    api_keys = api_key_service.find_api_keys(user)
+    if api_keys:
+        print_table(
+            ['ID', 'Prefix', 'Name', 'User ID', 'Created At'],
+            [(api_key.id,
+              api_key.prefix,
+              api_key.name or '',
+              api_key.user_id,
+              api_key.created_at.strftime('%Y-%m-%d %H:%M%z'),
+              ) for api_key in api_keys])
+    else:
+        click.echo('No API keys found.')
+
+
+@users.command('revoke-api-key')
+@click.argument('prefix', nargs=1, help='The prefix of the API key to revoke.')
+def revoke_api_key(prefix):
+    """
+    Revoke an API key.
+    """
+    _check_api_keys_enabled()
+    api_key = api_key_service.model.query.filter_by(prefix=prefix).first()
+    if not api_key:
+        click.secho(f'ERROR: Could not locate an API key by prefix={prefix!r}',
+                    fg='white', bg='red')
+        sys.exit(1)
+    if click.confirm(f'Are you sure you want to revoke {api_key!r}?'):
+        api_key_service.revoke_api_key(api_key, commit=True)
+        click.echo(f'Successfully revoked {api_key!r}')
+    else:
+        click.echo('Cancelled.')
+
+
+@users.command('upgrade-hashes')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='The number of users to load (and update) at a time.')
+@click.option('--after-id', default=0, show_default=True,
+              help='Only upgrade users with an id greater than this one. Use it to '
+                   'resume an interrupted run.')
+@click.option('--workers', default=None, type=int,
+              help='The number of worker processes to hash in (0 to hash in this '
+                   'process). Defaults to the number of CPUs.')
+def upgrade_hashes(batch_size, after_id, workers):
+    """
+    Wrap outdated password hashes in the default scheme.
+
+    Each outdated hash is hashed again, as-is, with the default password hashing
+    scheme, so users don't need to log in for their hash to be strengthened (it
+    gets replaced by a regular hash the next time they do). Users' authentication
+    tokens stay valid, as they're bound to the user's security stamp.
+    """
+    pool = HashingPool(security.pwd_context,
+                       max_workers=os.cpu_count() if workers is None else workers)
+    options = security_utils_service.get_password_hash_options()
+    User = user_manager.model
+
+    last_id = after_id
+    scanned = upgraded = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            rows = user_manager.query \
+                .with_entities(User.id, User.password) \
+                .filter(User.id > last_id) \
+                .order_by(User.id) \
+                .limit(batch_size) \
+                .all()
+            if not rows:
+                break
+
+            futures = [(user_id, password_hash, pool.wrap(password_hash, **options))
+                       for user_id, password_hash in rows
+                       if _needs_wrapping(password_hash)]
+            upgraded += security_utils_service.save_password_hashes([
+                dict(_id=user_id, _old_password=password_hash,
+                     _new_password=future.result())
+                for user_id, password_hash, future in futures])
+
+            scanned += len(rows)
+            last_id = rows[-1].id
+            elapsed = time.perf_counter() - start
+            click.echo(f'Upgraded {upgraded} of {scanned} users '
+                       f'(last id: {last_id}, {scanned / elapsed:.0f} users/sec)')
+    except KeyboardInterrupt:
+        click.echo(f'Interrupted. To resume, run again with --after-id {last_id}')
+        raise
+    finally:
+        pool.shutdown()
+
+    click.echo(f'Done. Upgraded {upgraded} password hashes in '
+               f'{time.perf_counter() - start:.1f} seconds.')
+
+
+@users.command('backfill-security-stamps')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='The number of users to update at a time.')
+def backfill_security_stamps(batch_size):
+    """
+    Set the security stamp of users that don't have one yet.
+
+    Only needed when the ``security_stamp`` column was added to an existing users
+    table as nullable (adding it with its server default of 0 fills it in): run
+    this once, and then make the column ``NOT NULL``. Users without a stamp are
+    treated as having a stamp of 0, so that's what they get (keeping their
+    existing tokens and sessions valid).
+    """
+    User = user_manager.model
+    updated = 0
+    while True:
+        user_ids = [user_id for user_id, in user_manager.query
+                    .with_entities(User.id)
+                    .filter(User.security_stamp.is_(None))
+                    .order_by(User.id)
+                    .limit(batch_size)]
+        if not user_ids:
+            break
+
+        user_manager.query \
+            .filter(User.id.in_(user_ids)) \
+            .update({User.security_stamp: 0}, synchronize_session=False)
+        user_manager.commit()
+        updated += len(user_ids)
+        click.echo(f'Updated {updated} users (last id: {user_ids[-1]})')
+
+    click.echo(f'Done. Backfilled the security stamps of {updated} users.')
+
+
+def _needs_wrapping(password_hash):
+    if not password_hash or is_wrapped_hash(password_hash):
+        return False
+    try:
+        return security.pwd_context.needs_update(password_hash)
+    except ValueError:  # not a hash we know how to verify
+        return False
+
+
+def _check_api_keys_enabled():
+    if api_key_service.model is None:
+        click.secho('ERROR: API keys are not enabled. Add the ApiKey model to '
+                    'your app\'s security bundle models to use them.',
+                    fg='white', bg='red')
+        sys.exit(1)
@@ -40,12 +40,135 @@ class Config:
     Specifies the HTTP header to read when using token authentication.
     """
 
+    SECURITY_TOKEN_SOURCES = ['header', 'args']
+    """
+    Where to look for authentication tokens, in order of precedence: any of
+    ``header`` (:attr:`SECURITY_TOKEN_AUTHENTICATION_HEADER`), ``args`` (the
+    :attr:`SECURITY_TOKEN_AUTHENTICATION_KEY` query string parameter) and
+    ``json`` (the :attr:`SECURITY_TOKEN_AUTHENTICATION_KEY` key of JSON request
+    bodies). Requests without a token in any of them skip token authentication.
+    Note that ``json`` means parsing the body of every JSON request.
+    """
+
     SECURITY_TOKEN_MAX_AGE = None
     """
     Specifies the number of seconds before an authentication token expires.
     Defaults to None, meaning the token never expires.
     """
 
+    SECURITY_TOKEN_FORMAT = 'legacy'
+    """
+    The format of newly issued authentication tokens. One of ``legacy``, which
+    embeds a ``SECURITY_HASHING_SCHEMES`` hash of the user's password hash, or
+    ``hmac-v2``, which embeds a keyed HMAC of the user's id and security stamp.
+    ``hmac-v2`` tokens are much shorter and far cheaper to verify.
+    """
+
+    SECURITY_ACCEPT_LEGACY_TOKENS = True
+    """
+    Whether or not to accept ``legacy`` authentication tokens. Set this to False
+    once all clients have been issued ``hmac-v2`` tokens.
+    """
+
+    SECURITY_TOKEN_SERIALIZER = 'json'
+    """
+    How the data of authentication, confirmation, login and password reset tokens
+    is encoded (before being signed): ``json``, or ``compact``, a binary encoding
+    (see :class:`~flask_security_bundle.codec.CompactSerializer`) that makes
+    tokens shorter and faster to load. ``compact`` still accepts ``json`` tokens.
+    """
+
+    SECURITY_TOKEN_ROLE_CLAIMS = False
+    """
+    Whether or not to sign the user's role names (and a roles version) into their
+    authentication token. When enabled, requests authenticated by token build
+    their identity from these claims instead of loading the user's roles from
+    the database. The claims are bound to the user's security stamp: once their
+    roles change, their old tokens' claims are ignored (and their roles loaded
+    from the database) until they're issued a new token.
+    """
+
+    SECURITY_TOKEN_CACHE_SIZE = 0
+    """
+    The maximum number of verified authentication tokens to remember per process,
+    so that repeated requests with the same token can skip the (expensive) hash
+    verification. Cached tokens stop being accepted when the user's security
+    stamp changes (see :meth:`User.bump_security_stamp`). Defaults to 0, meaning
+    the cache is disabled.
+    """
+
+    SECURITY_TOKEN_CACHE_TTL = 300
+    """
+    The number of seconds a verified authentication token stays cached for.
+    """
+
+    SECURITY_CHECK_AUTH_TOKEN_RESPONSE = 'user'
+    """
+    What :meth:`SecurityController.check_auth_token` responds with: ``user``, the
+    serialized user, or ``minimal``, just their id, roles version and token
+    expiry, with an ``ETag`` so that clients polling it can send
+    ``If-None-Match`` and get an empty 304 (NOT MODIFIED) response.
+    """
+
+    SECURITY_BATCH_TOKEN_VERIFICATION = False
+    """
+    Whether or not to enable the :meth:`SecurityController.verify_auth_tokens`
+    view, which verifies a batch of authentication tokens at once (eg for an API
+    gateway), responding with each valid token's user id, roles and expiry. Its
+    callers must authenticate with an API key, so the app needs to enable the
+    :class:`~flask_security_bundle.models.ApiKey` model too.
+    """
+
+    SECURITY_BATCH_TOKEN_VERIFICATION_MAX_SIZE = 100
+    """
+    The maximum number of tokens :meth:`SecurityController.verify_auth_tokens`
+    accepts per request.
+    """
+
+    SECURITY_AUTH_MECHANISMS = ['token', 'session']
+    """
+    The names of the authentication mechanisms :func:`auth_required` tries, in
+    order. The bundle provides ``token``, ``session`` and ``api_key`` (see
+    :class:`~flask_security_bundle.models.ApiKey`); apps can register their
+    own with :meth:`Security.register_auth_mechanism`. Put the mechanism most of
+    your requests authenticate by first, eg ``['session', 'token']`` for mostly
+    browser traffic. ``security.get_auth_mechanism_stats()`` reports how often
+    each mechanism was tried, and how often it succeeded.
+    """
+
+    SECURITY_API_KEY_HEADER = 'X-Api-Key'
+    """
+    The HTTP header to read API keys from, for the ``api_key`` authentication
+    mechanism. (See :class:`~flask_security_bundle.models.ApiKey`.)
+    """
+
+    SECURITY_SERVER_SIDE_SESSIONS = False
+    """
+    Whether or not to also record logged in sessions server-side (see
+    :class:`~flask_security_bundle.models.UserSession`), so that they can be
+    revoked individually, or all of a user's at once. Sessions get revoked
+    automatically when the user's security stamp changes (see
+    :meth:`User.bump_security_stamp`), which includes whenever their roles change,
+    so the snapshot of their role names each session keeps is never stale. Note
+    that when enabled, "remember me" cookies no longer restore expired sessions.
+    """
+
+    SECURITY_SESSION_STORE = None
+    """
+    The key-value store to cache server-side sessions in: any object with
+    ``get(key)``, ``set(key, value, timeout)`` and ``delete(key)`` methods, eg
+    one of :mod:`cachelib`'s ``RedisCache``. Defaults to a per-process
+    :class:`~flask_security_bundle.user_cache.LocalStore`, which is only suitable
+    for running a single process: sessions revoked by one process stay valid in
+    the caches of the others for up to ``SECURITY_SESSION_STORE_TTL`` seconds. So
+    when running more than one, configure a store they all share.
+    """
+
+    SECURITY_SESSION_STORE_TTL = 300
+    """
+    The number of seconds a server-side session stays cached for.
+    """
+
     SECURITY_ANONYMOUS_USER = AnonymousUser
     """
     Class to use for representing anonymous users.
@@ -102,6 +225,44 @@ class Config:
     List of deprecated algorithms for hashing passwords.
     """
 
+    SECURITY_HASHING_POOL_SIZE = 0
+    """
+    The number of worker processes to hash and verify passwords in. Defaults to
+    0, meaning passwords are hashed inline in the thread serving the request.
+    """
+
+    SECURITY_HASHING_MAX_CONCURRENT = 0
+    """
+    The maximum number of password hashes (and verifications) to run at once per
+    process. Requests that can't get a slot within ``SECURITY_HASHING_QUEUE_TIMEOUT``
+    seconds are rejected with a 503 (SERVICE UNAVAILABLE), by the login view as
+    well as by any other view that hashes or verifies a password. Defaults to 0,
+    meaning unlimited.
+    """
+
+    SECURITY_HASHING_QUEUE_TIMEOUT = 1.0
+    """
+    The number of seconds to wait for a free password hashing slot.
+    """
+
+    SECURITY_HASHING_RETRY_AFTER = 1
+    """
+    The number of seconds to send in the ``Retry-After`` header when a request is
+    rejected for a lack of password hashing capacity.
+    """
+
+    SECURITY_DEFERRED_REHASH = False
+    """
+    Whether or not to upgrade outdated password hashes (after changing the password
+    hashing scheme or its options) once the login response has been sent, instead
+    of during the login request. Queued upgrades are saved in batches.
+    """
+
+    SECURITY_REHASH_BATCH_SIZE = 100
+    """
+    The maximum number of deferred password hash upgrades to save per UPDATE.
+    """
+
     SECURITY_HASHING_SCHEMES = ['sha512_crypt']
     """
     List of algorithms that can be used for creating and validating tokens.
@@ -128,7 +289,56 @@ class Config:
     SECURITY_USER_IDENTITY_ATTRIBUTES = ['email']  # FIXME-identity
     """
     List of attributes on the user model that can used for logging in with.
-    Each must be unique.
+    Each must be unique, and should be indexed (``flask security check-indexes``
+    reports any that aren't). If a value matches different users by different
+    attributes, the attribute listed first wins.
+    """
+
+    SECURITY_USER_LOADER_OPTIONS = None
+    """
+    How to load a user's roles when loading the user for a request. One of
+    ``joined`` (a single query), ``selectin`` or ``subquery`` (one extra query),
+    or None to lazy load them (one query for the user's roles, plus another per
+    role) when they're first accessed.
+    """
+
+    SECURITY_USER_CACHE = None
+    """
+    Cache users (and their roles) when loading them for a request, so that
+    repeated requests by the same user don't need to query the database. One of
+    ``local`` (an in-process cache), ``shared`` (a cache shared between processes,
+    see :attr:`SECURITY_USER_CACHE_STORE`), a :class:`UserCache` instance, or None
+    to disable caching. Cached users are evicted when they (or their roles) change,
+    but the ``local`` cache only evicts them in the process that changed them:
+    other processes keep their copy for up to ``SECURITY_USER_CACHE_TTL`` seconds.
+    Password hashes are never cached.
+    """
+
+    SECURITY_USER_CACHE_SIZE = 1024
+    """
+    The maximum number of users to keep in the ``local`` user cache.
+    """
+
+    SECURITY_USER_CACHE_TTL = 300
+    """
+    The number of seconds a user stays cached for.
+    """
+
+    SECURITY_USER_CACHE_STORE = None
+    """
+    The key-value store for the ``shared`` user cache: any object with
+    ``get(key)``, ``set(key, value, timeout)`` and ``delete(key)`` methods, eg a
+    ``RedisCache`` from cachelib. Defaults to an in-process stand-in. Cached users
+    are signed with the ``SECRET_KEY``, but the store should still only be
+    reachable by the application.
+    """
+
+    SECURITY_ROLE_REGISTRY_TTL = 60
+    """
+    The number of seconds the :class:`~flask_security_bundle.services.RoleRegistry`
+    keeps its map of roles for, before reloading it to pick up roles created,
+    renamed or deleted by other processes. Set to ``None`` to only reload it when
+    this process changes roles (or is asked about a role it doesn't know).
     """
 
     SECURITY_POST_LOGIN_REDIRECT_ENDPOINT = '/'
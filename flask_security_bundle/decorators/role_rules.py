@@ -0,0 +1,86 @@
+from flask import current_app, g
+from flask_principal import Identity, RoleNeed
+from typing import *
+
+
+class RoleRules:
+    """
+    Role requirements, compiled once (at decoration time) into frozensets of
+    :class:`~flask_principal.RoleNeed` so that checking them against an identity
+    only takes a set operation, instead of building and testing a new
+    :class:`~flask_principal.Permission` per role on every request.
+
+    Identities loaded by the bundle also carry the ``role_mask`` of their roles
+    (see :class:`~flask_security_bundle.services.RoleRegistry`), in which case the
+    requirements are checked with bitwise operations first. The set operation
+    only runs when that fails (eg for roles provided by the app's own
+    ``identity_loaded`` handlers).
+
+    :param required: Role names the identity must have all of.
+    :param one_of: Role names the identity must have at least one of.
+    """
+    __slots__ = ('required', 'one_of', '_masks')
+
+    def __init__(self,
+                 required: Iterable[str] = (),
+                 one_of: Iterable[str] = (),
+                 ):
+        self.required = frozenset(RoleNeed(role) for role in required)
+        self.one_of = frozenset(RoleNeed(role) for role in one_of)
+        self._masks = None
+
+    def allows(self, identity: Optional[Identity]) -> bool:
+        """
+        Returns whether or not the identity satisfies these role rules.
+        """
+        if not self:
+            return True
+        if identity is None:
+            return False
+
+        role_mask = getattr(identity, 'role_mask', None)
+        if role_mask is not None and self.allows_mask(role_mask):
+            return True
+
+        provides = identity.provides
+        return (self.required <= provides
+                and (not self.one_of or not self.one_of.isdisjoint(provides)))
+
+    def allows_mask(self, role_mask: int) -> bool:
+        """
+        Returns whether or not the roles in the given bitmask satisfy these
+        role rules.
+        """
+        version, required, one_of = self._get_masks()
+        if required is None:  # a required role doesn't exist
+            return False
+        return (role_mask & required == required
+                and (not self.one_of or bool(role_mask & one_of)))
+
+    def _get_masks(self) -> Tuple[int, Optional[int], int]:
+        role_registry = current_app.extensions['security'].role_registry
+        masks = self._masks
+        if masks is None or masks[0] != role_registry.version:
+            required = 0
+            for need in self.required:
+                bit = role_registry.get_bit(need.value)
+                if bit is None:
+                    required = None
+                    break
+                required |= bit
+            one_of = role_registry.get_mask(need.value for need in self.one_of)
+            # (read the version last, since unknown role names reload the registry)
+            masks = self._masks = (role_registry.version, required, one_of)
+        return masks
+
+    def __bool__(self):
+        return bool(self.required or self.one_of)
+
+    def __repr__(self):
+        return 'RoleRules(required={!r}, one_of={!r})'.format(
+            sorted(need.value for need in self.required),
+            sorted(need.value for need in self.one_of))
+
+
+def _get_identity() -> Optional[Identity]:
+    return getattr(g, 'identity', None)
@@ -1,8 +1,9 @@
 from flask import abort
-from flask_principal import Permission, RoleNeed
 from functools import wraps
 from http import HTTPStatus
 
+from .role_rules import RoleRules, _get_identity
+
 
 def roles_accepted(*roles):
     """
@@ -23,11 +24,15 @@ def roles_accepted(*roles):
 
     :param roles: The possible roles.
     """
+    rules = RoleRules(one_of=roles)
+
     def wrapper(fn):
+        if not rules:
+            return fn
+
         @wraps(fn)
         def decorated_view(*args, **kwargs):
-            perm = Permission(*[RoleNeed(role) for role in roles])
-            if not perm.can():
+            if not rules.allows(_get_identity()):
                 abort(HTTPStatus.FORBIDDEN)
             return fn(*args, **kwargs)
         return decorated_view
@@ -1,8 +1,9 @@
 from flask import abort
-from flask_principal import Permission, RoleNeed
 from functools import wraps
 from http import HTTPStatus
 
+from .role_rules import RoleRules, _get_identity
+
 
 def roles_required(*roles):
     """
@@ -22,13 +23,16 @@ def roles_required(*roles):
 
     :param roles: The required roles.
     """
+    rules = RoleRules(required=roles)
+
     def wrapper(fn):
+        if not rules:
+            return fn
+
         @wraps(fn)
         def decorated_view(*args, **kwargs):
-            perms = [Permission(RoleNeed(role)) for role in roles]
-            for perm in perms:
-                if not perm.can():
-                    abort(HTTPStatus.FORBIDDEN)
+            if not rules.allows(_get_identity()):
+                abort(HTTPStatus.FORBIDDEN)
             return fn(*args, **kwargs)
         return decorated_view
     return wrapper
@@ -1,17 +1,44 @@
-from flask import Request
+from flask import (Request, _request_ctx_stack, current_app, g, jsonify, request,
+                   session)
 from flask_login import LoginManager
-from flask_principal import Principal, Identity, UserNeed, RoleNeed, identity_loaded
+from flask_login.config import COOKIE_NAME
+from flask_login.utils import decode_cookie
+from flask_principal import (Principal, Identity, UserNeed, RoleNeed,
+                             identity_changed, identity_loaded)
 from flask_unchained import FlaskUnchained, injectable, lazy_gettext as _
 from flask_unchained.utils import ConfigProperty, ConfigPropertyMeta
+from http import HTTPStatus
 from itsdangerous import URLSafeTimedSerializer
 from passlib.context import CryptContext
+from sqlalchemy import event, select
+from sqlalchemy.orm import object_session
 from types import FunctionType
 from typing import *
 
-from ..models import AnonymousUser, User
+from ..cache import TTLCache
+from ..codec import compact_serializer
+from ..hashing import HashingCapacityError, HashingLimiter, HashingPool
+from ..identity import LazyIdentity
+from ..mechanisms import AuthMechanism
+from ..models import AnonymousUser, User, Role, UserRole
+from ..policy import SecurityPolicy
+from ..rehash import RehashQueue
+from ..signals import password_changed, password_reset, user_confirmed
 from ..utils import current_user
-from ..services.security_utils_service import SecurityUtilsService
+from ..services.api_key_service import ApiKeyService
+from ..services.role_registry import RoleRegistry
+from ..services.user_session_service import SESSION_ID_KEY, UserSessionService
+from ..services.security_utils_service import (SecurityUtilsService, TOKEN_FORMATS,
+                                               USER_LOADER_STRATEGIES)
 from ..services.user_manager import UserManager
+from ..user_cache import LocalStore, UserCache, LocalUserCache, SharedUserCache
+
+USER_CACHE_BACKENDS = ('local', 'shared')
+TOKEN_SOURCES = ('header', 'args', 'json')
+TOKEN_SERIALIZERS = ('json', 'compact')
+
+# the session.info key of the ids of users to evict from the cache after commit
+_INVALIDATED_USER_IDS = 'security_invalidated_user_ids'
 
 
 class _SecurityConfigProperties(metaclass=ConfigPropertyMeta):
@@ -24,9 +51,17 @@ class _SecurityConfigProperties(metaclass=ConfigPropertyMeta):
     registerable: bool = ConfigProperty()
     trackable: bool = ConfigProperty()
 
+    api_key_header: str = ConfigProperty()
     token_authentication_header: str = ConfigProperty()
     token_authentication_key: str = ConfigProperty()
     token_max_age: str = ConfigProperty()
+    token_format: str = ConfigProperty()
+    token_role_claims: bool = ConfigProperty()
+    accept_legacy_tokens: bool = ConfigProperty()
+
+    server_side_sessions: bool = ConfigProperty()
+    session_store_ttl: int = ConfigProperty()
+    role_registry_ttl: int = ConfigProperty()
 
     password_hash: str = ConfigProperty()
     password_salt: str = ConfigProperty()
@@ -40,46 +75,197 @@ class Security(_SecurityConfigProperties):
     def __init__(self):
         self._context_processors = {}
         self._send_mail_task = None
+        self.auth_mechanisms = {}
 
         # injected services
+        self.api_key_service = None
+        self.role_registry = None
         self.security_utils_service = None
         self.user_manager = None
+        self.user_session_service = None
 
         # remaining properties are all set by `self.init_app`
+        self.anonymous_user = None
+        self.auth_token_cache = None
         self.confirm_serializer = None
         self.hashing_context = None
+        self.hashing_limiter = None
+        self.hashing_pool = None
         self.login_manager = None
         self.login_serializer = None
+        self.auth_mechanism_names = None
+        self.policy = None
         self.principal = None
         self.pwd_context = None
+        self.rehash_queue = None
         self.remember_token_serializer = None
         self.reset_serializer = None
+        self.session_store = None
+        self.token_sources = None
+        self.user_cache = None
 
     def inject_services(self,
+                        api_key_service: ApiKeyService = injectable,
+                        role_registry: RoleRegistry = injectable,
                         security_utils_service: SecurityUtilsService = injectable,
-                        user_manager: UserManager = injectable):
+                        user_manager: UserManager = injectable,
+                        user_session_service: UserSessionService = injectable):
+        self.api_key_service = api_key_service
+        self.role_registry = role_registry
         self.security_utils_service = security_utils_service
         self.user_manager = user_manager
+        self.user_session_service = user_session_service
 
     def init_app(self, app: FlaskUnchained):
+        token_format = app.config.get('SECURITY_TOKEN_FORMAT')
+        if token_format not in TOKEN_FORMATS:
+            raise ValueError(
+                "Invalid authentication token format %r. Allowed values are %s" %
+                (token_format, ' and '.join(TOKEN_FORMATS)))
+
+        token_sources = tuple(app.config.get('SECURITY_TOKEN_SOURCES') or ())
+        invalid = [source for source in token_sources if source not in TOKEN_SOURCES]
+        if invalid:
+            raise ValueError(
+                "Invalid authentication token source(s) %s. Allowed values are %s" %
+                (', '.join(map(repr, invalid)), ', '.join(TOKEN_SOURCES)))
+
+        token_serializer = app.config.get('SECURITY_TOKEN_SERIALIZER')
+        if token_serializer not in TOKEN_SERIALIZERS:
+            raise ValueError(
+                "Invalid token serializer %r. Allowed values are %s" %
+                (token_serializer, ' and '.join(TOKEN_SERIALIZERS)))
+
+        loader_strategy = app.config.get('SECURITY_USER_LOADER_OPTIONS')
+        if loader_strategy and loader_strategy not in USER_LOADER_STRATEGIES:
+            raise ValueError(
+                "Invalid user loader strategy %r. Allowed values are None, %s" %
+                (loader_strategy, ', '.join(sorted(USER_LOADER_STRATEGIES))))
+
         # NOTE: the order of these `self.get_*` initialization calls is important!
+        self.policy = self._get_policy(app)
+        self.auth_token_cache = self._get_auth_token_cache(app)
         self.confirm_serializer = self._get_serializer(app, 'confirm')
         self.hashing_context = self._get_hashing_context(app)
         self.login_manager = self._get_login_manager(
             app, app.config.get('SECURITY_ANONYMOUS_USER'))
+        self.anonymous_user = self.login_manager.anonymous_user()
         self.login_serializer = self._get_serializer(app, 'login')
         self.principal = self._get_principal(app)
         self.pwd_context = self._get_pwd_context(app)
+        self.hashing_limiter = self._get_hashing_limiter(app)
+        self.hashing_pool = self._get_hashing_pool(app)
+        self.rehash_queue = self._get_rehash_queue(app)
         self.remember_token_serializer = self._get_serializer(app, 'remember')
         self.reset_serializer = self._get_serializer(app, 'reset')
+        self.session_store = app.config.get('SECURITY_SESSION_STORE') or LocalStore()
+        self.token_sources = token_sources
+        self.user_cache = self._get_user_cache(app)
+        self.auth_mechanism_names = tuple(app.config.get('SECURITY_AUTH_MECHANISMS'))
+        self.register_auth_mechanism('token', self._authenticate_token)
+        self.register_auth_mechanism('session', self._authenticate_session)
+        self.register_auth_mechanism('api_key', self._authenticate_api_key)
 
         self.context_processor(lambda: dict(security=_SecurityConfigProperties()))
 
         # FIXME: should this be easier to customizer for end users, perhaps by making
         # FIXME: the function come from a config setting?
         identity_loaded.connect_via(app)(self._on_identity_loaded)
+        app.register_error_handler(HashingCapacityError,
+                                   self._on_hashing_capacity_error)
+        password_changed.connect_via(app)(self._on_password_changed)
+        password_reset.connect_via(app)(self._on_password_changed)
+        if self.user_cache is not None:
+            for signal in (password_changed, password_reset, user_confirmed):
+                signal.connect_via(app)(self._on_user_changed)
+            self._listen_for_user_changes()
         app.extensions['security'] = self
 
+    ###########################################################
+    # public api to register and use authentication mechanisms #
+    ###########################################################
+
+    def register_auth_mechanism(self, name: str, fn: Callable[[], bool]) -> None:
+        """
+        Register (or replace) an authentication mechanism. Mechanisms are tried in
+        the order of ``SECURITY_AUTH_MECHANISMS`` (or the ``mechanisms`` passed to
+        :func:`~flask_security_bundle.auth_required`), so to use a new mechanism it
+        also needs to be added there.
+
+        :param name: The name of the mechanism.
+        :param fn: A function taking no arguments, returning whether or not it
+                   authenticated the current request.
+        """
+        self.auth_mechanisms[name] = AuthMechanism(name, fn)
+
+    def auth_mechanism(self, name: str):
+        """
+        Decorator to register an authentication mechanism. See
+        :meth:`register_auth_mechanism`.
+        """
+        def wrapper(fn):
+            self.register_auth_mechanism(name, fn)
+            return fn
+        return wrapper
+
+    def authenticate(self, mechanisms: Optional[Iterable[str]] = None) -> bool:
+        """
+        Returns whether or not any of the authentication mechanisms authenticated
+        the current request, trying them in order and stopping at the first success.
+
+        Each mechanism's result is remembered for the rest of the request, so
+        nested :func:`~flask_security_bundle.auth_required` (and friends) calls
+        don't verify the same credentials (and load the same identity) again.
+
+        :param mechanisms: The names of the mechanisms to try. Defaults to
+                           ``SECURITY_AUTH_MECHANISMS``.
+        """
+        ctx = _request_ctx_stack.top
+        results = getattr(ctx, 'auth_mechanism_results', None)
+        if results is None:
+            results = {}
+            if ctx is not None:
+                ctx.auth_mechanism_results = results
+
+        for name in (mechanisms or self.auth_mechanism_names):
+            result = results.get(name)
+            if result is None:
+                try:
+                    mechanism = self.auth_mechanisms[name]
+                except KeyError:
+                    raise ValueError(f'Unknown authentication mechanism {name!r}. '
+                                     f'Registered mechanisms are '
+                                     f'{", ".join(sorted(self.auth_mechanisms))}')
+                result = results[name] = mechanism.authenticate()
+            if result:
+                return True
+        return False
+
+    def get_auth_mechanism_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns the ``attempts`` and ``successes`` counts of each registered
+        authentication mechanism.
+        """
+        return {name: mechanism.stats()
+                for name, mechanism in self.auth_mechanisms.items()}
+
+    def get_auth_token_expiry(self) -> Union[int, None]:
+        """
+        Returns the Unix timestamp the current request's authentication token
+        expires at, or ``None`` if it doesn't expire (or the request wasn't
+        authenticated by token).
+        """
+        return getattr(_request_ctx_stack.top, 'auth_token_expires_at', None)
+
+    def get_current_role_names(self) -> Iterable[str]:
+        """
+        Returns the names of the current user's roles, from the role claims of
+        their authentication token (or server-side session) if it has any, so
+        that their roles don't need to be loaded from the database.
+        """
+        role_names = self._get_claimed_role_names()
+        return role_names if role_names is not None else current_user.role_names
+
     ######################################################
     # public api to register template context processors #
     ######################################################
@@ -167,6 +353,13 @@ class Security(_SecurityConfigProperties):
     # protected api methods used by init_app #
     ##########################################
 
+    def _get_auth_token_cache(self, app: FlaskUnchained) -> TTLCache:
+        """
+        Get the cache of verified authentication tokens.
+        """
+        return TTLCache(maxsize=app.config.get('SECURITY_TOKEN_CACHE_SIZE'),
+                        ttl=app.config.get('SECURITY_TOKEN_CACHE_TTL'))
+
     def _get_hashing_context(self, app: FlaskUnchained) -> CryptContext:
         """
         Get the token hashing (and verifying) context.
@@ -177,6 +370,23 @@ class Security(_SecurityConfigProperties):
             schemes=schemes,
             deprecated=deprecated)
 
+    def _get_hashing_pool(self, app: FlaskUnchained) -> HashingPool:
+        """
+        Get the pool for running password hashing and verification out of process.
+        """
+        return HashingPool(self.pwd_context,
+                           max_workers=app.config.get('SECURITY_HASHING_POOL_SIZE'),
+                           limiter=self.hashing_limiter)
+
+    def _get_hashing_limiter(self, app: FlaskUnchained) -> HashingLimiter:
+        """
+        Get the limiter of concurrent password hashes.
+        """
+        return HashingLimiter(
+            max_concurrent=app.config.get('SECURITY_HASHING_MAX_CONCURRENT'),
+            timeout=app.config.get('SECURITY_HASHING_QUEUE_TIMEOUT'),
+            retry_after=app.config.get('SECURITY_HASHING_RETRY_AFTER'))
+
     def _get_login_manager(self,
                            app: FlaskUnchained,
                            anonymous_user: AnonymousUser,
@@ -189,8 +399,7 @@ class Security(_SecurityConfigProperties):
         lm.anonymous_user = anonymous_user or AnonymousUser
         lm.localize_callback = _
         lm.request_loader(self._request_loader)
-        lm.user_loader(
-            lambda *a, **kw: self.security_utils_service.user_loader(*a, **kw))
+        lm.user_loader(self._session_user_loader)
         lm.login_view = 'security_controller.login'
         lm.login_message, _('flask_security_bundle.error.login_required')
         lm.login_message_category = 'info'
@@ -200,6 +409,12 @@ class Security(_SecurityConfigProperties):
         lm.init_app(app)
         return lm
 
+    def _get_policy(self, app: FlaskUnchained) -> SecurityPolicy:
+        """
+        Get the (validated) snapshot of the password hashing and token settings.
+        """
+        return SecurityPolicy.from_config(app.config)
+
     def _get_principal(self, app: FlaskUnchained) -> Principal:
         """
         Get an initialized instance of Flask Principal's.
@@ -226,6 +441,50 @@ class Security(_SecurityConfigProperties):
             default=pw_hash,
             deprecated=deprecated)
 
+    def _get_rehash_queue(self, app: FlaskUnchained) -> RehashQueue:
+        """
+        Get the queue of deferred password hash upgrades.
+        """
+        return RehashQueue(enabled=app.config.get('SECURITY_DEFERRED_REHASH'),
+                           batch_size=app.config.get('SECURITY_REHASH_BATCH_SIZE'))
+
+    def _get_user_cache(self, app: FlaskUnchained) -> Union[UserCache, None]:
+        """
+        Get the cache of users (or ``None`` if it's disabled).
+        """
+        backend = app.config.get('SECURITY_USER_CACHE')
+        ttl = app.config.get('SECURITY_USER_CACHE_TTL')
+        if not backend or isinstance(backend, UserCache):
+            return backend or None
+        elif backend == 'local':
+            return LocalUserCache(maxsize=app.config.get('SECURITY_USER_CACHE_SIZE'),
+                                  ttl=ttl)
+        elif backend == 'shared':
+            return SharedUserCache(secret_key=app.config.get('SECRET_KEY'),
+                                   store=app.config.get('SECURITY_USER_CACHE_STORE'),
+                                   ttl=ttl)
+        raise ValueError(
+            "Invalid user cache %r. Allowed values are None, %s, or a UserCache "
+            "instance" % (backend, ', '.join(USER_CACHE_BACKENDS)))
+
+    def _listen_for_user_changes(self) -> None:
+        """
+        Evict users from the cache whenever they (or their roles) are changed.
+        """
+        for target, event_names, fn in [
+            (User, ('after_update', 'after_delete'), self._on_user_flushed),
+            (UserRole, ('after_insert', 'after_update', 'after_delete'),
+             self._on_user_role_flushed),
+            (Role, ('after_update',), self._on_role_flushed),
+        ]:
+            for name in event_names:
+                if not event.contains(target, name, fn):
+                    event.listen(target, name, fn, propagate=True)
+
+        session = self.user_manager.db.session
+        if not event.contains(session, 'after_commit', self._on_session_committed):
+            event.listen(session, 'after_commit', self._on_session_committed)
+
     def _get_serializer(self, app: FlaskUnchained, name: str) -> URLSafeTimedSerializer:
         """
         Get a URLSafeTimedSerializer for the given serialization context name.
@@ -237,7 +496,77 @@ class Security(_SecurityConfigProperties):
         """
         secret_key = app.config.get('SECRET_KEY')
         salt = app.config.get('SECURITY_%s_SALT' % name.upper())
-        return URLSafeTimedSerializer(secret_key=secret_key, salt=salt)
+        serializer = (compact_serializer
+                      if app.config.get('SECURITY_TOKEN_SERIALIZER') == 'compact'
+                      else None)
+        return URLSafeTimedSerializer(secret_key=secret_key, salt=salt,
+                                      serializer=serializer)
+
+    def _authenticate_token(self) -> bool:
+        """
+        The ``token`` authentication mechanism.
+        """
+        user = self.login_manager.request_callback(request)
+        if user and user.is_authenticated:
+            self._set_request_user(user)
+            return True
+        return False
+
+    def _authenticate_session(self) -> bool:
+        """
+        The ``session`` authentication mechanism. Only the cookie session (or the
+        remember cookie) is checked, because ``current_user`` falls back to the
+        request loader, and thus the token, when the session has no user.
+        """
+        user_id = session.get('user_id')
+        if user_id is None:
+            user_id = self._get_remembered_user_id()
+            if user_id is None:
+                return False
+            session['user_id'] = user_id
+            session['_fresh'] = False
+
+        user = self._session_user_loader(user_id)
+        if user and user.is_authenticated:
+            self._set_request_user(user)
+            return True
+        return False
+
+    def _get_remembered_user_id(self):
+        """
+        Returns the user id from the remember cookie (or ``None``), unless the
+        user logged out during this request.
+        """
+        cookie_name = current_app.config.get('REMEMBER_COOKIE_NAME', COOKIE_NAME)
+        cookie = request.cookies.get(cookie_name)
+        if not cookie or session.get('remember') == 'clear':
+            return None
+        return decode_cookie(cookie)
+
+    def _authenticate_api_key(self) -> bool:
+        """
+        The ``api_key`` authentication mechanism.
+        """
+        key = request.headers.get(self.api_key_header)
+        if not key:
+            return False
+
+        user = self.api_key_service.get_user_by_api_key(key)
+        if user:
+            self._set_request_user(user)
+            return True
+        return False
+
+    def _set_request_user(self, user: User) -> None:
+        """
+        Make the user (authenticated by a mechanism) the current user. Their
+        identity is only (re)loaded if the request doesn't already have it.
+        """
+        _request_ctx_stack.top.user = user
+        identity = getattr(g, 'identity', None)
+        if identity is None or identity.id != user.id:
+            identity_changed.send(current_app._get_current_object(),
+                                  identity=LazyIdentity(user.id))
 
     def _identity_loader(self) -> Union[Identity, None]:
         """
@@ -245,39 +574,210 @@ class Security(_SecurityConfigProperties):
         instance returned by :meth:`_get_principal`.
         """
         if not isinstance(current_user._get_current_object(), AnonymousUser):
-            identity = Identity(current_user.id)
-            return identity
+            return LazyIdentity(current_user.id)
 
     def _on_identity_loaded(self, sender, identity: Identity) -> None:
         """
-        Callback that runs whenever a new identity has been loaded.
+        Callback that runs whenever a new identity has been loaded. The needs of
+        a :class:`LazyIdentity` are only built once they're first accessed.
+        """
+        user = current_user._get_current_object()
+        identity.user = user
+        role_names = self._get_claimed_role_names()
+        if isinstance(identity, LazyIdentity):
+            identity.defer(lambda identity: self._load_identity_needs(
+                identity, user, role_names))
+        else:
+            self._load_identity_needs(identity, user, role_names)
+
+    def _load_identity_needs(self,
+                             identity: Identity,
+                             user: Union[User, AnonymousUser],
+                             role_names: Optional[List[str]],
+                             ) -> None:
+        """
+        Populate the identity's needs (and role mask) from the user (or their
+        token's role claims).
+        """
+        if hasattr(user, 'id'):
+            identity.provides.add(UserNeed(user.id))
+
+        if role_names is None:
+            role_names = getattr(user, 'role_names', ())
+            identity.role_mask = getattr(user, 'role_mask', 0)
+        else:
+            identity.role_mask = self.role_registry.get_mask(role_names)
+        identity.provides.update(RoleNeed(role_name) for role_name in role_names)
+
+    def _get_claimed_role_names(self) -> Union[List[str], None]:
+        """
+        Returns the role names claimed by the current request's authentication
+        token (or the role snapshot of its server-side session), or ``None`` if
+        it didn't have any (or belongs to another user).
+        """
+        ctx = _request_ctx_stack.top
+        current_user_id = getattr(current_user, 'id', None)
+        user_id, claims = getattr(ctx, 'auth_token_claims', (None, None))
+        if claims and user_id == current_user_id:
+            return claims['roles']
+
+        user_session = getattr(ctx, 'user_session', None)
+        if user_session and user_session['user_id'] == current_user_id:
+            return user_session['role_names']
+        return None
+
+    def _on_hashing_capacity_error(self, e: HashingCapacityError):
+        """
+        Error handler for requests that couldn't get a password hashing slot (the
+        login view handles those itself). Responds with a 503, and a Retry-After.
+        """
+        msg = str(_('flask_security_bundle.error.hashing_unavailable'))
+        headers = {'Retry-After': str(e.retry_after)}
+        if request.is_json:
+            return jsonify({'error': msg}), HTTPStatus.SERVICE_UNAVAILABLE, headers
+        return msg, HTTPStatus.SERVICE_UNAVAILABLE, headers
+
+    def _on_password_changed(self, sender, user: User) -> None:
+        """
+        Callback that runs whenever a user's password has been changed or reset.
+        """
+        self.auth_token_cache.delete_where(lambda token, entry: entry[0] == user.id)
+
+    def _on_user_changed(self, sender, user: User, **kwargs) -> None:
+        """
+        Callback that runs whenever a user's password has been changed or reset,
+        or their email has been confirmed.
+        """
+        self.invalidate_cached_user(user.id, self.user_manager.db.session)
+
+    def invalidate_cached_user(self, user_id, session=None) -> None:
+        """
+        Evict the user from the user cache. If a database session is given, the
+        user is evicted again once it commits (otherwise concurrent requests could
+        re-cache the user's previously committed state in the meantime).
         """
-        if hasattr(current_user, 'id'):
-            identity.provides.add(UserNeed(current_user.id))
+        if self.user_cache is None:
+            return
+
+        self.user_cache.delete(user_id)
+        if session is not None:
+            session.info.setdefault(_INVALIDATED_USER_IDS, set()).add(user_id)
+
+    # the listeners below are bound to this instance (rather than looking it up
+    # through ``current_app``), so that they also work outside of app contexts
 
-        for role in getattr(current_user, 'roles', []):
-            identity.provides.add(RoleNeed(role.name))
+    def _on_user_flushed(self, mapper, connection, user) -> None:
+        self.invalidate_cached_user(user.id, object_session(user))
 
-        identity.user = current_user
+    def _on_user_role_flushed(self, mapper, connection, user_role) -> None:
+        self.invalidate_cached_user(user_role.user_id, object_session(user_role))
+
+    def _on_role_flushed(self, mapper, connection, role) -> None:
+        # a renamed role changes the roles of all of its users
+        table = mapper.relationships['role_users'].mapper.local_table
+        for user_id, in connection.execute(
+                select([table.c.user_id]).where(table.c.role_id == role.id)):
+            self.invalidate_cached_user(user_id, object_session(role))
+
+    def _on_session_committed(self, session) -> None:
+        user_ids = session.info.pop(_INVALIDATED_USER_IDS, ())
+        if self.user_cache is not None:
+            for user_id in user_ids:
+                self.user_cache.delete(user_id)
+
+    def _session_user_loader(self, user_id) -> Union[User, None]:
+        """
+        Load the user of a cookie session. With ``SECURITY_SERVER_SIDE_SESSIONS``,
+        the session must also exist server-side, and the user's security stamp
+        must not have changed since they logged in.
+        """
+        if not self.user_session_service.enabled:
+            return self.security_utils_service.user_loader(user_id)
+
+        session_id = session.get(SESSION_ID_KEY)
+        user_session = self.user_session_service.get_session(session_id)
+        if user_session is None or str(user_session['user_id']) != str(user_id):
+            return None
+
+        user = self.security_utils_service.user_loader(user_id)
+        if user is None or user_session['security_stamp'] != \
+                self.user_session_service.get_security_stamp(user):
+            self.user_session_service.revoke_session(session_id)
+            return None
+
+        _request_ctx_stack.top.user_session = user_session
+        return user
 
     def _request_loader(self, request: Request) -> Union[User, AnonymousUser]:
         """
-        Attempt to load the user from the request token.
+        Attempt to load the user from the request token. The result is remembered
+        for the rest of the request, so the token only gets verified once.
         """
-        header_key = self.token_authentication_header
-        args_key = self.token_authentication_key
-        header_token = request.headers.get(header_key, None)
-        token = request.args.get(args_key, header_token)
-        if request.is_json:
-            data = request.get_json(silent=True) or {}
-            token = data.get(args_key, token)
+        ctx = _request_ctx_stack.top
+        try:
+            return ctx.auth_token_user
+        except AttributeError:
+            user = ctx.auth_token_user = self._load_user_from_token(request)
+            return user
+
+    def _load_user_from_token(self, request: Request) -> Union[User, AnonymousUser]:
+        token, source = self._get_request_token(request)
+        if not token:
+            return self.anonymous_user
 
+        _request_ctx_stack.top.auth_token_source = source
         try:
-            data = self.remember_token_serializer.loads(
-                token, max_age=self.token_max_age)
-            user = self.user_manager.get(data[0])
-            if user and self.security_utils_service.verify_hash(data[1], user.password):
+            data, signed_at = self.remember_token_serializer.loads(
+                token, max_age=self.token_max_age, return_timestamp=True)
+
+            # the token's signature and age have been checked; if we have already
+            # verified it, we only need to check the user's security stamp is
+            # unchanged (evictions only happen in the process that changed it)
+            user_id, security_stamp = self.auth_token_cache.get(token, (None, None))
+            user = (self.security_utils_service.get_user(user_id)
+                    if user_id is not None else None)
+            if user and security_stamp != \
+                    self.security_utils_service.get_security_stamp(user):
+                self.auth_token_cache.delete(token)
+                user = None
+            if not user:
+                user = self.security_utils_service.verify_auth_token_data(data)
+                if user:
+                    self.auth_token_cache.set(token, (
+                        user.id, self.security_utils_service.get_security_stamp(user)))
+
+            if user:
+                # signed role claims let us build the identity without the db,
+                # as long as the user's roles haven't changed since
+                _, claims = self.security_utils_service.split_auth_token_data(data)
+                claims = self.security_utils_service.verify_role_claims(claims, user)
+                _request_ctx_stack.top.auth_token_claims = (user.id, claims)
+                _request_ctx_stack.top.auth_token_expires_at = \
+                    self.security_utils_service.get_auth_token_expires_at(signed_at)
                 return user
-        except:
+        except Exception:
             pass
-        return self.login_manager.anonymous_user()
+        return self.anonymous_user
+
+    def _get_request_token(self,
+                           request: Request,
+                           ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Returns the request's authentication token and the name of its source,
+        from the first of the ``SECURITY_TOKEN_SOURCES`` that has one, or
+        ``(None, None)`` if the request doesn't have a token.
+        """
+        for source in self.token_sources:
+            if source == 'header':
+                token = request.headers.get(self.token_authentication_header)
+            elif source == 'args':
+                token = request.args.get(self.token_authentication_key)
+            elif request.is_json:
+                data = request.get_json(silent=True)
+                token = (data.get(self.token_authentication_key)
+                         if isinstance(data, dict) else None)
+            else:
+                token = None
+            if token:
+                return token, source
+        return None, None
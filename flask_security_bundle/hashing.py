@@ -0,0 +1,328 @@
+import base64
+import hashlib
+import json
+import weakref
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from passlib.context import CryptContext
+from threading import BoundedSemaphore, Lock
+from typing import *
+
+WRAPPED_HASH_PREFIX = '$wrapped$'
+
+# the (non-policy) settings needed to reproduce an existing hash
+_INNER_HASH_SETTINGS = ('ident', 'salt', 'rounds', 'memory_cost', 'parallelism', 'type')
+
+
+class HashingCapacityError(Exception):
+    """
+    Raised when no password hashing slot became free within the queue timeout.
+
+    :param retry_after: The number of seconds clients should wait before retrying.
+    """
+    def __init__(self, retry_after: int):
+        super().__init__('Timed out waiting for a password hashing slot')
+        self.retry_after = retry_after
+
+
+class HashingLimiter:
+    """
+    Limits how many password hashes (and verifications) run at once in this
+    process. Callers wait up to ``timeout`` seconds for a free slot, after which
+    :class:`HashingCapacityError` is raised (and the request is "shed").
+
+    Keeps track of the number of ``active`` and ``waiting`` callers, and the
+    total number of ``shed`` ones.
+
+    :param max_concurrent: The maximum number of concurrent hashes. Zero (or
+                           ``None``) means unlimited.
+    :param timeout: The number of seconds to wait for a free slot.
+    :param retry_after: The number of seconds clients should wait before retrying.
+    """
+    def __init__(self,
+                 max_concurrent: Optional[int] = 0,
+                 timeout: Optional[float] = 1.0,
+                 retry_after: int = 1,
+                 ):
+        self.max_concurrent = max_concurrent or 0
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.shed = 0
+        self._lock = Lock()
+        self._semaphore = (BoundedSemaphore(self.max_concurrent)
+                           if self.enabled else None)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrent > 0
+
+    def acquire(self) -> None:
+        """
+        Wait for a free slot, raising :class:`HashingCapacityError` on timeout.
+        """
+        if not self.enabled:
+            return
+
+        acquired = False
+        with self._lock:
+            self.waiting += 1
+        try:
+            acquired = self._semaphore.acquire(timeout=self.timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+                if acquired:
+                    self.active += 1
+                else:
+                    self.shed += 1
+
+        if not acquired:
+            raise HashingCapacityError(self.retry_after)
+
+    def release(self) -> None:
+        """
+        Free up a slot acquired by :meth:`acquire`.
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self.active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns a dictionary of the ``active``, ``waiting`` (queue depth) and
+        ``shed`` counts, and the ``max_concurrent`` limit.
+        """
+        return dict(active=self.active, waiting=self.waiting, shed=self.shed,
+                    max_concurrent=self.max_concurrent)
+
+
+class HashingPool:
+    """
+    Runs password hashing and verification for a :class:`CryptContext` in a
+    bounded pool of worker processes, so that slow schemes (bcrypt, argon2, ...)
+    don't tie up the thread serving the request (or hold the GIL) while they run.
+
+    Both methods return a :class:`concurrent.futures.Future`; use
+    :func:`asyncio.wrap_future` to await one from a coroutine.
+
+    With ``max_workers`` set to zero (or ``None``) no processes are started, and
+    the work is done inline in the calling thread (returning completed futures).
+
+    Every call takes a slot from the ``limiter`` (if any) until its future is
+    done, so it may raise :class:`HashingCapacityError`.
+
+    :param pwd_context: The password hashing context.
+    :param max_workers: The maximum number of worker processes.
+    :param limiter: The limiter of concurrent hashes.
+    """
+    def __init__(self,
+                 pwd_context: CryptContext,
+                 max_workers: Optional[int] = 0,
+                 limiter: Optional[HashingLimiter] = None,
+                 ):
+        self.pwd_context = pwd_context
+        self.max_workers = max_workers or 0
+        self.limiter = limiter or HashingLimiter()
+        self._config = None
+        self._executor = None
+        self._lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_workers > 0
+
+    def hash(self, secret: str, **options) -> Future:
+        """
+        Hash ``secret`` with the context's default scheme.
+
+        :param secret: The value to hash.
+        :param options: Extra settings to pass to the hashing scheme.
+        :return: A future for the resulting hash string.
+        """
+        if not self.enabled:
+            return self._limit(_completed, self.pwd_context.hash, secret, **options)
+        return self._limit(self._submit, _hash, secret, options)
+
+    def verify(self, secret: str, hash: str) -> Future:
+        """
+        Verify ``secret`` against an existing (possibly wrapped) ``hash``.
+
+        :param secret: The value to verify.
+        :param hash: The hash to verify it against.
+        :return: A future for whether or not the secret matches the hash.
+        """
+        if not self.enabled:
+            return self._limit(_completed, verify_hash, self.pwd_context, secret, hash)
+        return self._limit(self._submit, _verify, secret, hash)
+
+    def wrap(self, hash: str, **options) -> Future:
+        """
+        Wrap an existing ``hash`` in the context's default scheme. See
+        :func:`wrap_hash`.
+
+        :param hash: The hash to wrap.
+        :param options: Extra settings to pass to the hashing scheme.
+        :return: A future for the wrapped hash string.
+        """
+        if not self.enabled:
+            return self._limit(_completed, wrap_hash, self.pwd_context, hash, **options)
+        return self._limit(self._submit, _wrap, hash, options)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the worker processes (if any were started).
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _limit(self, submit: Callable[..., Future], *args, **kwargs) -> Future:
+        self.limiter.acquire()
+        try:
+            future = submit(*args, **kwargs)
+        except BaseException:
+            self.limiter.release()
+            raise
+        future.add_done_callback(lambda _: self.limiter.release())
+        return future
+
+    def _submit(self, fn: Callable, *args) -> Future:
+        executor = self._get_executor()
+        return executor.submit(fn, self._config, *args)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # the processes are started lazily, so that forking web servers create
+        # them in each of their workers rather than sharing the master's pool.
+        # and the context is only serialized for them then, since contexts with
+        # custom handlers can't be (which is fine for inline hashing)
+        with self._lock:
+            if self._executor is None:
+                self._config = self.pwd_context.to_string()
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                weakref.finalize(self, self._executor.shutdown, wait=False)
+            return self._executor
+
+
+def is_wrapped_hash(hash: str) -> bool:
+    """
+    Returns whether or not ``hash`` was created by :func:`wrap_hash`.
+    """
+    return bool(hash) and hash.startswith(WRAPPED_HASH_PREFIX)
+
+
+def get_inner_scheme(hash: str) -> str:
+    """
+    Returns the scheme of the hash wrapped inside of a wrapped ``hash``.
+    """
+    return _split_wrapped_hash(hash)[0]
+
+
+def wrap_hash(pwd_context: CryptContext, hash: str, **options) -> str:
+    """
+    Wrap an existing ``hash`` in the context's default scheme ("onion" hashing),
+    so that a weak hash can be strengthened without knowing the secret.
+
+    The result has the format ``$wrapped$<inner scheme>$<inner settings>$<outer
+    hash>``, where the outer hash is of a digest of the inner hash's checksum.
+    It's verified by re-computing the inner hash (with its original salt and
+    settings) and then verifying that against the outer hash.
+
+    :param pwd_context: The password hashing context.
+    :param hash: The hash to wrap.
+    :param options: Extra settings to pass to the (outer) hashing scheme.
+    """
+    scheme = pwd_context.identify(hash, required=True)
+    handler = pwd_context.handler(scheme)
+    settings = _encode_settings(_get_inner_settings(handler, hash))
+    outer_hash = pwd_context.hash(_get_inner_digest(handler, hash), **options)
+    return f'{WRAPPED_HASH_PREFIX}{scheme}${settings}${outer_hash}'
+
+
+def verify_hash(pwd_context: CryptContext, secret: str, hash: str) -> bool:
+    """
+    Verify ``secret`` against ``hash``, which may have been wrapped by
+    :func:`wrap_hash`.
+    """
+    if not is_wrapped_hash(hash):
+        return pwd_context.verify(secret, hash)
+
+    scheme, settings, outer_hash = _split_wrapped_hash(hash)
+    handler = pwd_context.handler(scheme)
+    inner_hash = handler.using(**_decode_settings(settings)).hash(secret)
+    return pwd_context.verify(_get_inner_digest(handler, inner_hash), outer_hash)
+
+
+def _split_wrapped_hash(hash: str) -> List[str]:
+    return hash[len(WRAPPED_HASH_PREFIX):].split('$', 2)
+
+
+def _get_inner_settings(handler, hash: str) -> Dict[str, Any]:
+    if not hasattr(handler, 'from_string'):  # eg plaintext
+        return {}
+    parsed = handler.from_string(hash)
+    return {key: getattr(parsed, key) for key in _INNER_HASH_SETTINGS
+            if key in handler.setting_kwds and getattr(parsed, key, None) is not None}
+
+
+def _get_inner_digest(handler, hash: str) -> str:
+    # only the checksum is digested, so that differences in how the settings are
+    # formatted don't matter. and the digest is short enough that schemes which
+    # truncate their input (eg bcrypt, at 72 bytes) still use all of it
+    checksum = handler.from_string(hash).checksum \
+        if hasattr(handler, 'from_string') else hash
+    if isinstance(checksum, str):
+        checksum = checksum.encode('utf-8')
+    return base64.b64encode(hashlib.sha256(checksum).digest()).decode('ascii')
+
+
+def _encode_settings(settings: Dict[str, Any]) -> str:
+    data = {key: ['b', base64.b64encode(value).decode('ascii')]
+            if isinstance(value, bytes) else value
+            for key, value in settings.items()}
+    return base64.urlsafe_b64encode(json.dumps(data, sort_keys=True,
+                                               separators=(',', ':')).encode('utf-8')
+                                    ).rstrip(b'=').decode('ascii')
+
+
+def _decode_settings(settings: str) -> Dict[str, Any]:
+    data = json.loads(base64.urlsafe_b64decode(settings + '=' * (-len(settings) % 4)))
+    return {key: base64.b64decode(value[1]) if isinstance(value, list) else value
+            for key, value in data.items()}
+
+
+def _completed(fn, *args, **kwargs) -> Future:
+    future = Future()
+    try:
+        future.set_result(fn(*args, **kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+# the remaining functions run in the worker processes
+
+_contexts = {}
+
+
+def _get_context(config: str) -> CryptContext:
+    if config not in _contexts:
+        _contexts[config] = CryptContext.from_string(config)
+    return _contexts[config]
+
+
+def _hash(config: str, secret: str, options: Dict[str, Any]) -> str:
+    return _get_context(config).hash(secret, **options)
+
+
+def _verify(config: str, secret: str, hash: str) -> bool:
+    return verify_hash(_get_context(config), secret, hash)
+
+
+def _wrap(config: str, hash: str, options: Dict[str, Any]) -> str:
+    return wrap_hash(_get_context(config), hash, **options)
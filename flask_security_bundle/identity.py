@@ -0,0 +1,48 @@
+from flask_principal import Identity
+from typing import *
+
+
+class LazyIdentity(Identity):
+    """
+    A :class:`~flask_principal.Identity` whose :attr:`provides` (and
+    :attr:`role_mask`) are only computed when first accessed, by the loaders
+    registered with :meth:`defer`. Requests that never check a permission (or
+    a role) therefore never build the identity's needs.
+
+    :param id: The user id.
+    :param auth_type: The authentication type used to confirm the user's identity.
+    """
+    def __init__(self, id, auth_type=None):
+        self._loaders = []
+        self._role_mask = None
+        super().__init__(id, auth_type)
+
+    @property
+    def provides(self) -> Set[Any]:
+        self._load()
+        return self._provides
+
+    @provides.setter
+    def provides(self, provides: Set[Any]):
+        self._provides = provides
+
+    @property
+    def role_mask(self) -> Optional[int]:
+        self._load()
+        return self._role_mask
+
+    @role_mask.setter
+    def role_mask(self, role_mask: Optional[int]):
+        self._role_mask = role_mask
+
+    def defer(self, loader: Callable[['LazyIdentity'], None]) -> None:
+        """
+        Register a function to populate the identity's needs (by adding to
+        ``identity._provides``, and optionally setting ``identity._role_mask``)
+        once they're first needed.
+        """
+        self._loaders.append(loader)
+
+    def _load(self) -> None:
+        while self._loaders:
+            self._loaders.pop(0)(self)
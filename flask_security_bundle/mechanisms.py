@@ -0,0 +1,43 @@
+from threading import Lock
+from typing import *
+
+
+class AuthMechanism:
+    """
+    A way of authenticating requests, eg by token or session. Keeps track of
+    how many times it was attempted and how many of those attempts succeeded,
+    to help pick the cheapest order for ``SECURITY_AUTH_MECHANISMS``.
+
+    :param name: The name of the mechanism.
+    :param fn: A function taking no arguments, returning whether or not it
+               authenticated the current request.
+    """
+    def __init__(self, name: str, fn: Callable[[], bool]):
+        self.name = name
+        self.fn = fn
+        self.attempts = 0
+        self.successes = 0
+        self._lock = Lock()
+
+    def authenticate(self) -> bool:
+        """
+        Returns whether or not this mechanism authenticated the current request.
+        """
+        with self._lock:
+            self.attempts += 1
+        if self.fn():
+            with self._lock:
+                self.successes += 1
+            return True
+        return False
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns a dictionary of the ``attempts`` and ``successes`` counts.
+        """
+        with self._lock:
+            return dict(attempts=self.attempts, successes=self.successes)
+
+    def __repr__(self):
+        return f'AuthMechanism(name={self.name!r}, attempts={self.attempts}, ' \
+               f'successes={self.successes})'
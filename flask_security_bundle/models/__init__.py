@@ -1,3 +1,5 @@
+from .api_key import ApiKey
 from .user import AnonymousUser, User
 from .role import Role
 from .user_role import UserRole
+from .user_session import UserSession
@@ -0,0 +1,24 @@
+from flask_unchained.bundles.sqlalchemy import db
+
+
+class ApiKey(db.Model):
+    """
+    An API key, for authenticating machine clients as a :class:`User`. Keys look
+    like ``<prefix>.<secret>``: the (indexed) :attr:`prefix` identifies the key,
+    and only a keyed hash of the secret is stored.
+
+    To enable API keys, add an ``api_keys`` relationship to your :class:`User`
+    model (``db.relationship('ApiKey', back_populates='user')``), and add the
+    ``api_key`` authentication mechanism to ``SECURITY_AUTH_MECHANISMS``.
+    """
+    class Meta:
+        lazy_mapped = True
+
+    name = db.Column(db.String(64), nullable=True)
+    prefix = db.Column(db.String(16), unique=True, index=True, nullable=False)
+    secret_hash = db.Column(db.String(64), nullable=False)
+
+    user_id = db.foreign_key('User')
+    user = db.relationship('User', back_populates='api_keys')
+
+    __repr_props__ = ('id', 'prefix', 'name', 'user_id')
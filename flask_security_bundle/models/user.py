@@ -1,8 +1,10 @@
 from flask_login import AnonymousUserMixin
+from sqlalchemy import event, func, inspect, select
 from flask_unchained.bundles.sqlalchemy import db
 from flask_unchained import unchained, injectable, lazy_gettext as _
 from werkzeug.datastructures import ImmutableList
 
+from .role import Role
 from .user_role import UserRole
 from ..validators import EmailValidator
 
@@ -21,9 +23,23 @@ class AnonymousUser(AnonymousUserMixin):
     def active(self):
         return False
 
+    @property
+    def role_names(self):
+        return frozenset()
+
+    @property
+    def role_mask(self):
+        return 0
+
     def has_role(self, *args):
         return False
 
+    def has_any_role(self, *roles):
+        return False
+
+    def has_all_roles(self, *roles):
+        return not roles
+
 
 class User(db.Model):
     """
@@ -41,6 +57,8 @@ class User(db.Model):
         required=_('flask_security_bundle.password_required')))
     active = db.Column(db.Boolean(name='active'), default=False)
     confirmed_at = db.Column(db.DateTime(), nullable=True)
+    security_stamp = db.Column(db.Integer, nullable=False, default=0,
+                               server_default='0')
 
     user_roles = db.relationship('UserRole', back_populates='user',
                                  cascade='all, delete-orphan')
@@ -71,16 +89,72 @@ class User(db.Model):
         """
         return security_utils_service.get_auth_token(self)
 
+    def bump_security_stamp(self):
+        """
+        Invalidate the user's existing authentication tokens, password reset tokens
+        and server-side sessions. This happens automatically when their password is
+        changed or reset, when their roles change, and when they get deactivated.
+        """
+        self.security_stamp = (self.security_stamp or 0) + 1
+
+    @property
+    def role_names(self):
+        """
+        A frozenset of the names of the user's roles. It's computed once, and
+        reset whenever :attr:`user_roles` changes (or the user gets expired or
+        refreshed by the session).
+        """
+        try:
+            return self.__dict__['_role_names']
+        except KeyError:
+            role_names = frozenset(user_role.role.name
+                                   for user_role in self.user_roles)
+            self._role_names = role_names
+            return role_names
+
+    @property
+    @unchained.inject('role_registry')
+    def role_mask(self, role_registry=injectable):
+        """
+        The bitmask of the user's roles (see
+        :class:`~flask_security_bundle.services.RoleRegistry`). Like
+        :attr:`role_names`, it's computed once, and reset whenever the user's
+        roles change (or the registry's bits do).
+        """
+        cached = self.__dict__.get('_role_mask')
+        if cached is not None and cached[0] == role_registry.version:
+            return cached[1]
+
+        role_mask = role_registry.get_mask(self.role_names)
+        # (read the version last, since the registry might have been reloaded)
+        self._role_mask = (role_registry.version, role_mask)
+        return role_mask
+
     def has_role(self, role):
         """
         Returns `True` if the user identifies with the specified role.
 
         :param role: A role name or :class:`Role` instance
         """
-        if isinstance(role, str):
-            return role in (role.name for role in self.roles)
-        else:
-            return role in self.roles
+        return getattr(role, 'name', role) in self.role_names
+
+    def has_any_role(self, *roles):
+        """
+        Returns `True` if the user identifies with at least one of the specified roles.
+
+        :param roles: Role names and/or :class:`Role` instances
+        """
+        role_names = self.role_names
+        return any(getattr(role, 'name', role) in role_names for role in roles)
+
+    def has_all_roles(self, *roles):
+        """
+        Returns `True` if the user identifies with all of the specified roles.
+
+        :param roles: Role names and/or :class:`Role` instances
+        """
+        role_names = self.role_names
+        return all(getattr(role, 'name', role) in role_names for role in roles)
 
     @property
     def is_authenticated(self):
@@ -89,3 +163,60 @@ class User(db.Model):
     @property
     def is_anonymous(self):
         return False
+
+
+def _reset_role_names(user, *args):
+    user.__dict__.pop('_role_names', None)
+    user.__dict__.pop('_role_mask', None)
+
+
+def _on_user_roles_changed(user, *args):
+    _reset_role_names(user)
+    user.bump_security_stamp()
+
+
+def _on_user_role_changed(user_role, *args):
+    user = user_role.__dict__.get('user')
+    if user is not None:
+        _on_user_roles_changed(user)
+
+
+def _on_active_set(user, value, oldvalue, initiator):
+    if oldvalue is True and not value:
+        user.bump_security_stamp()
+
+
+def _on_role_updated(mapper, connection, role):
+    # renaming a role changes the roles of all of its users
+    if not inspect(role).attrs.name.history.has_changes():
+        return
+
+    user_role_mapper = mapper.relationships['role_users'].mapper
+    user_roles = user_role_mapper.local_table
+    users = user_role_mapper.relationships['user'].mapper.local_table
+    connection.execute(
+        users.update()
+        .where(users.c.id.in_(select([user_roles.c.user_id])
+                              .where(user_roles.c.role_id == role.id)))
+        .values(security_stamp=func.coalesce(users.c.security_stamp, 0) + 1))
+
+
+@event.listens_for(User, 'mapper_configured', propagate=True)
+def _listen_for_user_changes(mapper, cls):
+    for name in ('append', 'remove'):
+        event.listen(cls.user_roles, name, _on_user_roles_changed)
+    event.listen(cls.active, 'set', _on_active_set, active_history=True)
+
+
+@event.listens_for(UserRole, 'mapper_configured', propagate=True)
+def _listen_for_user_role_changes(mapper, cls):
+    event.listen(cls.role, 'set', _on_user_role_changed)
+
+
+for name in ('expire', 'refresh'):
+    event.listen(User, name, _reset_role_names, propagate=True)
+
+
+@event.listens_for(Role, 'mapper_configured', propagate=True)
+def _listen_for_role_changes(mapper, cls):
+    event.listen(cls, 'after_update', _on_role_updated)
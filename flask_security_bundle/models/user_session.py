@@ -0,0 +1,25 @@
+from flask_unchained.bundles.sqlalchemy import db
+
+
+class UserSession(db.Model):
+    """
+    A server-side record of a logged in (cookie) session, so that sessions can be
+    revoked individually, or all at once for a user ("log out everywhere").
+    Each session keeps a snapshot of the user's role names and security stamp
+    from when they logged in.
+
+    To enable server-side sessions, add a ``user_sessions`` relationship to your
+    :class:`User` model (``db.relationship('UserSession', back_populates='user')``),
+    and set ``SECURITY_SERVER_SIDE_SESSIONS`` to True.
+    """
+    class Meta:
+        lazy_mapped = True
+
+    session_id = db.Column(db.String(64), unique=True, index=True, nullable=False)
+    role_names = db.Column(db.String, nullable=True)
+    security_stamp = db.Column(db.Integer, nullable=True)
+
+    user_id = db.foreign_key('User', index=True)
+    user = db.relationship('User', back_populates='user_sessions')
+
+    __repr_props__ = ('id', 'user_id')
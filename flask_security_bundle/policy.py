@@ -0,0 +1,84 @@
+from datetime import timedelta
+from types import MappingProxyType
+from typing import *
+
+# the config options (without the ``SECURITY_`` prefix) holding token lifetimes
+WITHIN_DELTA_KEYS = ('CONFIRM_EMAIL_WITHIN', 'RESET_PASSWORD_WITHIN')
+
+
+class SecurityPolicy:
+    """
+    An immutable snapshot of the password hashing and token lifetime settings,
+    parsed and validated once (by :meth:`from_config`) when the extension is
+    initialized, so that the hot paths don't need to look them up (and parse
+    them) from the app config on every call.
+    """
+    __slots__ = (
+        'password_hash',
+        'password_salt',
+        'single_hash',
+        'double_hash',
+        'hash_options',
+        'secret_key',
+        'within_deltas',
+        'max_ages',
+    )
+
+    def __init__(self, **settings):
+        for name in self.__slots__:
+            object.__setattr__(self, name, settings[name])
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> 'SecurityPolicy':
+        """
+        Build the policy from the (security bundle's) app config.
+        """
+        password_hash = config.get('SECURITY_PASSWORD_HASH')
+        password_salt = config.get('SECURITY_PASSWORD_SALT')
+        single_hash = bool(config.get('SECURITY_PASSWORD_SINGLE_HASH'))
+        if single_hash and password_salt:
+            raise RuntimeError('You may not specify a salt with '
+                               'SECURITY_PASSWORD_SINGLE_HASH')
+
+        within_deltas = {}
+        for key in WITHIN_DELTA_KEYS:
+            key = 'SECURITY_' + key
+            within_deltas[key] = parse_within_delta(config.get(key))
+
+        hash_options = config.get('SECURITY_PASSWORD_HASH_OPTIONS') or {}
+        return cls(
+            password_hash=password_hash,
+            password_salt=_encode(password_salt),
+            single_hash=single_hash,
+            double_hash=not (password_hash == 'plaintext' or single_hash),
+            hash_options=MappingProxyType(dict(hash_options.get(password_hash, {}))),
+            secret_key=_encode(config.get('SECRET_KEY')),
+            within_deltas=MappingProxyType(within_deltas),
+            max_ages=MappingProxyType({key: int(td.total_seconds())
+                                       for key, td in within_deltas.items()}),
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(password_hash={self.password_hash!r}, ' \
+               f'single_hash={self.single_hash!r})'
+
+
+def parse_within_delta(value: str) -> timedelta:
+    """
+    Parse a timedelta following the internal convention of
+    ``<Amount of Units> <Type of Units>``, eg ``5 days`` or ``10 minutes``.
+    """
+    amount, units = value.split()
+    return timedelta(**{units: int(amount)})
+
+
+def _encode(value: Union[str, bytes, None]) -> Union[bytes, None]:
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    return value
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import *
+
+
+class RehashQueue:
+    """
+    A per-process queue of password hashes to upgrade, so that logins don't
+    have to wait on re-hashing (and saving) passwords whose hashes use an
+    outdated scheme or settings.
+
+    Entries are coalesced by user id (only the latest entry for each user is
+    kept), and drained in batches of ``batch_size``. The plaintext passwords
+    are only held in memory until the next :meth:`drain`.
+
+    :param enabled: Whether or not rehashes should be deferred.
+    :param batch_size: The maximum number of entries per batch.
+    """
+    def __init__(self, enabled: bool = False, batch_size: int = 100):
+        self.enabled = enabled
+        self.batch_size = batch_size or 100
+        self.upgraded = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self._drain_lock = Lock()
+
+    @property
+    def pending(self) -> int:
+        """
+        The number of password hashes waiting to be upgraded.
+        """
+        return len(self._entries)
+
+    def add(self, user_id, password_hash: str, password: str) -> None:
+        """
+        Queue the user's password to be re-hashed.
+
+        :param user_id: The id of the user.
+        :param password_hash: The user's current (outdated) password hash.
+        :param password: The user's plaintext password.
+        """
+        with self._lock:
+            self._entries[user_id] = (password_hash, password)
+            self._entries.move_to_end(user_id)
+
+    def drain(self, fn: Callable[[Dict[Any, Tuple[str, str]]], int]) -> int:
+        """
+        Remove every queued entry, passing them to ``fn`` in batches of
+        ``batch_size``. ``fn`` receives a dictionary of user ids to
+        ``(password_hash, password)`` tuples, and should return the number of
+        hashes it upgraded.
+
+        Only one thread drains the queue at a time; concurrent calls return
+        immediately (the thread already draining will pick up their entries).
+
+        If ``fn`` raises, the entries of its batch are put back at the front of
+        the queue (unless newer ones were added for the same users in the
+        meantime), and the exception is re-raised.
+
+        :return: The number of upgraded hashes.
+        """
+        if not self._drain_lock.acquire(blocking=False):
+            return 0
+
+        upgraded = 0
+        try:
+            while True:
+                batch = self._pop_batch()
+                if not batch:
+                    break
+                try:
+                    upgraded += fn(batch)
+                except BaseException:
+                    self._requeue(batch)
+                    raise
+        finally:
+            self.upgraded += upgraded
+            self._drain_lock.release()
+        return upgraded
+
+    def clear(self) -> None:
+        """
+        Remove all queued entries without upgrading them.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns a dictionary of the ``pending`` and total ``upgraded`` counts.
+        """
+        return dict(pending=self.pending, upgraded=self.upgraded)
+
+    def _pop_batch(self) -> Dict[Any, Tuple[str, str]]:
+        with self._lock:
+            batch = OrderedDict()
+            while self._entries and len(batch) < self.batch_size:
+                user_id, entry = self._entries.popitem(last=False)
+                batch[user_id] = entry
+            return batch
+
+    def _requeue(self, batch: Dict[Any, Tuple[str, str]]) -> None:
+        with self._lock:
+            for user_id, entry in reversed(list(batch.items())):
+                if user_id not in self._entries:
+                    self._entries[user_id] = entry
+                    self._entries.move_to_end(user_id, last=False)
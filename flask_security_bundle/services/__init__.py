@@ -1,4 +1,7 @@
+from .api_key_service import ApiKeyService
 from .role_manager import RoleManager
+from .role_registry import RoleRegistry
 from .security_service import SecurityService
 from .security_utils_service import SecurityUtilsService
 from .user_manager import UserManager
+from .user_session_service import UserSessionService
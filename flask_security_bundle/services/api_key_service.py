@@ -0,0 +1,106 @@
+import hashlib
+import hmac
+import secrets
+
+from flask_unchained import BaseService, injectable, unchained
+from sqlalchemy.orm import joinedload
+
+# separates an api key's prefix from its secret
+API_KEY_SEPARATOR = '.'
+
+
+class ApiKeyService(BaseService):
+    """
+    Issues, verifies and revokes :class:`~flask_security_bundle.models.ApiKey`
+    instances. Verifying a key takes one indexed query (by its prefix) and one
+    HMAC, instead of a password hash verification.
+    """
+    def __init__(self, db=injectable, security=injectable):
+        self.db = db
+        self.security = security
+
+    @property
+    def model(self):
+        """
+        The :class:`ApiKey` model, or ``None`` if the app hasn't enabled API keys.
+        """
+        return unchained.sqlalchemy_bundle.models.get('ApiKey')
+
+    def create_api_key(self, user, name=None, commit=False):
+        """
+        Issue a new API key for the user. Returns a tuple of the api key instance
+        and the key itself, which can't be recovered later on.
+
+        :param user: The user to issue the key to.
+        :param name: An optional name describing what the key is for.
+        :param commit: Whether or not to commit the database session.
+        """
+        prefix = secrets.token_hex(6)
+        secret = secrets.token_urlsafe(32)
+        api_key = self.model(user=user, name=name, prefix=prefix,
+                             secret_hash=self.hash_secret(secret))
+        self.db.session.add(api_key)
+        if commit:
+            self.db.session.commit()
+        return api_key, prefix + API_KEY_SEPARATOR + secret
+
+    def get_api_key(self, key):
+        """
+        Returns the (unrevoked) api key instance for the given key, with its user
+        loaded, if the key's secret matches. Otherwise returns ``None``.
+
+        :param key: The ``<prefix>.<secret>`` key.
+        """
+        prefix, _, secret = (key or '').partition(API_KEY_SEPARATOR)
+        ApiKey = self.model
+        if not (prefix and secret) or ApiKey is None:
+            return None
+
+        api_key = ApiKey.query \
+            .options(joinedload(ApiKey.user)) \
+            .filter_by(prefix=prefix) \
+            .first()
+        if api_key and hmac.compare_digest(api_key.secret_hash,
+                                           self.hash_secret(secret)):
+            return api_key
+        return None
+
+    def get_user_by_api_key(self, key):
+        """
+        Returns the (active) user the given key belongs to, or ``None``.
+
+        :param key: The ``<prefix>.<secret>`` key.
+        """
+        api_key = self.get_api_key(key)
+        if api_key and api_key.user.active:
+            return api_key.user
+        return None
+
+    def find_api_keys(self, user=None):
+        """
+        Returns all of the api keys, or only the given user's.
+        """
+        query = self.model.query
+        if user is not None:
+            query = query.filter_by(user_id=user.id)
+        return query.order_by(self.model.id).all()
+
+    def revoke_api_key(self, api_key, commit=False):
+        """
+        Revoke (delete) the api key.
+
+        :param api_key: The api key instance.
+        :param commit: Whether or not to commit the database session.
+        """
+        self.db.session.delete(api_key)
+        if commit:
+            self.db.session.commit()
+
+    def hash_secret(self, secret):
+        """
+        Returns the hex encoded HMAC+SHA256 of an api key's secret, keyed with
+        the ``SECRET_KEY``. (Changing the ``SECRET_KEY`` invalidates all API keys.)
+        """
+        return hmac.new(self.security.policy.secret_key,
+                        b'api-key:' + secret.encode('utf-8'),
+                        hashlib.sha256).hexdigest()
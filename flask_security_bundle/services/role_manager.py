@@ -1,8 +1,20 @@
 from flask_unchained.bundles.sqlalchemy import ModelManager
 
+from ..signals import roles_changed
+
 
 class RoleManager(ModelManager):
     """
     :class:`ModelManager` for the :class:`Role` model.
     """
     model = 'Role'
+
+    def save(self, instance, commit=False):
+        rv = super().save(instance, commit=commit)
+        roles_changed.send(self, role=instance)
+        return rv
+
+    def delete(self, instance, commit=False):
+        rv = super().delete(instance, commit=commit)
+        roles_changed.send(self, role=instance)
+        return rv
@@ -0,0 +1,133 @@
+import time
+
+from flask_unchained import BaseService, injectable
+from sqlalchemy import event
+from threading import Lock
+from typing import *
+
+from .role_manager import RoleManager
+from ..models import Role
+from ..signals import roles_changed
+
+
+class RoleRegistry(BaseService):
+    """
+    An in-memory map of role names to bits, so that a set of roles can be
+    represented (cached, and compared) as a single integer bitmask. Roles get
+    dense bit positions (the lowest free one, in order of their ids), which keep
+    their position for as long as the role exists, so masks stay small however
+    large the role ids get. Bit positions are per-process: masks must not be
+    shared with other processes.
+
+    The registry is loaded on first use, and reloaded:
+
+    - after roles get inserted, updated or deleted (by this process)
+    - whenever the :attr:`~flask_security_bundle.signals.roles_changed` signal is
+      sent (which :class:`RoleManager` does whenever it saves or deletes roles)
+    - after ``SECURITY_ROLE_REGISTRY_TTL`` seconds, to pick up roles changed by
+      other processes
+    - when it's asked about a role name it doesn't know yet (eg one created by
+      another process). Names still unknown after reloading aren't reloaded for
+      again until the registry next changes.
+
+    Reloading only bumps the :attr:`version` when the roles actually changed.
+    Set :attr:`timer` to change the clock used for the TTL (defaults to
+    :func:`time.monotonic`).
+    """
+    def __init__(self,
+                 role_manager: RoleManager = injectable,
+                 security=injectable,
+                 ):
+        self.role_manager = role_manager
+        self.security = security
+        self.timer = time.monotonic
+        self._version = 0
+        self._bits = None
+        self._bits_by_id = {}
+        self._expires_at = None
+        self._stale = True
+        self._unknown = set()
+        self._lock = Lock()
+        roles_changed.connect(self._on_roles_changed)
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            if not event.contains(Role, name, self._on_role_flushed):
+                event.listen(Role, name, self._on_role_flushed, propagate=True)
+
+    @property
+    def version(self) -> int:
+        """
+        The version of the registry's bits, bumped whenever they change (reloading
+        them first if they're stale). Masks only compare between the same versions.
+        """
+        self._get_bits()
+        return self._version
+
+    def refresh(self) -> None:
+        """
+        Reload the role names and ids from the database.
+        """
+        model = self.role_manager.model
+        rows = self.role_manager.q.with_entities(model.id, model.name) \
+            .order_by(model.id).all()
+        ttl = self.security.role_registry_ttl
+        with self._lock:
+            bits_by_id = {id: self._bits_by_id[id] for id, _ in rows
+                          if id in self._bits_by_id}
+            used, position = set(bits_by_id.values()), 0
+            for id, _ in rows:
+                if id not in bits_by_id:
+                    while 1 << position in used:
+                        position += 1
+                    bits_by_id[id] = 1 << position
+                    used.add(1 << position)
+
+            bits = {name: bits_by_id[id] for id, name in rows}
+            if bits != self._bits or bits_by_id != self._bits_by_id:
+                self._bits = bits
+                self._bits_by_id = bits_by_id
+                self._unknown = set()
+                self._version += 1
+            self._expires_at = self.timer() + ttl if ttl else None
+            self._stale = False
+
+    def get_bit(self, role_name: str) -> Optional[int]:
+        """
+        Returns the bit for the given role name, or ``None`` if no such role exists.
+        """
+        bits = self._get_bits()
+        if role_name not in bits and role_name not in self._unknown:
+            self.refresh()
+            bits = self._get_bits()
+            if role_name not in bits:
+                with self._lock:
+                    self._unknown.add(role_name)
+        return bits.get(role_name)
+
+    def get_mask(self, role_names: Iterable[str]) -> int:
+        """
+        Returns the bitmask of the given role names. Unknown names are ignored.
+        """
+        bits = self._get_bits()
+        mask = 0
+        for role_name in role_names:
+            mask |= bits.get(role_name, 0)
+        return mask
+
+    def get_role_names(self, mask: int) -> FrozenSet[str]:
+        """
+        Returns the names of the roles in the given bitmask.
+        """
+        return frozenset(name for name, bit in self._get_bits().items()
+                         if mask & bit)
+
+    def _get_bits(self) -> Dict[str, int]:
+        if self._stale or (self._expires_at is not None
+                           and self._expires_at <= self.timer()):
+            self.refresh()
+        return self._bits
+
+    def _on_roles_changed(self, sender, **kwargs) -> None:
+        self._stale = True
+
+    def _on_role_flushed(self, mapper, connection, role) -> None:
+        self._stale = True
@@ -2,7 +2,7 @@ from datetime import timedelta
 from flask import _request_ctx_stack, current_app as app, session
 from flask_login.signals import user_logged_in
 from flask_login.utils import _get_user, logout_user as _logout_user
-from flask_principal import Identity, AnonymousIdentity, identity_changed
+from flask_principal import AnonymousIdentity, identity_changed
 from flask_unchained import url_for, lazy_gettext as _
 from flask_unchained.bundles.mail import Mail
 from flask_unchained import BaseService, injectable
@@ -10,23 +10,32 @@ from typing import *
 
 from .security_utils_service import SecurityUtilsService
 from .user_manager import UserManager
+from .user_session_service import SESSION_ID_KEY, UserSessionService
 from ..extensions import Security
+from ..identity import LazyIdentity
 from ..models import User
 from ..signals import (confirm_instructions_sent, reset_password_instructions_sent,
                        password_changed, password_reset, user_confirmed, user_registered)
 
+# the request context attributes set while authenticating the current request
+_AUTH_RESULT_ATTRS = ('auth_mechanism_results', 'auth_token_user',
+                      'auth_token_claims', 'auth_token_source',
+                      'auth_token_expires_at', 'user_session')
+
 
 class SecurityService(BaseService):
     def __init__(self,
                  security: Security = injectable,
                  security_utils_service: SecurityUtilsService = injectable,
                  user_manager: UserManager = injectable,
+                 user_session_service: UserSessionService = injectable,
                  mail: Optional[Mail] = None,  # injectable, but optional
                  ):
         self.mail = mail
         self.security = security
         self.security_utils_service = security_utils_service
         self.user_manager = user_manager
+        self.user_session_service = user_session_service
 
     def login_user(self,
                    user: User,
@@ -68,6 +77,8 @@ class SecurityService(BaseService):
         session['user_id'] = getattr(user, user.Meta.pk)
         session['_fresh'] = fresh
         session['_id'] = app.login_manager._session_identifier_generator()
+        if self.user_session_service.enabled:
+            session[SESSION_ID_KEY] = self.user_session_service.create_session(user)
 
         if remember is None:
             remember = app.config.get('SECURITY_DEFAULT_REMEMBER_ME')
@@ -85,9 +96,10 @@ class SecurityService(BaseService):
                                     'instead got: {0}'.format(duration))
 
         _request_ctx_stack.top.user = user
+        _forget_auth_results()
         user_logged_in.send(app._get_current_object(), user=_get_user())
         identity_changed.send(app._get_current_object(),
-                              identity=Identity(user.id))
+                              identity=LazyIdentity(user.id))
         return True
 
     def process_login_errors(self, form):
@@ -124,9 +136,13 @@ class SecurityService(BaseService):
 
         for key in ('identity.name', 'identity.auth_type'):
             session.pop(key, None)
+        session_id = session.pop(SESSION_ID_KEY, None)
+        if session_id and self.user_session_service.enabled:
+            self.user_session_service.revoke_session(session_id)
         identity_changed.send(app._get_current_object(),
                               identity=AnonymousIdentity())
         _logout_user()
+        _forget_auth_results()
 
     def register_user(self, user, allow_login=None, send_email=None):
         """
@@ -182,6 +198,7 @@ class SecurityService(BaseService):
                            either sending or not sending an email.
         """
         user.password = password
+        user.bump_security_stamp()
         self.user_manager.save(user)
         if send_email or (app.config.get('SECURITY_SEND_PASSWORD_CHANGED_EMAIL')
                           and send_email is None):
@@ -204,6 +221,7 @@ class SecurityService(BaseService):
         :return:
         """
         user.password = password
+        user.bump_security_stamp()
         self.user_manager.save(user)
         if app.config.get('SECURITY_SEND_PASSWORD_RESET_NOTICE_EMAIL'):
             self.send_mail(
@@ -282,3 +300,15 @@ class SecurityService(BaseService):
         self.mail.send(subject, to, template, **dict(
             **self.security.run_ctx_processor('mail'),
             **template_ctx))
+
+
+def _forget_auth_results():
+    """
+    Forget the current request's remembered authentication results (see
+    :meth:`Security.authenticate`), along with the token (or session) they were
+    based on, after the user logged in or out.
+    """
+    ctx = _request_ctx_stack.top
+    if ctx is not None:
+        for attr in _AUTH_RESULT_ATTRS:
+            vars(ctx).pop(attr, None)
@@ -1,10 +1,33 @@
 import base64
+import calendar
 import hashlib
 import hmac
 
-from datetime import timedelta
+from flask import _request_ctx_stack, after_this_request
 from flask_unchained import BaseService, current_app, injectable
 from itsdangerous import BadSignature, SignatureExpired
+from sqlalchemy import bindparam, inspect, or_
+from sqlalchemy.orm import joinedload, selectinload, subqueryload
+from sqlalchemy.orm.util import identity_key
+
+from ..hashing import get_inner_scheme, is_wrapped_hash
+from ..policy import parse_within_delta
+
+LEGACY_TOKEN_FORMAT = 'legacy'
+HMAC_V2_TOKEN_FORMAT = 'hmac-v2'
+TOKEN_FORMATS = (LEGACY_TOKEN_FORMAT, HMAC_V2_TOKEN_FORMAT)
+
+# the first element of an hmac-v2 token's data (legacy tokens start with the user id)
+_HMAC_V2_MARKER = 'v2'
+
+# distinguishes the security stamp HMACs of password reset tokens
+_RESET_MARKER = 'reset'
+
+USER_LOADER_STRATEGIES = {
+    'joined': joinedload,
+    'selectin': selectinload,
+    'subquery': subqueryload,
+}
 
 
 class SecurityUtilsService(BaseService):
@@ -19,7 +42,7 @@ class SecurityUtilsService(BaseService):
 
         :param password: The password to sign.
         """
-        salt = current_app.config.get('SECURITY_PASSWORD_SALT')
+        salt = self.security.policy.password_salt
 
         if salt is None:
             raise RuntimeError(
@@ -27,39 +50,295 @@ class SecurityUtilsService(BaseService):
                 'not be None when the value of `SECURITY_PASSWORD_HASH` is '
                 'set to "%s"' % self.security.password_hash)
 
-        h = hmac.new(encode_string(salt), encode_string(password), hashlib.sha512)
+        h = hmac.new(salt, encode_string(password), hashlib.sha512)
         return base64.b64encode(h.digest())
 
     def get_auth_token(self, user):
         """
-        Returns the user's authentication token.
+        Returns the user's authentication token, in the format specified by
+        ``SECURITY_TOKEN_FORMAT``.
         """
-        data = [str(user.id),
-                self.security.hashing_context.hash(encode_string(user._password))]
+        if self.security.token_format == HMAC_V2_TOKEN_FORMAT:
+            data = [_HMAC_V2_MARKER, str(user.id), self.get_auth_token_hmac(user)]
+        else:
+            data = [str(user.id),
+                    self.security.hashing_context.hash(encode_string(user._password))]
+
+        if self.security.token_role_claims:
+            data.append(self.get_role_claims(user))
         return self.security.remember_token_serializer.dumps(data)
 
+    def get_role_claims(self, user):
+        """
+        Returns the role claims to embed in the user's authentication token: a
+        dictionary of the user's sorted role names, their roles version, and the
+        user's security stamp (which changes along with their roles).
+        """
+        role_names = sorted(user.role_names)
+        return {'roles': role_names,
+                'roles_version': self.get_roles_version(role_names),
+                'stamp': self.get_security_stamp(user)}
+
+    def verify_role_claims(self, claims, user):
+        """
+        Returns the role claims if they're still current for the user (ie were
+        issued with their current security stamp), otherwise ``None``, in which
+        case the user's roles must be loaded from the database instead.
+
+        :param claims: The role claims from the user's authentication token.
+        :param user: The user the token belongs to.
+        """
+        if claims and claims.get('stamp') == self.get_security_stamp(user):
+            return claims
+        return None
+
+    def get_roles_version(self, role_names):
+        """
+        Returns a short fingerprint identifying the given set of role names.
+        """
+        data = ','.join(sorted(role_names))
+        return hashlib.sha1(encode_string(data)).hexdigest()[:8]
+
+    @staticmethod
+    def split_auth_token_data(data):
+        """
+        Split (deserialized) authentication token data into its fingerprint data
+        and its role claims (or ``None`` if the token doesn't have any).
+        """
+        if data and isinstance(data[-1], dict):
+            return data[:-1], data[-1]
+        return data, None
+
+    def get_auth_token_hmac(self, user):
+        """
+        Returns the (truncated, urlsafe Base64 encoded) HMAC+SHA256 of the user's
+        id and security stamp, keyed with the ``SECRET_KEY``.
+
+        :param user: The user to sign.
+        """
+        return self._get_security_stamp_hmac(user, _HMAC_V2_MARKER)
+
+    def get_security_stamp(self, user):
+        """
+        Returns the user's security stamp, an integer that changes whenever the
+        user's existing authentication tokens, password reset tokens and sessions
+        should stop being valid. (See :meth:`User.bump_security_stamp`.)
+        """
+        return user.security_stamp or 0
+
+    def _get_security_stamp_hmac(self, user, marker):
+        msg = '%s:%s:%s' % (marker, user.id, self.get_security_stamp(user))
+        h = hmac.new(self.security.policy.secret_key, encode_string(msg),
+                     hashlib.sha256)
+        return base64.urlsafe_b64encode(h.digest()[:16]).rstrip(b'=').decode('ascii')
+
+    def verify_auth_token_data(self, data):
+        """
+        Returns the user identified by the (already signature-checked and
+        deserialized) authentication token data if the token's fingerprint is
+        still valid for them, otherwise ``None``.
+
+        :param data: The data loaded from the token by the remember token serializer
+        """
+        user_id = self._get_auth_token_user_id(data)
+        user = self.get_user(user_id) if user_id is not None else None
+        if user and self._check_auth_token_data(data, user):
+            return user
+        return None
+
+    def verify_auth_tokens(self, tokens):
+        """
+        Verify many authentication tokens at once, eg for an API gateway. Each
+        distinct token is only checked once, the users of all of them are loaded
+        (along with their roles) in a single query, and the token cache is shared
+        with regular token authentication.
+
+        :param tokens: The authentication tokens to verify.
+        :return: A dictionary of each (distinct) token to a tuple of its user, its
+                 role claims (or ``None``) and the Unix timestamp it expires at (or
+                 ``None`` if tokens don't expire), or to ``None`` if the token
+                 isn't valid.
+        """
+        serializer = self.security.remember_token_serializer
+        max_age = self.security.token_max_age
+        token_cache = self.security.auth_token_cache
+
+        results = dict.fromkeys(tokens)
+        loaded = {}
+        for token in results:
+            try:
+                data, signed_at = serializer.loads(token, max_age=max_age,
+                                                   return_timestamp=True)
+                user_id = self._get_auth_token_user_id(data)
+            except Exception:
+                continue
+            if user_id is not None:
+                loaded[token] = (data, user_id,
+                                 self.get_auth_token_expires_at(signed_at))
+
+        users = self.get_users(user_id for _, user_id, _ in loaded.values())
+        checked = {}
+        for token, (data, user_id, expires_at) in loaded.items():
+            user = users.get(str(user_id))
+            if user is None:
+                continue
+
+            entry = (user.id, self.get_security_stamp(user))
+            fingerprint, claims = self.split_auth_token_data(data)
+            if token_cache.get(token) != entry:
+                key = (user.id, tuple(fingerprint))
+                if key not in checked:
+                    checked[key] = self._check_auth_token_data(data, user)
+                if not checked[key]:
+                    continue
+                token_cache.set(token, entry)
+            results[token] = (user, self.verify_role_claims(claims, user), expires_at)
+        return results
+
+    def get_auth_token_expires_at(self, signed_at):
+        """
+        Returns the Unix timestamp an authentication token signed at ``signed_at``
+        expires at, or ``None`` if tokens don't expire (``SECURITY_TOKEN_MAX_AGE``).
+
+        :param signed_at: The (naive, UTC) datetime the token was signed at
+        """
+        max_age = self.security.token_max_age
+        if not max_age:
+            return None
+        return calendar.timegm(signed_at.utctimetuple()) + max_age
+
+    def _get_auth_token_user_id(self, data):
+        data, _ = self.split_auth_token_data(data)
+        if data[0] == _HMAC_V2_MARKER:
+            return data[1]
+        elif self.security.accept_legacy_tokens:
+            return data[0]
+        return None
+
+    def _check_auth_token_data(self, data, user):
+        data, _ = self.split_auth_token_data(data)
+        if data[0] == _HMAC_V2_MARKER:
+            return hmac.compare_digest(encode_string(data[2]),
+                                       encode_string(self.get_auth_token_hmac(user)))
+        return self.verify_hash(data[1], user.password)
+
     def verify_and_update_password(self, password, user):
         """
         Returns ``True`` if the password is valid for the specified user.
 
         Additionally, the hashed password in the database is updated if the
-        hashing algorithm happens to have changed.
+        hashing algorithm happens to have changed. When ``SECURITY_DEFERRED_REHASH``
+        is enabled, the update is queued to run after the response has been sent.
 
         :param password: A plaintext password to verify
         :param user: The user to verify against
         """
-        if self.use_double_hash(user.password):
-            verified = self.security.pwd_context.verify(
-                self.get_hmac(password), user.password)
-        else:
-            # Try with original password.
-            verified = self.security.pwd_context.verify(password, user.password)
-
-        if verified and self.security.pwd_context.needs_update(user.password):
-            user.password = password
-            self.user_manager.save(user)
+        verified = self.verify_password_async(password, user.password).result()
+
+        if verified and self.password_needs_update(user.password):
+            if self.security.rehash_queue.enabled:
+                self.security.rehash_queue.add(user.id, user.password, password)
+                self._schedule_rehash_queue_flush()
+            else:
+                user.password = password
+                self.user_manager.save(user)
         return verified
 
+    def password_needs_update(self, password_hash):
+        """
+        Returns whether or not the password hash should be replaced by a new hash
+        (using the default scheme and options). Wrapped hashes always should be.
+
+        :param password_hash: The password hash to check
+        """
+        return (is_wrapped_hash(password_hash)
+                or self.security.pwd_context.needs_update(password_hash))
+
+    def flush_rehash_queue(self):
+        """
+        Upgrade all of the password hashes waiting in the rehash queue.
+
+        :return: The number of upgraded password hashes
+        """
+        return self.security.rehash_queue.drain(self.rehash_passwords)
+
+    def rehash_passwords(self, batch):
+        """
+        Re-hash and save a batch of passwords in a single (executemany) UPDATE.
+        Users whose password hash has changed since being queued are skipped.
+
+        :param batch: A dictionary of user ids to ``(password_hash, password)``
+                      tuples, where ``password_hash`` is the outdated hash.
+        :return: The number of upgraded password hashes
+        """
+        futures = [(user_id, password_hash, self.hash_password_async(password))
+                   for user_id, (password_hash, password) in batch.items()]
+        params = [dict(_id=user_id, _old_password=password_hash,
+                       _new_password=future.result())
+                  for user_id, password_hash, future in futures]
+
+        return self.save_password_hashes(params)
+
+    def save_password_hashes(self, params):
+        """
+        Save new password hashes in a single (executemany) UPDATE, committed in
+        its own transaction (so that any pending changes in the current database
+        session are neither committed nor rolled back by it). Users whose password
+        hash doesn't match the expected old hash are skipped.
+
+        Afterwards the users' (unmodified) password hashes are expired from the
+        current session, and the users are evicted from the user cache.
+
+        :param params: A list of dictionaries with the ``_id``, ``_old_password``
+                       and ``_new_password`` for each user to update.
+        :return: The number of updated users
+        """
+        if not params:
+            return 0
+
+        db = self.user_manager.db
+        User = self.user_manager.model
+        table = User.__table__
+        stmt = table.update() \
+            .where(table.c.id == bindparam('_id')) \
+            .where(table.c.password == bindparam('_old_password')) \
+            .values(password=bindparam('_new_password'))
+        with db.engine.begin() as connection:
+            result = connection.execute(stmt, params)
+
+        for param in params:
+            user = db.session.identity_map.get(identity_key(User, param['_id']))
+            if user is not None \
+                    and not inspect(user).attrs._password.history.has_changes():
+                db.session.expire(user, ['_password'])
+            self.security.invalidate_cached_user(param['_id'])
+
+        return result.rowcount if result.rowcount >= 0 else len(params)
+
+    def _schedule_rehash_queue_flush(self):
+        ctx = _request_ctx_stack.top
+        if ctx is None:
+            self.flush_rehash_queue()
+            return
+        elif getattr(ctx, 'rehash_queue_flush_scheduled', False):
+            return
+        ctx.rehash_queue_flush_scheduled = True
+
+        app = current_app._get_current_object()
+
+        def flush():
+            with app.app_context():
+                try:
+                    self.flush_rehash_queue()
+                except Exception:
+                    app.logger.exception('Failed to upgrade password hashes')
+
+        @after_this_request
+        def flush_on_close(response):
+            # runs once the response has been sent to the client
+            response.call_on_close(flush)
+            return response
+
     def hash_password(self, password):
         """
         Hash the specified plaintext password.
@@ -68,13 +347,42 @@ class SecurityUtilsService(BaseService):
 
         :param password: The plaintext password to hash
         """
+        return self.hash_password_async(password).result()
+
+    def hash_password_async(self, password):
+        """
+        Hash the specified plaintext password, in the hashing pool when
+        ``SECURITY_HASHING_POOL_SIZE`` is set.
+
+        :param password: The plaintext password to hash
+        :return: A :class:`~concurrent.futures.Future` for the password hash
+        """
         if self.use_double_hash():
             password = self.get_hmac(password).decode('ascii')
 
-        return self.security.pwd_context.hash(
-            password,
-            **current_app.config.get('SECURITY_PASSWORD_HASH_OPTIONS').get(
-                current_app.config.get('SECURITY_PASSWORD_HASH'), {}))
+        return self.security.hashing_pool.hash(password,
+                                               **self.get_password_hash_options())
+
+    def get_password_hash_options(self):
+        """
+        Returns the ``SECURITY_PASSWORD_HASH_OPTIONS`` for the default password
+        hashing scheme.
+        """
+        return self.security.policy.hash_options
+
+    def verify_password_async(self, password, password_hash):
+        """
+        Verify a plaintext password against a password hash, in the hashing pool
+        when ``SECURITY_HASHING_POOL_SIZE`` is set.
+
+        :param password: The plaintext password to verify
+        :param password_hash: The password hash to verify it against
+        :return: A :class:`~concurrent.futures.Future` for whether or not the
+                 password is valid
+        """
+        if self.use_double_hash(password_hash):
+            password = self.get_hmac(password)
+        return self.security.hashing_pool.verify(password, password_hash)
 
     def hash_data(self, data):
         """
@@ -93,18 +401,16 @@ class SecurityUtilsService(BaseService):
         """
         Return a bool indicating whether a password should be hashed twice.
         """
-        single_hash = current_app.config.get('SECURITY_PASSWORD_SINGLE_HASH')
-        if single_hash and self.security.password_salt:
-            raise RuntimeError('You may not specify a salt with '
-                               'SECURITY_PASSWORD_SINGLE_HASH')
-
+        policy = self.security.policy
         if password_hash is None:
-            is_plaintext = self.security.password_hash == 'plaintext'
+            return policy.double_hash
+        elif is_wrapped_hash(password_hash):
+            is_plaintext = get_inner_scheme(password_hash) == 'plaintext'
         else:
             is_plaintext = \
                 self.security.pwd_context.identify(password_hash) == 'plaintext'
 
-        return not (is_plaintext or single_hash)
+        return not (is_plaintext or policy.single_hash)
 
     def generate_confirmation_token(self, user):
         """
@@ -139,8 +445,7 @@ class SecurityUtilsService(BaseService):
 
         :param user: The user to work with
         """
-        password_hash = self.hash_data(user.password) if user.password else None
-        data = [str(user.id), password_hash]
+        data = [str(user.id), self._get_security_stamp_hmac(user, _RESET_MARKER)]
         return self.security.reset_serializer.dumps(data)
 
     def reset_password_token_status(self, token):
@@ -155,9 +460,9 @@ class SecurityUtilsService(BaseService):
         expired, invalid, user, data = self.get_token_status(
             token, 'reset', 'SECURITY_RESET_PASSWORD_WITHIN', return_data=True)
 
-        if (not invalid
-                and user.password
-                and not self.verify_hash(data[1], user.password)):
+        if not invalid and not hmac.compare_digest(
+                encode_string(data[1] or ''),
+                encode_string(self._get_security_stamp_hmac(user, _RESET_MARKER))):
             invalid = True
 
         return expired, invalid, user
@@ -175,8 +480,8 @@ class SecurityUtilsService(BaseService):
         """
         serializer = getattr(self.security, serializer + '_serializer')
 
-        td = self.get_within_delta(max_age)
-        max_age = td.seconds + td.days * 24 * 3600
+        max_age = self.security.policy.max_ages.get(max_age) \
+            or int(self.get_within_delta(max_age).total_seconds())
         user, data = None, None
         expired, invalid = False, False
 
@@ -212,9 +517,10 @@ class SecurityUtilsService(BaseService):
 
         :param key: The config value key without the 'SECURITY_' prefix
         """
-        txt = current_app.config.get(key)
-        values = txt.split()
-        return timedelta(**{values[1]: int(values[0])})
+        td = self.security.policy.within_deltas.get(key)
+        if td is None:
+            td = parse_within_delta(current_app.config.get(key))
+        return td
 
     # FIXME-identity
     @staticmethod
@@ -231,12 +537,182 @@ class SecurityUtilsService(BaseService):
         try:
             user_identifier = int(user_identifier)
         except (ValueError, TypeError):
-            for attr in self.get_identity_attributes():
-                user = self.user_manager.get_by(**{attr: user_identifier})
-                if user:
-                    return user
+            return self.get_user_by_identity(user_identifier)
         else:
-            return self.user_manager.get(user_identifier)
+            return self.get_user(user_identifier)
+
+    def get_user_by_identity(self, value):
+        """
+        Returns the user identified by ``value`` in any of the
+        ``SECURITY_USER_IDENTITY_ATTRIBUTES`` (or ``None``), using a single query.
+        If different users match by different attributes, the user matching the
+        attribute listed first wins.
+
+        :param value: The email address, username, etc. to look for
+        """
+        attrs = self.get_identity_attributes()
+        cache = self.security.user_cache
+        if cache is not None:
+            for attr in attrs:
+                user = self._get_cached_user_by(cache, attr, value)
+                if user is not None:
+                    return user
+
+        User = self.user_manager.model
+        users = self.get_user_query() \
+            .filter(or_(*[getattr(User, attr) == value for attr in attrs])) \
+            .limit(len(attrs)) \
+            .all()
+        for attr in attrs:
+            for user in users:
+                if getattr(user, attr) == value:
+                    if cache is not None:
+                        cache.set(user)
+                        cache.set_id(attr, value, user.id)
+                    return user
+        return None
+
+    def get_unindexed_identity_attributes(self):
+        """
+        Returns the names of the ``SECURITY_USER_IDENTITY_ATTRIBUTES`` which aren't
+        (the leading column of) a database index, or aren't columns at all.
+        """
+        User = self.user_manager.model
+        indexed = set()
+        for column in User.__table__.columns:
+            if column.primary_key or column.index or column.unique:
+                indexed.add(column)
+        for constraint in list(User.__table__.indexes) + [
+                c for c in User.__table__.constraints if hasattr(c, 'columns')]:
+            columns = list(constraint.columns)
+            if columns:
+                indexed.add(columns[0])
+
+        rv = []
+        for attr in self.get_identity_attributes():
+            columns = getattr(getattr(getattr(User, attr, None), 'property', None),
+                              'columns', [])
+            if not columns or columns[0] not in indexed:
+                rv.append(attr)
+        return rv
+
+    def get_user(self, user_id):
+        """
+        Returns the user with the given primary key (or ``None``), loading their
+        roles as configured by ``SECURITY_USER_LOADER_OPTIONS``. Uses the user
+        cache, if ``SECURITY_USER_CACHE`` is enabled.
+
+        :param user_id: The user's primary key
+        """
+        cache = self.security.user_cache
+        if cache is None:
+            return self.get_user_query().get(user_id)
+
+        user = self._get_cached_user(cache, user_id)
+        if user is None:
+            user = self.get_user_query().get(user_id)
+            if user is not None:
+                cache.set(user)
+        return user
+
+    def get_users(self, user_ids):
+        """
+        Returns a dictionary of the users with the given primary keys (keyed by
+        their id as a string), along with their roles, loaded in a single query.
+        Uses the user cache, if ``SECURITY_USER_CACHE`` is enabled.
+
+        :param user_ids: The users' primary keys
+        """
+        cache = self.security.user_cache
+        users, missing = {}, set()
+        for user_id in user_ids:
+            user = self._get_cached_user(cache, user_id) if cache is not None else None
+            if user is not None:
+                users[str(user_id)] = user
+            else:
+                missing.add(_coerce_id(user_id))
+
+        if missing:
+            User = self.user_manager.model
+            options = self.get_user_loader_options() \
+                or self._get_role_loader_options('joined')
+            for user in self.user_manager.q.options(*options) \
+                    .filter(User.id.in_(missing)):
+                users[str(user.id)] = user
+                if cache is not None:
+                    cache.set(user)
+        return users
+
+    def get_user_by(self, attr, value):
+        """
+        Returns the user whose ``attr`` equals ``value`` (or ``None``). Uses the
+        user cache, if ``SECURITY_USER_CACHE`` is enabled.
+
+        :param attr: The name of the attribute to look up the user by
+        :param value: The value to look for
+        """
+        cache = self.security.user_cache
+        if cache is not None:
+            user = self._get_cached_user_by(cache, attr, value)
+            if user is not None:
+                return user
+
+        user = self.get_user_query().filter_by(**{attr: value}).first()
+        if user is not None and cache is not None:
+            cache.set(user)
+            cache.set_id(attr, value, user.id)
+        return user
+
+    def _get_cached_user_by(self, cache, attr, value):
+        user_id = cache.get_id(attr, value)
+        user = self._get_cached_user(cache, user_id) if user_id else None
+        if user is not None and getattr(user, attr) == value:
+            return user
+        return None
+
+    def _get_cached_user(self, cache, user_id):
+        session = self.user_manager.db.session
+        user_id = _coerce_id(user_id)
+
+        # never overwrite the state of an instance already in the session
+        user = session.identity_map.get(identity_key(self.user_manager.model, user_id))
+        if user is not None:
+            return user
+
+        user = cache.get(user_id)
+        return session.merge(user, load=False) if user is not None else None
+
+    def get_user_query(self):
+        """
+        Returns a query for users with the loader options specified by
+        ``SECURITY_USER_LOADER_OPTIONS`` applied.
+        """
+        query = self.user_manager.q
+        options = self.get_user_loader_options()
+        return query.options(*options) if options else query
+
+    def get_user_loader_options(self):
+        """
+        Returns the SQLAlchemy loader options for eagerly loading a user's roles
+        (through the ``user_roles`` relationship) in the configured strategy.
+        """
+        strategy = current_app.config.get('SECURITY_USER_LOADER_OPTIONS')
+        if not strategy:
+            return []
+        return self._get_role_loader_options(strategy)
+
+    def _get_role_loader_options(self, strategy):
+        User = self.user_manager.model
+        UserRole = User.user_roles.property.mapper.class_
+        load_user_roles = USER_LOADER_STRATEGIES[strategy]
+        return [load_user_roles(User.user_roles).joinedload(UserRole.role)]
+
+
+def _coerce_id(user_id):
+    try:
+        return int(user_id)
+    except (ValueError, TypeError):
+        return user_id
 
 
 def encode_string(string):
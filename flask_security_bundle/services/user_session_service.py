@@ -0,0 +1,204 @@
+import secrets
+
+from flask import _request_ctx_stack, has_request_context, session
+from flask_unchained import BaseService, injectable, unchained
+from sqlalchemy import event, inspect, select
+
+from ..models import User
+
+# the key (in the cookie session) of the server-side session's id
+SESSION_ID_KEY = '_security_session_id'
+
+# the session.info key of the session entries to (re)cache, or evict if ``None``,
+# after commit
+_PENDING_SESSIONS = 'security_pending_sessions'
+
+
+class UserSessionService(BaseService):
+    """
+    Creates, validates and revokes server-side
+    :class:`~flask_security_bundle.models.UserSession` records. Sessions are
+    cached in ``SECURITY_SESSION_STORE``, so validating one takes a single key
+    lookup; revoking one (or all of a user's) takes a single indexed delete.
+    Revocations only reach other processes through a shared store.
+
+    Sessions are revoked when their user's security stamp changes, except when
+    users change it themselves (eg by changing their own password): then their
+    current session is kept, and their other sessions are revoked instead.
+    """
+    def __init__(self, db=injectable, security=injectable,
+                 security_utils_service=injectable):
+        self.db = db
+        self.security = security
+        self.security_utils_service = security_utils_service
+
+        if not event.contains(User, 'after_update', self._on_user_updated):
+            event.listen(User, 'after_update', self._on_user_updated,
+                         propagate=True)
+        for name, fn in [('after_commit', self._on_session_committed),
+                         ('after_rollback', self._on_session_rolled_back)]:
+            if not event.contains(db.session, name, fn):
+                event.listen(db.session, name, fn)
+
+    @property
+    def model(self):
+        """
+        The :class:`UserSession` model, or ``None`` if the app hasn't enabled
+        server-side sessions.
+        """
+        return unchained.sqlalchemy_bundle.models.get('UserSession')
+
+    @property
+    def enabled(self):
+        """
+        Whether or not server-side sessions are enabled.
+        """
+        return bool(self.security.server_side_sessions and self.model is not None)
+
+    def create_session(self, user):
+        """
+        Record a new session for the user, returning its id. The session gets
+        saved along with the database session's next commit.
+
+        :param user: The user logging in.
+        """
+        session_id = secrets.token_urlsafe(32)
+        user_session = self.model(session_id=session_id, user=user,
+                                  role_names=','.join(sorted(user.role_names)),
+                                  security_stamp=self.get_security_stamp(user))
+        self.db.session.add(user_session)
+        self._cache_set(session_id, self._to_entry(user_session, user_id=user.id))
+        return session_id
+
+    def get_session(self, session_id):
+        """
+        Returns the (cached) session with the given id as a dictionary of its
+        ``user_id``, ``role_names`` and ``security_stamp``, or ``None`` if the
+        session doesn't exist (anymore).
+
+        :param session_id: The id of the session.
+        """
+        if not session_id:
+            return None
+
+        entry = self._cache_get(session_id)
+        if entry is None:
+            user_session = self.model.query.filter_by(session_id=session_id).first()
+            if user_session is None:
+                return None
+            entry = self._to_entry(user_session)
+            self._cache_set(session_id, entry)
+        return entry
+
+    def get_security_stamp(self, user):
+        """
+        Returns the user's security stamp, to store with their sessions. Sessions
+        are revoked when it changes (eg after a password change).
+        """
+        return self.security_utils_service.get_security_stamp(user)
+
+    def revoke_session(self, session_id):
+        """
+        Revoke the session with the given id. It's deleted in its own transaction
+        (so that any pending changes in the current database session are neither
+        committed nor rolled back by it), since sessions get revoked while loading
+        the current user, and when logging out.
+
+        :param session_id: The id of the session.
+        """
+        table = self.model.__table__
+        with self.db.engine.begin() as connection:
+            connection.execute(table.delete()
+                               .where(table.c.session_id == session_id))
+        self._cache_delete(session_id)
+
+    def revoke_user_sessions(self, user, commit=False):
+        """
+        Revoke all of the user's sessions, ie log them out everywhere. Returns
+        the number of revoked sessions.
+
+        :param user: The user.
+        :param commit: Whether or not to commit the database session.
+        """
+        UserSession = self.model
+        session_ids = [session_id for session_id, in UserSession.query
+                       .with_entities(UserSession.session_id)
+                       .filter_by(user_id=user.id)]
+        UserSession.query.filter_by(user_id=user.id) \
+            .delete(synchronize_session=False)
+        for session_id in session_ids:
+            self._cache_delete(session_id)
+        if commit:
+            self.db.session.commit()
+        return len(session_ids)
+
+    def keep_current_session(self, user, connection):
+        """
+        Keep the current session valid after its user's security stamp changed,
+        by updating its stamp and role snapshot, and revoke all of the user's
+        other sessions. Called while the user is being flushed, with the flush's
+        connection (so it commits, or rolls back, along with the new stamp); the
+        cached sessions are updated after commit.
+
+        :param user: The user whose security stamp changed.
+        :param connection: The connection of the flush.
+        :return: Whether or not the current session belonged to the user.
+        """
+        ctx = _request_ctx_stack.top
+        session_id = session.get(SESSION_ID_KEY)
+        user_session = getattr(ctx, 'user_session', None)
+        if not session_id or not user_session or user_session['user_id'] != user.id:
+            return False
+
+        entry = dict(user_id=user.id, role_names=sorted(user.role_names),
+                     security_stamp=self.get_security_stamp(user))
+        table = self.model.__table__
+        connection.execute(table.update()
+                           .where(table.c.session_id == session_id)
+                           .values(role_names=','.join(entry['role_names']),
+                                   security_stamp=entry['security_stamp']))
+        others = (table.c.user_id == user.id) & (table.c.session_id != session_id)
+        revoked = [other_id for other_id, in connection.execute(
+            select([table.c.session_id]).where(others))]
+        connection.execute(table.delete().where(others))
+
+        pending = inspect(user).session.info.setdefault(_PENDING_SESSIONS, {})
+        pending.update(dict.fromkeys(revoked))
+        pending[session_id] = ctx.user_session = entry
+        return True
+
+    def _on_user_updated(self, mapper, connection, user) -> None:
+        # users changing their own credentials (or roles) stay logged in
+        if has_request_context() and self.enabled and user.active \
+                and inspect(user).attrs.security_stamp.history.has_changes():
+            self.keep_current_session(user, connection)
+
+    def _on_session_committed(self, db_session) -> None:
+        for session_id, entry in db_session.info.pop(_PENDING_SESSIONS, {}).items():
+            if entry is None:
+                self._cache_delete(session_id)
+            else:
+                self._cache_set(session_id, entry)
+
+    def _on_session_rolled_back(self, db_session) -> None:
+        db_session.info.pop(_PENDING_SESSIONS, None)
+
+    def _to_entry(self, user_session, user_id=None):
+        return dict(user_id=user_id or user_session.user_id,
+                    role_names=[role_name for role_name
+                                in (user_session.role_names or '').split(',')
+                                if role_name],
+                    security_stamp=user_session.security_stamp)
+
+    def _cache_get(self, session_id):
+        return self.security.session_store.get(self._cache_key(session_id))
+
+    def _cache_set(self, session_id, entry):
+        self.security.session_store.set(self._cache_key(session_id), entry,
+                                        timeout=self.security.session_store_ttl)
+
+    def _cache_delete(self, session_id):
+        self.security.session_store.delete(self._cache_key(session_id))
+
+    def _cache_key(self, session_id):
+        return f'flask_security_bundle:session:{session_id}'
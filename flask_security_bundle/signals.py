@@ -16,3 +16,7 @@ password_reset = signals.signal('password-reset')
 password_changed = signals.signal('password-changed')
 
 reset_password_instructions_sent = signals.signal('password-reset-instructions-sent')
+
+login_shed = signals.signal('login-shed')
+
+roles_changed = signals.signal('roles-changed')
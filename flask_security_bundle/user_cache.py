@@ -0,0 +1,206 @@
+import hashlib
+import hmac
+import pickle
+import time
+
+from abc import ABC, abstractmethod
+from typing import *
+
+from .cache import TTLCache
+
+# the attributes of users which are never cached
+# (role masks are per-process, see RoleRegistry)
+_EXCLUDED_ATTRIBUTES = ('_password', '_role_mask')
+
+_SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+
+class UserCache(ABC):
+    """
+    Base class for caches of users (and their roles), keyed by the user's id.
+    Users are stored pickled (and detached from any session), so that each
+    request gets its own copy to :meth:`~sqlalchemy.orm.Session.merge` into its
+    session without querying the database. Password hashes aren't cached; they
+    get loaded from the database if (and when) they're needed.
+
+    Identity attribute lookups (eg by email) are cached as aliases to the user's
+    id; it's up to the caller to check the aliased user still matches.
+
+    Subclasses must implement :meth:`_get`, :meth:`_set` and :meth:`_delete`.
+
+    :param ttl: The number of seconds an entry stays valid for.
+    """
+    def __init__(self, ttl: Optional[int] = 300):
+        self.ttl = ttl
+
+    def get(self, user_id):
+        """
+        Returns the (detached) cached user with the given id, or ``None``.
+        """
+        key = self._user_key(user_id)
+        data = self._get(key)
+        return self._loads(key, data) if data is not None else None
+
+    def set(self, user) -> None:
+        """
+        Cache the user, along with their roles (which get loaded if necessary).
+        """
+        for user_role in user.user_roles:
+            user_role.role  # make sure the roles get pickled too
+        key = self._user_key(user.id)
+        self._set(key, self._dumps(key, user))
+
+    def get_id(self, attr: str, value):
+        """
+        Returns the id of the user last looked up by ``attr == value``, or ``None``.
+        """
+        return self._get(self._alias_key(attr, value))
+
+    def set_id(self, attr: str, value, user_id) -> None:
+        """
+        Remember the id of the user looked up by ``attr == value``.
+        """
+        self._set(self._alias_key(attr, value), user_id)
+
+    def delete(self, user_id) -> None:
+        """
+        Remove the cached user with the given id (if any).
+        """
+        self._delete(self._user_key(user_id))
+
+    def _user_key(self, user_id) -> str:
+        return f'user:{user_id}'
+
+    def _alias_key(self, attr: str, value) -> str:
+        return f'{attr}:{value}'
+
+    def _dumps(self, key: str, user) -> bytes:
+        # pickle a (detached) copy of the user, without their password hash
+        user = pickle.loads(pickle.dumps(user, protocol=pickle.HIGHEST_PROTOCOL))
+        for attr in _EXCLUDED_ATTRIBUTES:
+            user.__dict__.pop(attr, None)
+        return pickle.dumps(user, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _loads(self, key: str, data: bytes):
+        return pickle.loads(data)
+
+    @abstractmethod
+    def _get(self, key: str):
+        pass
+
+    @abstractmethod
+    def _set(self, key: str, value) -> None:
+        pass
+
+    @abstractmethod
+    def _delete(self, key: str) -> None:
+        pass
+
+
+class LocalUserCache(UserCache):
+    """
+    A per-process user cache with least-recently-used eviction.
+
+    Users are only evicted from the cache of the process that changed them, so
+    when running more than one process, the others may keep using a stale copy
+    until it expires (after ``ttl`` seconds). Use a :class:`SharedUserCache`
+    instead if that isn't acceptable.
+
+    :param maxsize: The maximum number of entries to keep.
+    :param ttl: The number of seconds an entry stays valid for.
+    """
+    def __init__(self, maxsize: int = 1024, ttl: Optional[int] = 300):
+        super().__init__(ttl=ttl)
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def _get(self, key: str):
+        return self.cache.get(key)
+
+    def _set(self, key: str, value) -> None:
+        self.cache.set(key, value)
+
+    def _delete(self, key: str) -> None:
+        self.cache.delete(key)
+
+
+class SharedUserCache(UserCache):
+    """
+    A user cache shared between processes (and servers), through a key-value
+    store with ``get(key)``, ``set(key, value, timeout)`` and ``delete(key)``
+    methods, for example one of :mod:`cachelib`'s (or Werkzeug's) ``RedisCache``
+    or ``MemcachedCache``.
+
+    Cached users are signed with an HMAC of ``secret_key``, and entries with an
+    invalid signature are ignored (rather than unpickled). The store should still
+    only be reachable by the application, since most stores pickle values too.
+
+    :param secret_key: The key to sign cached users with (eg the ``SECRET_KEY``).
+    :param store: The key-value store. Defaults to a :class:`LocalStore`.
+    :param ttl: The number of seconds an entry stays valid for.
+    :param key_prefix: A prefix for all of the keys in the store.
+    """
+    def __init__(self,
+                 secret_key: Union[str, bytes],
+                 store=None,
+                 ttl: Optional[int] = 300,
+                 key_prefix: str = 'flask_security_bundle:',
+                 ):
+        if not secret_key:
+            raise ValueError('A secret key is required to sign cached users')
+
+        super().__init__(ttl=ttl)
+        self.secret_key = (secret_key.encode('utf-8')
+                           if isinstance(secret_key, str) else secret_key)
+        self.store = store if store is not None else LocalStore()
+        self.key_prefix = key_prefix
+
+    def _dumps(self, key: str, user) -> bytes:
+        data = super()._dumps(key, user)
+        return self._sign(key, data) + data
+
+    def _loads(self, key: str, data: bytes):
+        signature, data = data[:_SIGNATURE_SIZE], data[_SIGNATURE_SIZE:]
+        if not hmac.compare_digest(signature, self._sign(key, data)):
+            return None
+        return super()._loads(key, data)
+
+    def _sign(self, key: str, data: bytes) -> bytes:
+        return hmac.new(self.secret_key, key.encode('utf-8') + b'\0' + data,
+                        hashlib.sha256).digest()
+
+    def _get(self, key: str):
+        return self.store.get(self.key_prefix + key)
+
+    def _set(self, key: str, value) -> None:
+        self.store.set(self.key_prefix + key, value, timeout=self.ttl)
+
+    def _delete(self, key: str) -> None:
+        self.store.delete(self.key_prefix + key)
+
+
+class LocalStore:
+    """
+    An in-process stand-in for a shared key-value store, for development and
+    testing. Values are pickled, like a real store would.
+
+    :param maxsize: The maximum number of entries to keep.
+    :param timer: The clock to use. Defaults to :func:`time.monotonic`.
+    """
+    def __init__(self, maxsize: int = 1024, timer: Callable[[], float] = time.monotonic):
+        self.timer = timer
+        self._cache = TTLCache(maxsize=maxsize, ttl=None)
+
+    def get(self, key: str):
+        expires_at, data = self._cache.get(key, (None, None))
+        if data is None or (expires_at is not None and expires_at <= self.timer()):
+            return None
+        return pickle.loads(data)
+
+    def set(self, key: str, value, timeout: Optional[int] = None) -> bool:
+        expires_at = self.timer() + timeout if timeout else None
+        self._cache.set(key, (expires_at,
+                              pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+        return True
+
+    def delete(self, key: str) -> bool:
+        return self._cache.delete(key)
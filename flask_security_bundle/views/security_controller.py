@@ -1,4 +1,6 @@
-from flask import current_app as app, request
+import hashlib
+
+from flask import current_app as app, jsonify, request
 from flask_unchained import Controller, route, lazy_gettext as _
 from flask_unchained import injectable
 from flask_unchained.bundles.sqlalchemy import SessionManager
@@ -7,7 +9,9 @@ from werkzeug.datastructures import MultiDict
 
 from ..decorators import anonymous_user_required, auth_required
 from ..extensions import Security
+from ..hashing import HashingCapacityError
 from ..services import SecurityService, SecurityUtilsService
+from ..signals import login_shed
 from ..utils import current_user
 
 
@@ -28,11 +32,65 @@ class SecurityController(Controller):
         """
         View function to check a token, and if it's valid, log the user in.
 
+        Responds with the serialized user, or with just their ``user_id``,
+        ``roles_version`` and token ``expires_at`` if
+        ``SECURITY_CHECK_AUTH_TOKEN_RESPONSE`` is ``minimal``; minimal responses
+        have an ``ETag``, and requests with a matching ``If-None-Match`` header
+        get a 304 (NOT MODIFIED). ``HEAD`` requests only get the status code.
+
         Disabled by default; must be explicitly enabled in your ``routes.py``.
         """
         # the auth_required decorator verifies the token and sets current_user,
         # just need to return a success response
-        return self.jsonify({'user': current_user})
+        if app.config.get('SECURITY_CHECK_AUTH_TOKEN_RESPONSE') != 'minimal':
+            if request.method == 'HEAD':
+                return '', HTTPStatus.OK
+            return self.jsonify({'user': current_user})
+
+        data = {
+            'user_id': current_user.id,
+            'roles_version': self.security_utils_service.get_roles_version(
+                self.security.get_current_role_names()),
+            'expires_at': self.security.get_auth_token_expiry(),
+        }
+        etag = hashlib.sha1('{user_id}:{roles_version}:{expires_at}'.format(
+            **data).encode('utf-8')).hexdigest()[:16]
+        response = jsonify(data)
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    @route(methods=['POST'],
+           only_if=lambda app: app.config.get('SECURITY_BATCH_TOKEN_VERIFICATION'))
+    @auth_required(mechanisms=['api_key'])
+    def verify_auth_tokens(self):
+        """
+        View function to verify a batch of authentication tokens at once, eg for
+        an API gateway. Expects a JSON array of tokens (or an object with a
+        ``tokens`` array), and responds with their ``results``, in the same order:
+        ``null`` for invalid tokens, otherwise the token's ``user_id``, ``roles``
+        and ``expires_at`` (a Unix timestamp, or ``null`` if tokens don't expire).
+
+        Callers must authenticate with an API key (see
+        :class:`~flask_security_bundle.models.ApiKey`).
+        """
+        tokens = request.get_json(silent=True)
+        if isinstance(tokens, dict):
+            tokens = tokens.get('tokens')
+        if not isinstance(tokens, list) \
+                or not all(isinstance(token, str) for token in tokens):
+            return self.jsonify({'error': 'Expected a JSON array of tokens.'},
+                                code=HTTPStatus.BAD_REQUEST)
+
+        max_size = app.config.get('SECURITY_BATCH_TOKEN_VERIFICATION_MAX_SIZE')
+        if max_size and len(tokens) > max_size:
+            return self.jsonify({'error': f'Expected at most {max_size} tokens.'},
+                                code=HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+        verified = self.security_utils_service.verify_auth_tokens(tokens)
+        return self.jsonify({'results': [self._get_token_result(verified[token])
+                                         for token in tokens]})
 
     @route(methods=['GET', 'POST'])
     @anonymous_user_required(msg='You are already logged in', category='success')
@@ -41,7 +99,12 @@ class SecurityController(Controller):
         View function to log a user in. Supports html and json requests.
         """
         form = self._get_form('SECURITY_LOGIN_FORM')
-        if (form.validate_on_submit()
+        try:
+            validated = form.validate_on_submit()
+        except HashingCapacityError as e:
+            return self._login_unavailable(form, e.retry_after)
+
+        if (validated
                 and self.security_service.login_user(form.user, form.remember.data)):
             self.after_this_request(self._commit)
             if request.is_json:
@@ -253,6 +316,35 @@ class SecurityController(Controller):
                            change_password_form=form,
                            **self.security.run_ctx_processor('change_password'))
 
+    def _login_unavailable(self, form, retry_after):
+        """
+        Respond to a login that was shed for a lack of password hashing capacity.
+        """
+        login_shed.send(app._get_current_object(),
+                        **self.security.hashing_limiter.stats())
+
+        msg = _('flask_security_bundle.error.login_unavailable')
+        headers = {'Retry-After': str(retry_after)}
+        if request.is_json:
+            return self.jsonify({'error': msg},
+                                code=HTTPStatus.SERVICE_UNAVAILABLE,
+                                headers=headers)
+
+        self.flash(msg, category='error')
+        return (self.render('login',
+                            login_user_form=form,
+                            **self.security.run_ctx_processor('login')),
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                headers)
+
+    def _get_token_result(self, verified):
+        if verified is None:
+            return None
+        user, claims, expires_at = verified
+        return {'user_id': user.id,
+                'roles': claims['roles'] if claims else sorted(user.role_names),
+                'expires_at': expires_at}
+
     def _get_form(self, name):
         form_cls = app.config.get(name)
         if request.is_json:
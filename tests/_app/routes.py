@@ -17,6 +17,7 @@ routes = lambda: [
     prefix('/api/v1', [
         controller('/auth', SecurityController, rules=[
             get('/check-auth-token', SecurityController.check_auth_token, only_if=True),
+            post('/verify-auth-tokens', SecurityController.verify_auth_tokens),
             post('/login', SecurityController.login, endpoint='security_api.login'),
             get('/logout', SecurityController.logout, endpoint='security_api.logout'),
             post('/send-confirmation-email', SecurityController.send_confirmation_email,
@@ -1,3 +1,3 @@
-from flask_security_bundle.models import UserRole
+from flask_security_bundle.models import ApiKey, UserRole, UserSession
 from .role import Role
 from .user import User
@@ -6,3 +6,8 @@ class User(BaseUser):
     username = db.Column(db.String(64), nullable=True)
     first_name = db.Column(db.String(64), nullable=True)
     last_name = db.Column(db.String(64), nullable=True)
+
+    api_keys = db.relationship('ApiKey', back_populates='user',
+                               cascade='all, delete-orphan')
+    user_sessions = db.relationship('UserSession', back_populates='user',
+                                    cascade='all, delete-orphan')
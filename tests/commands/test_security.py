@@ -0,0 +1,50 @@
+import pytest
+import traceback
+
+from flask_security_bundle.commands.security import (
+    COST_SETTINGS, calibrate_hash, check_indexes, _percentile)
+
+
+class TestSecurityCommands:
+    def test_percentile(self):
+        values = [0.5, 0.1, 0.4, 0.2, 0.3]
+        assert _percentile(values, 50) == 0.3
+        assert _percentile(values, 99) == 0.5
+        assert _percentile([0.1], 99) == 0.1
+
+    def test_calibrate_hash(self, cli_runner, monkeypatch):
+        monkeypatch.setitem(COST_SETTINGS, 'pbkdf2_sha512',
+                            [dict(rounds=1000), dict(rounds=2000)])
+        result = cli_runner.invoke(calibrate_hash, args=[
+            '--scheme', 'pbkdf2_sha512', '--concurrency', '1,2',
+            '--samples', '2', '--target-ms', '10000'])
+        assert result.exit_code == 0, traceback.print_exception(*result.exc_info)
+
+        lines = result.output.strip().splitlines()
+        assert lines[0].split()[:3] == ['Scheme', 'Settings', 'Threads']
+        assert len([line for line in lines
+                    if line.startswith('pbkdf2_sha512')]) == 4
+        assert lines[-1] == ("SECURITY_PASSWORD_HASH_OPTIONS = "
+                             "{'pbkdf2_sha512': {'rounds': 2000}}")
+
+    def test_calibrate_hash_over_budget(self, cli_runner, monkeypatch):
+        monkeypatch.setitem(COST_SETTINGS, 'pbkdf2_sha512',
+                            [dict(rounds=1000)])
+        result = cli_runner.invoke(calibrate_hash, args=[
+            '--scheme', 'pbkdf2_sha512', '--concurrency', '1',
+            '--samples', '1', '--target-ms', '0'])
+        assert result.exit_code == 0, traceback.print_exception(*result.exc_info)
+        assert result.output.strip().splitlines()[-1] == \
+            'None of the benchmarked settings fit within 0ms.'
+
+    def test_check_indexes(self, cli_runner):
+        result = cli_runner.invoke(check_indexes)
+        assert result.exit_code == 0, traceback.print_exception(*result.exc_info)
+        assert 'are indexed' in result.output
+
+    @pytest.mark.options(SECURITY_USER_IDENTITY_ATTRIBUTES=['email', 'first_name'])
+    def test_check_indexes_unindexed(self, cli_runner):
+        result = cli_runner.invoke(check_indexes)
+        assert result.exit_code == 1
+        assert 'SECURITY_USER_IDENTITY_ATTRIBUTES first_name are not indexed' \
+            in result.output
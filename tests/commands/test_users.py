@@ -3,7 +3,21 @@ import traceback
 
 from flask_security_bundle.commands.users import (
     list_users, create_user, delete_user, set_password, confirm_user, activate_user,
-    deactivate_user, add_role_to_user, remove_role_from_user)
+    deactivate_user, add_role_to_user, remove_role_from_user, upgrade_hashes,
+    backfill_security_stamps, issue_api_key, list_api_keys, revoke_api_key)
+from flask_security_bundle.hashing import is_wrapped_hash
+
+
+@pytest.fixture()
+def nullable_security_stamp(db, user_manager, monkeypatch):
+    """
+    Re-create the tables with a nullable ``security_stamp`` column, like it is
+    before running the backfill.
+    """
+    db.drop_all()
+    monkeypatch.setattr(user_manager.model.__table__.c.security_stamp,
+                        'nullable', True)
+    db.create_all()
 
 
 @pytest.mark.security_bundle('flask_security_bundle')
@@ -127,3 +141,90 @@ class TestUsersCommands:
             f"Successfully removed Role(id=1, name='{role.name}') " \
             f"from User(id=1, email='user@example.com', active=True)"
         assert not user.roles
+
+    @pytest.mark.options(SECURITY_PASSWORD_HASH='pbkdf2_sha512',
+                         SECURITY_PASSWORD_SCHEMES=['pbkdf2_sha512', 'sha512_crypt',
+                                                    'plaintext'],
+                         SECURITY_PASSWORD_HASH_OPTIONS={
+                             'pbkdf2_sha512': {'rounds': 1000}})
+    @pytest.mark.users(dict(username='user1', email='user1@example.com'),
+                       dict(username='user2', email='user2@example.com'),
+                       dict(username='user3', email='user3@example.com'))
+    def test_upgrade_hashes(self, users, cli_runner, security, security_utils_service,
+                            user_manager):
+        legacy = security.pwd_context.handler('sha512_crypt').using(rounds=1000)
+        for user in users[:2]:
+            user._password = legacy.hash(security_utils_service.get_hmac('password'))
+        user_manager.commit()
+        current_hash = users[2].password
+
+        result = cli_runner.invoke(upgrade_hashes, args=[
+            '--batch-size', '2', '--workers', '0', '--after-id', str(users[0].id)])
+        assert result.exit_code == 0, traceback.print_exception(*result.exc_info)
+        lines = result.output.strip().splitlines()
+        assert lines[0].startswith(f'Upgraded 1 of 2 users (last id: {users[2].id}, ')
+        assert lines[-1].startswith('Done. Upgraded 1 password hashes in ')
+
+        for user in users:
+            user_manager.refresh(user)
+        assert not is_wrapped_hash(users[0].password)
+        assert is_wrapped_hash(users[1].password)
+        assert users[2].password == current_hash
+
+        assert not security_utils_service.verify_and_update_password('wrong', users[1])
+        assert security_utils_service.verify_and_update_password('password', users[1])
+        assert security.pwd_context.identify(users[1].password) == 'pbkdf2_sha512'
+
+    @pytest.mark.users(dict(username='user1', email='user1@example.com'),
+                       dict(username='user2', email='user2@example.com'),
+                       dict(username='user3', email='user3@example.com'))
+    def test_backfill_security_stamps(self, nullable_security_stamp, users,
+                                      cli_runner, user_manager):
+        User = user_manager.model
+        users[0].security_stamp = 3
+        user_manager.query.filter(User.id != users[0].id) \
+            .update({User.security_stamp: None}, synchronize_session=False)
+        user_manager.commit()
+
+        result = cli_runner.invoke(backfill_security_stamps, args=['--batch-size', '1'])
+        assert result.exit_code == 0, traceback.print_exception(*result.exc_info)
+        assert result.output.strip().splitlines()[-1] == \
+            'Done. Backfilled the security stamps of 2 users.'
+        assert user_manager.query.filter(User.security_stamp.is_(None)).count() == 0
+        # the stamp users without one were already treated as having
+        assert user_manager.query.filter(User.security_stamp == 0).count() == 2
+        assert users[0].security_stamp == 3
+
+
+@pytest.mark.security_bundle('flask_security_bundle')
+class TestApiKeyCommands:
+    def test_issue_api_key(self, user, cli_runner, api_key_service):
+        result = cli_runner.invoke(issue_api_key, args=['email=user@example.com',
+                                                        '--name', 'ci'],
+                                   input='y\n')
+        assert result.exit_code == 0, traceback.print_exception(*result.exc_info)
+        key = result.output.strip().splitlines()[-2]
+        assert api_key_service.get_user_by_api_key(key) == user
+
+    def test_list_api_keys(self, user, cli_runner, api_key_service):
+        api_key, _ = api_key_service.create_api_key(user, name='ci', commit=True)
+        result = cli_runner.invoke(list_api_keys, args=['email=user@example.com'])
+        assert result.exit_code == 0, traceback.print_exception(*result.exc_info)
+        assert api_key.prefix in result.output.strip().splitlines()[-1]
+
+    def test_revoke_api_key(self, user, cli_runner, api_key_service):
+        api_key, key = api_key_service.create_api_key(user, commit=True)
+        result = cli_runner.invoke(revoke_api_key, args=[api_key.prefix],
+                                   input='y\n')
+        assert result.exit_code == 0, traceback.print_exception(*result.exc_info)
+        assert api_key_service.get_user_by_api_key(key) is None
+
+    @pytest.mark.parametrize('command, args', [(issue_api_key, ['id=1']),
+                                               (list_api_keys, []),
+                                               (revoke_api_key, ['prefix'])])
+    def test_api_keys_not_enabled(self, cli_runner, api_key_service, monkeypatch,
+                                  command, args):
+        monkeypatch.setattr(type(api_key_service), 'model', property(lambda self: None))
+        result = cli_runner.invoke(command, args=args)
+        assert result.exit_code == 1
+        assert 'API keys are not enabled' in result.output
@@ -1,7 +1,9 @@
 import factory
 import pytest
 
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from sqlalchemy import event
 
 from flask_unchained import AppFactory, TEST
 from flask_unchained.bundles.sqlalchemy.pytest import *
@@ -121,3 +123,39 @@ def admin(request):
                   _user_role__role__name='ROLE_ADMIN')
     kwargs.setdefault('user_role__role__name', 'ROLE_USER')
     return UserWithTwoRolesFactory(**kwargs)
+
+
+@pytest.fixture()
+def count_queries(db):
+    """
+    Returns a context manager that records the SQL statements executed in it.
+    """
+    @contextmanager
+    def counter():
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return counter
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def timer():
+    """
+    Returns a fake clock, whose time (``now``) only changes when set.
+    """
+    return FakeTimer()
@@ -1,7 +1,10 @@
 import pytest
 
+from flask import _request_ctx_stack, request
+from flask_principal import identity_loaded
 from flask_security_bundle.decorators import (
     auth_required,
+    auth_required_same_user,
     # roles_accepted,  # tested by tests for auth_required
     # roles_required,  # tested by tests for auth_required
 )
@@ -174,3 +177,58 @@ class TestAuthRequired:
 
         with pytest.raises(MethodCalled):
             method()
+
+
+@pytest.mark.usefixtures('user')
+class TestAuthMemoization:
+    def test_nested_decorators_authenticate_once(self, app, user, security,
+                                                 security_utils_service,
+                                                 monkeypatch):
+        verifications = []
+        verify_auth_token_data = security_utils_service.verify_auth_token_data
+
+        def spy(data):
+            verifications.append(data)
+            return verify_auth_token_data(data)
+        monkeypatch.setattr(security_utils_service, 'verify_auth_token_data', spy)
+
+        identity_loads = []
+
+        def record(sender, identity):
+            identity_loads.append(identity)
+        identity_loaded.connect(record)
+
+        @auth_required
+        @auth_required(role='ROLE_USER')
+        @auth_required_same_user
+        def method(id):
+            raise MethodCalled
+
+        token = user.get_auth_token()
+        try:
+            with app.test_request_context('/', headers={'Authentication-Token': token}):
+                request.view_args = {'id': user.id}
+                with pytest.raises(MethodCalled):
+                    method(id=user.id)
+        finally:
+            identity_loaded.disconnect(record)
+
+        assert len(verifications) == 1
+        assert len(identity_loads) == 1
+
+    def test_logout_forgets_the_token(self, app, user, security, security_service):
+        @auth_required
+        def method():
+            raise MethodCalled
+
+        token = user.get_auth_token()
+        with app.test_request_context('/', headers={'Authentication-Token': token}):
+            with pytest.raises(MethodCalled):
+                method()
+            ctx = _request_ctx_stack.top
+            assert ctx.auth_token_user == user
+
+            security_service.logout_user()
+            for attr in ('auth_mechanism_results', 'auth_token_user',
+                         'auth_token_claims'):
+                assert not hasattr(ctx, attr)
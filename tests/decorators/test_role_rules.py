@@ -0,0 +1,59 @@
+import pytest
+
+from flask_principal import Identity, RoleNeed, UserNeed
+
+from flask_security_bundle.decorators.role_rules import RoleRules
+
+
+def identity_with(*roles, role_mask=None):
+    identity = Identity(1)
+    identity.provides.add(UserNeed(1))
+    identity.provides.update(RoleNeed(role) for role in roles)
+    if role_mask is not None:
+        identity.role_mask = role_mask
+    return identity
+
+
+class TestRoleRules:
+    def test_no_rules(self):
+        rules = RoleRules()
+        assert not rules
+        assert rules.allows(identity_with())
+        assert rules.allows(None)
+
+    def test_required(self):
+        rules = RoleRules(required=['ROLE_USER', 'ROLE_ADMIN'])
+        assert rules.allows(identity_with('ROLE_USER', 'ROLE_ADMIN', 'ROLE_OTHER'))
+        assert not rules.allows(identity_with('ROLE_USER'))
+        assert not rules.allows(None)
+
+    def test_one_of(self):
+        rules = RoleRules(one_of=['ROLE_USER', 'ROLE_ADMIN'])
+        assert rules.allows(identity_with('ROLE_ADMIN'))
+        assert not rules.allows(identity_with('ROLE_OTHER'))
+
+    def test_required_and_one_of(self):
+        rules = RoleRules(required=['ROLE_USER'], one_of=['ROLE_A', 'ROLE_B'])
+        assert rules.allows(identity_with('ROLE_USER', 'ROLE_B'))
+        assert not rules.allows(identity_with('ROLE_USER'))
+        assert not rules.allows(identity_with('ROLE_B'))
+
+
+@pytest.mark.usefixtures('user')
+class TestRoleRulesMasks:
+    def test_allows_mask(self, user, role_registry):
+        rules = RoleRules(required=['ROLE_USER'], one_of=['ROLE_USER1', 'ROLE_X'])
+        assert rules.allows_mask(user.role_mask)
+        assert not rules.allows_mask(role_registry.get_mask(['ROLE_USER']))
+        assert not RoleRules(required=['ROLE_UNKNOWN']).allows_mask(user.role_mask)
+
+    def test_falls_back_to_provides(self, user):
+        rules = RoleRules(required=['ROLE_USER', 'ROLE_FROM_APP'])
+        assert not rules.allows(identity_with('ROLE_USER', role_mask=user.role_mask))
+        assert rules.allows(identity_with('ROLE_USER', 'ROLE_FROM_APP',
+                                          role_mask=user.role_mask))
+
+    def test_uses_mask(self, user):
+        rules = RoleRules(required=['ROLE_USER1'])
+        # the mask alone is enough to allow access
+        assert rules.allows(identity_with(role_mask=user.role_mask))
@@ -0,0 +1,106 @@
+import pytest
+
+from threading import Thread
+
+from flask_security_bundle.decorators import auth_required
+from flask_security_bundle.mechanisms import AuthMechanism
+from werkzeug.exceptions import Unauthorized
+
+
+class MethodCalled(Exception):
+    pass
+
+
+def stats(security, name):
+    return security.get_auth_mechanism_stats()[name]
+
+
+@pytest.mark.usefixtures('user')
+class TestAuthMechanisms:
+    def test_defaults(self, security):
+        assert security.auth_mechanism_names == ('token', 'session')
+        assert set(security.auth_mechanisms) >= {'token', 'session'}
+
+    def test_counters(self, client, security):
+        client.login_user()
+
+        @auth_required
+        def method():
+            raise MethodCalled
+
+        with pytest.raises(MethodCalled):
+            method()
+        assert stats(security, 'token') == dict(attempts=1, successes=0)
+        assert stats(security, 'session') == dict(attempts=1, successes=1)
+
+    @pytest.mark.options(SECURITY_AUTH_MECHANISMS=['session', 'token'])
+    def test_order(self, client, security):
+        client.login_user()
+
+        @auth_required
+        def method():
+            raise MethodCalled
+
+        with pytest.raises(MethodCalled):
+            method()
+        assert stats(security, 'session') == dict(attempts=1, successes=1)
+        assert stats(security, 'token') == dict(attempts=0, successes=0)
+
+    def test_per_view_override(self, client, security):
+        client.login_user()
+
+        @auth_required(mechanisms=['session'])
+        def method():
+            raise MethodCalled
+
+        with pytest.raises(MethodCalled):
+            method()
+        assert stats(security, 'token')['attempts'] == 0
+
+    def test_session_ignores_auth_tokens(self, app, security, user):
+        @auth_required(mechanisms=['session'])
+        def method():
+            raise MethodCalled
+
+        with app.test_request_context('/', headers={
+                'Authentication-Token': user.get_auth_token()}):
+            with pytest.raises(Unauthorized):
+                method()
+        assert stats(security, 'session') == dict(attempts=1, successes=0)
+        assert stats(security, 'token')['attempts'] == 0
+
+    def test_custom_mechanism(self, security):
+        calls = []
+
+        @security.auth_mechanism('custom')
+        def custom():
+            calls.append(True)
+            return False
+
+        @auth_required(mechanisms=['custom'])
+        def method():
+            raise MethodCalled
+
+        with pytest.raises(Unauthorized):
+            method()
+        assert calls == [True]
+        assert stats(security, 'custom') == dict(attempts=1, successes=0)
+
+    def test_unknown_mechanism(self, security):
+        @auth_required(mechanisms=['unknown'])
+        def method():
+            raise MethodCalled
+
+        with pytest.raises(ValueError):
+            method()
+
+    def test_counters_are_thread_safe(self):
+        mechanism = AuthMechanism('test', lambda: True)
+        threads = [Thread(target=lambda: [mechanism.authenticate()
+                                          for _ in range(1000)])
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert mechanism.stats() == dict(attempts=8000, successes=8000)
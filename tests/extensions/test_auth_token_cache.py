@@ -0,0 +1,54 @@
+import pytest
+
+
+@pytest.mark.options(SECURITY_TOKEN_CACHE_SIZE=10)
+class TestAuthTokenCache:
+    def test_verified_token_is_cached(self, api_client, user, security):
+        token = user.get_auth_token()
+
+        r = api_client.get('security_controller.check_auth_token',
+                           headers={'Authentication-Token': token})
+        assert r.status_code == 200
+        assert token in security.auth_token_cache
+
+        r = api_client.get('security_controller.check_auth_token',
+                           headers={'Authentication-Token': token})
+        assert r.status_code == 200
+        assert security.auth_token_cache.hits == 1
+
+    def test_evicted_on_password_change(self, api_client, user, security,
+                                        security_service):
+        token = user.get_auth_token()
+        api_client.get('security_controller.check_auth_token',
+                       headers={'Authentication-Token': token})
+        assert token in security.auth_token_cache
+
+        security_service.change_password(user, 'new password', send_email=False)
+        assert token not in security.auth_token_cache
+
+        r = api_client.get('security_controller.check_auth_token',
+                           headers={'Authentication-Token': token})
+        assert r.status_code == 401
+
+    def test_invalid_token_not_cached(self, api_client, user, security):
+        r = api_client.get('security_controller.check_auth_token',
+                           headers={'Authentication-Token': 'invalid'})
+        assert r.status_code == 401
+        assert len(security.auth_token_cache) == 0
+
+    @pytest.mark.options(SECURITY_TOKEN_FORMAT='hmac-v2')
+    def test_stale_entry_rejected(self, db, api_client, user, security):
+        token = user.get_auth_token()
+        api_client.get('security_controller.check_auth_token',
+                       headers={'Authentication-Token': token})
+        assert token in security.auth_token_cache
+
+        # eg the password was changed by another process, which can't evict
+        # this process' cache entry
+        user.bump_security_stamp()
+        db.session.commit()
+        assert token in security.auth_token_cache
+
+        r = api_client.get('security_controller.check_auth_token',
+                           headers={'Authentication-Token': token})
+        assert r.status_code == 401
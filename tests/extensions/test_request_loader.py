@@ -0,0 +1,59 @@
+import pytest
+
+from flask import _request_ctx_stack
+
+
+def load_user(app, security, **kwargs):
+    with app.test_request_context('/', **kwargs):
+        user = security._request_loader(_request_ctx_stack.top.request)
+        return user, getattr(_request_ctx_stack.top, 'auth_token_source', None)
+
+
+@pytest.mark.usefixtures('user')
+class TestRequestLoader:
+    def test_anonymous_without_token(self, app, security, count_queries):
+        with count_queries() as statements:
+            user, source = load_user(app, security)
+        assert user is security.anonymous_user
+        assert source is None
+        assert statements == []
+
+    def test_anonymous_user_is_a_singleton(self, app, security):
+        assert load_user(app, security)[0] is load_user(app, security)[0]
+
+    def test_header(self, app, security, user):
+        user, source = load_user(app, security, headers={
+            'Authentication-Token': user.get_auth_token()})
+        assert user.email == 'user@example.com'
+        assert source == 'header'
+
+    def test_args(self, app, security, user):
+        user, source = load_user(app, security, query_string={
+            'auth_token': user.get_auth_token()})
+        assert user.email == 'user@example.com'
+        assert source == 'args'
+
+    def test_json_body_ignored_by_default(self, app, security, user):
+        user, source = load_user(app, security,
+                                 json={'auth_token': user.get_auth_token()})
+        assert user is security.anonymous_user
+        assert source is None
+
+    @pytest.mark.options(SECURITY_TOKEN_SOURCES=['json', 'header'])
+    def test_json_body(self, app, security, user):
+        user, source = load_user(app, security,
+                                 json={'auth_token': user.get_auth_token()},
+                                 headers={'Authentication-Token': 'invalid'})
+        assert user.email == 'user@example.com'
+        assert source == 'json'
+
+    def test_invalid_token(self, app, security):
+        user, source = load_user(app, security,
+                                 headers={'Authentication-Token': 'invalid'})
+        assert user is security.anonymous_user
+        assert source == 'header'
+
+    def test_invalid_source(self, app, security):
+        app.config['SECURITY_TOKEN_SOURCES'] = ['cookie']
+        with pytest.raises(ValueError):
+            security.init_app(app)
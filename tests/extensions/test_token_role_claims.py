@@ -0,0 +1,63 @@
+import pytest
+
+from flask import _request_ctx_stack
+from flask_security_bundle.decorators import auth_required
+from werkzeug.exceptions import Forbidden
+
+
+class MethodCalled(Exception):
+    pass
+
+
+@pytest.mark.usefixtures('user')
+class TestTokenRoleClaims:
+    def test_disabled_by_default(self, user, security):
+        data = security.remember_token_serializer.loads(user.get_auth_token())
+        assert not isinstance(data[-1], dict)
+
+    @pytest.mark.options(SECURITY_TOKEN_ROLE_CLAIMS=True)
+    def test_claims_are_signed_into_token(self, user, security,
+                                          security_utils_service):
+        data = security.remember_token_serializer.loads(user.get_auth_token())
+        assert data[-1] == {
+            'roles': ['ROLE_USER', 'ROLE_USER1'],
+            'roles_version': security_utils_service.get_roles_version(
+                ['ROLE_USER1', 'ROLE_USER']),
+            'stamp': user.security_stamp,
+        }
+
+    @pytest.mark.options(SECURITY_TOKEN_ROLE_CLAIMS=True)
+    def test_identity_built_from_claims(self, app, user, security):
+        with app.test_request_context('/', headers={
+                'Authentication-Token': user.get_auth_token()}):
+            security._request_loader(_request_ctx_stack.top.request)
+            assert security._get_claimed_role_names() == ['ROLE_USER', 'ROLE_USER1']
+
+    @pytest.mark.options(SECURITY_TOKEN_ROLE_CLAIMS=True)
+    def test_claims_rejected_after_role_change(self, app, user, security,
+                                               user_manager):
+        # legacy tokens stay valid when the user's roles change, their claims don't
+        token = user.get_auth_token()
+        user.user_roles = [ur for ur in user.user_roles
+                           if ur.role.name != 'ROLE_USER1']
+        user_manager.save(user, commit=True)
+
+        @auth_required(role='ROLE_USER1')
+        def method():
+            raise MethodCalled
+
+        with app.test_request_context('/', headers={'Authentication-Token': token}):
+            with pytest.raises(Forbidden):
+                method()
+            assert security._get_claimed_role_names() is None
+
+    @pytest.mark.options(SECURITY_TOKEN_ROLE_CLAIMS=True)
+    def test_claimed_roles_enforced(self, client, user):
+        client.login_as(user)
+
+        @auth_required(role='ROLE_ADMIN')
+        def method():
+            raise MethodCalled
+
+        with pytest.raises(Forbidden):
+            method()
@@ -0,0 +1,96 @@
+import pytest
+
+from flask_security_bundle import AnonymousUser
+
+from tests._bundles.security.models import UserRole
+
+
+@pytest.mark.usefixtures('user')
+class TestUserRoles:
+    def test_role_names(self, user):
+        assert user.role_names == {'ROLE_USER', 'ROLE_USER1'}
+        assert user.role_names is user.role_names
+
+    def test_role_mask(self, user, role_registry):
+        assert user.role_mask == (role_registry.get_bit('ROLE_USER')
+                                  | role_registry.get_bit('ROLE_USER1'))
+
+    def test_has_role(self, user, role):
+        assert user.has_role('ROLE_USER')
+        assert user.has_role(user.roles[0])
+        assert not user.has_role('ROLE_ADMIN')
+        assert not user.has_role(role)
+
+    def test_has_any_role(self, user):
+        assert user.has_any_role('ROLE_ADMIN', 'ROLE_USER1')
+        assert not user.has_any_role('ROLE_ADMIN', 'ROLE_FOO')
+        assert not user.has_any_role()
+
+    def test_has_all_roles(self, user):
+        assert user.has_all_roles('ROLE_USER', 'ROLE_USER1')
+        assert not user.has_all_roles('ROLE_USER', 'ROLE_ADMIN')
+        assert user.has_all_roles()
+
+    @pytest.mark.role(name='ROLE_ADMIN')
+    def test_reset_when_roles_change(self, db, user, role, role_registry):
+        assert not user.has_role('ROLE_ADMIN')
+
+        mask = user.role_mask
+        user.roles.append(role)
+        assert user.has_role('ROLE_ADMIN')
+        db.session.flush()
+        assert user.role_mask == mask | role_registry.get_bit('ROLE_ADMIN')
+
+        user.roles.remove(role)
+        assert not user.has_role('ROLE_ADMIN')
+
+    @pytest.mark.role(name='ROLE_ADMIN')
+    def test_reset_when_expired(self, db, user, role):
+        db.session.commit()
+        assert not user.has_role('ROLE_ADMIN')
+
+        db.session.add(UserRole(user_id=user.id, role_id=role.id))
+        db.session.flush()
+        db.session.expire(user)
+        assert user.has_role('ROLE_ADMIN')
+
+
+@pytest.mark.usefixtures('user')
+class TestSecurityStamp:
+    def test_bumped_by_password_change(self, db, user, security_service):
+        stamp = user.security_stamp
+        security_service.change_password(user, 'new password', send_email=False)
+        assert user.security_stamp == stamp + 1
+
+    @pytest.mark.role(name='ROLE_ADMIN')
+    def test_bumped_by_role_changes(self, db, user, role):
+        stamp = user.security_stamp
+        user.roles.append(role)
+        assert user.security_stamp == stamp + 1
+        user.roles.remove(role)
+        assert user.security_stamp == stamp + 2
+
+    def test_bumped_by_role_rename(self, db, user):
+        db.session.commit()
+        stamp = user.security_stamp
+        user.roles[0].name = 'ROLE_RENAMED'
+        db.session.commit()
+        assert user.security_stamp == stamp + 1
+
+    @pytest.mark.user(active=True)
+    def test_bumped_by_deactivation(self, db, user):
+        stamp = user.security_stamp
+        user.active = True
+        assert user.security_stamp == stamp
+        user.active = False
+        assert user.security_stamp == stamp + 1
+
+
+class TestAnonymousUserRoles:
+    def test_has_no_roles(self):
+        user = AnonymousUser()
+        assert user.role_names == frozenset()
+        assert user.role_mask == 0
+        assert not user.has_role('ROLE_USER')
+        assert not user.has_any_role('ROLE_USER')
+        assert not user.has_all_roles('ROLE_USER')
@@ -0,0 +1,66 @@
+import pytest
+
+from flask_security_bundle.decorators import auth_required
+from flask_security_bundle.utils import current_user
+from werkzeug.exceptions import Unauthorized
+
+
+@pytest.mark.usefixtures('user')
+class TestApiKeyService:
+    def test_create_api_key(self, db, user, api_key_service):
+        api_key, key = api_key_service.create_api_key(user, name='ci', commit=True)
+        prefix, secret = key.split('.', 1)
+        assert api_key.prefix == prefix
+        assert api_key.user == user
+        assert secret not in api_key.secret_hash
+        assert api_key.secret_hash == api_key_service.hash_secret(secret)
+
+    def test_get_user_by_api_key(self, db, user, count_queries, api_key_service):
+        _, key = api_key_service.create_api_key(user, commit=True)
+        db.session.expunge_all()
+
+        with count_queries() as statements:
+            assert api_key_service.get_user_by_api_key(key).id == user.id
+        assert len(statements) == 1, statements
+
+    def test_invalid_keys(self, db, user, api_key_service):
+        _, key = api_key_service.create_api_key(user, commit=True)
+        prefix = key.split('.', 1)[0]
+        for invalid in [None, '', 'invalid', prefix, prefix + '.wrong',
+                        'unknown.' + key.split('.', 1)[1]]:
+            assert api_key_service.get_user_by_api_key(invalid) is None
+
+    @pytest.mark.user(active=False)
+    def test_inactive_user(self, db, user, api_key_service):
+        _, key = api_key_service.create_api_key(user, commit=True)
+        assert api_key_service.get_user_by_api_key(key) is None
+
+    def test_revoke_api_key(self, db, user, api_key_service):
+        api_key, key = api_key_service.create_api_key(user, commit=True)
+        assert api_key_service.find_api_keys(user) == [api_key]
+
+        api_key_service.revoke_api_key(api_key, commit=True)
+        assert api_key_service.get_user_by_api_key(key) is None
+        assert api_key_service.find_api_keys() == []
+
+
+@pytest.mark.usefixtures('user')
+class TestApiKeyMechanism:
+    def test_authenticates(self, app, db, user, api_key_service):
+        _, key = api_key_service.create_api_key(user, commit=True)
+
+        @auth_required(mechanisms=['api_key'])
+        def method():
+            return current_user.id
+
+        with app.test_request_context('/', headers={'X-Api-Key': key}):
+            assert method() == user.id
+
+    def test_requires_a_valid_key(self, app, db, user, api_key_service):
+        @auth_required(mechanisms=['api_key'])
+        def method():
+            return current_user.id
+
+        with app.test_request_context('/', headers={'X-Api-Key': 'invalid.key'}):
+            with pytest.raises(Unauthorized):
+                method()
@@ -0,0 +1,105 @@
+import pytest
+
+
+def check_token(api_client, token):
+    return api_client.get('security_controller.check_auth_token',
+                          headers={'Authentication-Token': token})
+
+
+@pytest.mark.usefixtures('user')
+class TestAuthTokens:
+    def test_legacy_token(self, api_client, user):
+        r = check_token(api_client, user.get_auth_token())
+        assert r.status_code == 200
+        assert r.json['user']['id'] == user.id
+
+    @pytest.mark.options(SECURITY_TOKEN_FORMAT='hmac-v2')
+    def test_hmac_v2_token(self, api_client, user, security):
+        token = user.get_auth_token()
+        assert security.remember_token_serializer.loads(token)[0] == 'v2'
+
+        r = check_token(api_client, token)
+        assert r.status_code == 200
+        assert r.json['user']['id'] == user.id
+
+    @pytest.mark.options(SECURITY_TOKEN_FORMAT='hmac-v2')
+    def test_hmac_v2_token_is_shorter(self, app, user):
+        v2_token = user.get_auth_token()
+        app.config['SECURITY_TOKEN_FORMAT'] = 'legacy'
+        assert len(v2_token) < len(user.get_auth_token())
+
+    @pytest.mark.options(SECURITY_TOKEN_FORMAT='hmac-v2')
+    def test_hmac_v2_token_invalidated_by_password_change(self, api_client, user,
+                                                          security_service):
+        token = user.get_auth_token()
+        security_service.change_password(user, 'new password', send_email=False)
+        r = check_token(api_client, token)
+        assert r.status_code == 401
+
+    @pytest.mark.options(SECURITY_TOKEN_FORMAT='hmac-v2')
+    def test_tampered_hmac_v2_token(self, api_client, user, admin, security):
+        data = security.remember_token_serializer.loads(user.get_auth_token())
+        data[1] = str(admin.id)
+        r = check_token(api_client, security.remember_token_serializer.dumps(data))
+        assert r.status_code == 401
+
+    @pytest.mark.options(SECURITY_TOKEN_FORMAT='hmac-v2',
+                         SECURITY_ACCEPT_LEGACY_TOKENS=False)
+    def test_legacy_tokens_rejected(self, app, api_client, user):
+        app.config['SECURITY_TOKEN_FORMAT'] = 'legacy'
+        legacy_token = user.get_auth_token()
+        app.config['SECURITY_TOKEN_FORMAT'] = 'hmac-v2'
+
+        assert check_token(api_client, legacy_token).status_code == 401
+        assert check_token(api_client, user.get_auth_token()).status_code == 200
+
+    @pytest.mark.options(SECURITY_TOKEN_FORMAT='hmac-v2')
+    def test_legacy_tokens_accepted_during_migration(self, app, api_client, user):
+        app.config['SECURITY_TOKEN_FORMAT'] = 'legacy'
+        legacy_token = user.get_auth_token()
+        app.config['SECURITY_TOKEN_FORMAT'] = 'hmac-v2'
+
+        assert check_token(api_client, legacy_token).status_code == 200
+
+    @pytest.mark.options(SECURITY_TOKEN_FORMAT='hmac-v2')
+    @pytest.mark.role(name='ROLE_ADMIN')
+    def test_hmac_v2_token_invalidated_by_role_change(self, db, api_client, user, role):
+        token = user.get_auth_token()
+        user.roles.append(role)
+        db.session.commit()
+        assert check_token(api_client, token).status_code == 401
+
+
+@pytest.mark.usefixtures('user')
+class TestResetPasswordTokens:
+    def test_valid_token(self, user, security_utils_service):
+        token = security_utils_service.generate_reset_password_token(user)
+        expired, invalid, token_user = \
+            security_utils_service.reset_password_token_status(token)
+        assert not expired and not invalid
+        assert token_user == user
+
+    def test_invalidated_by_password_reset(self, user, security_service,
+                                           security_utils_service):
+        token = security_utils_service.generate_reset_password_token(user)
+        security_service.reset_password(user, 'new password')
+        _, invalid, _ = security_utils_service.reset_password_token_status(token)
+        assert invalid
+
+
+@pytest.mark.usefixtures('user')
+@pytest.mark.options(SECURITY_TOKEN_FORMAT='hmac-v2',
+                     SECURITY_TOKEN_SERIALIZER='compact')
+class TestCompactTokens:
+    def test_compact_token(self, app, api_client, user):
+        token = user.get_auth_token()
+        assert check_token(api_client, token).status_code == 200
+
+        app.config['SECURITY_TOKEN_SERIALIZER'] = 'json'
+        assert len(token) < len(user.get_auth_token())
+
+    def test_reset_password_token(self, user, security_utils_service):
+        token = security_utils_service.generate_reset_password_token(user)
+        _, invalid, token_user = security_utils_service.reset_password_token_status(token)
+        assert not invalid
+        assert token_user == user
@@ -0,0 +1,86 @@
+import pytest
+
+
+def _set_outdated_hash(user, security, security_utils_service, password='password'):
+    handler = security.pwd_context.handler('pbkdf2_sha512')
+    user._password = handler.hash(security_utils_service.get_hmac(password))
+    return user._password
+
+
+class TestDeferredRehash:
+    def test_rehashes_inline_by_default(self, app, user, security,
+                                        security_utils_service):
+        old_hash = _set_outdated_hash(user, security, security_utils_service)
+        with app.test_request_context():
+            assert security_utils_service.verify_and_update_password('password', user)
+        assert user.password != old_hash
+        assert security.pwd_context.identify(user.password) == 'plaintext'
+        assert security.rehash_queue.pending == 0
+
+    @pytest.mark.options(SECURITY_DEFERRED_REHASH=True)
+    def test_rehash_is_queued_until_flushed(self, app, user, security,
+                                            security_utils_service, user_manager):
+        old_hash = _set_outdated_hash(user, security, security_utils_service)
+        user_manager.save(user, commit=True)
+
+        with app.test_request_context():
+            assert security_utils_service.verify_and_update_password('password', user)
+            assert user.password == old_hash
+            assert security.rehash_queue.pending == 1
+
+        assert security_utils_service.flush_rehash_queue() == 1
+        assert security.rehash_queue.stats() == dict(pending=0, upgraded=1)
+
+        # the (unmodified) hash was expired from the session
+        assert security.pwd_context.identify(user.password) == 'plaintext'
+        assert security_utils_service.verify_and_update_password('password', user)
+
+    @pytest.mark.options(SECURITY_DEFERRED_REHASH=True)
+    def test_skips_passwords_changed_since_queued(self, app, user, security,
+                                                  security_utils_service,
+                                                  user_manager):
+        _set_outdated_hash(user, security, security_utils_service)
+        user_manager.save(user, commit=True)
+
+        with app.test_request_context():
+            assert security_utils_service.verify_and_update_password('password', user)
+
+        user.password = 'new password'
+        user_manager.save(user, commit=True)
+
+        assert security_utils_service.flush_rehash_queue() == 0
+        user_manager.refresh(user)
+        assert security_utils_service.verify_and_update_password('new password', user)
+
+    @pytest.mark.options(SECURITY_DEFERRED_REHASH=True)
+    def test_flush_does_not_commit_pending_changes(self, app, user, security,
+                                                   security_utils_service,
+                                                   user_manager):
+        _set_outdated_hash(user, security, security_utils_service)
+        user_manager.save(user, commit=True)
+
+        with app.test_request_context():
+            assert security_utils_service.verify_and_update_password('password', user)
+
+        user.first_name = 'changed'
+        assert security_utils_service.flush_rehash_queue() == 1
+
+        user_manager.db.session.rollback()
+        assert user.first_name == 'first'
+        assert security.pwd_context.identify(user.password) == 'plaintext'
+
+    @pytest.mark.options(SECURITY_DEFERRED_REHASH=True)
+    def test_login_schedules_flush_after_response(self, client, user, security,
+                                                  security_utils_service,
+                                                  user_manager, monkeypatch):
+        _set_outdated_hash(user, security, security_utils_service)
+        user_manager.save(user, commit=True)
+
+        flushed = []
+        monkeypatch.setattr(security_utils_service, 'flush_rehash_queue',
+                            lambda: flushed.append(security.rehash_queue.pending))
+
+        r = client.login_user()
+        assert r.status_code == 302
+        r.close()
+        assert flushed == [1]
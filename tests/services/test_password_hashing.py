@@ -0,0 +1,58 @@
+import pytest
+
+from concurrent.futures import Future
+from flask_security_bundle.hashing import get_inner_scheme, is_wrapped_hash, wrap_hash
+
+
+@pytest.mark.usefixtures('user')
+class TestPasswordHashing:
+    def test_inline_by_default(self, security, security_utils_service):
+        assert not security.hashing_pool.enabled
+        future = security_utils_service.hash_password_async('password')
+        assert isinstance(future, Future)
+        assert future.done()
+
+    @pytest.mark.options(SECURITY_HASHING_POOL_SIZE=1,
+                         SECURITY_PASSWORD_HASH='pbkdf2_sha512')
+    def test_hashing_pool(self, security, security_utils_service):
+        assert security.hashing_pool.enabled
+        try:
+            password_hash = security_utils_service.hash_password_async(
+                'password').result(timeout=30)
+            assert security.pwd_context.identify(password_hash) == 'pbkdf2_sha512'
+
+            assert security_utils_service.verify_password_async(
+                'password', password_hash).result(timeout=30)
+            assert not security_utils_service.verify_password_async(
+                'wrong', password_hash).result(timeout=30)
+        finally:
+            security.hashing_pool.shutdown()
+
+    @pytest.mark.options(SECURITY_HASHING_POOL_SIZE=1)
+    def test_login_verifies_in_pool(self, client, user, security):
+        try:
+            r = client.login_user()
+            assert r.status_code == 302
+            assert security.hashing_pool._executor is not None
+        finally:
+            security.hashing_pool.shutdown()
+
+    @pytest.mark.options(SECURITY_PASSWORD_HASH='pbkdf2_sha512',
+                         SECURITY_PASSWORD_SCHEMES=['pbkdf2_sha512', 'sha512_crypt',
+                                                    'plaintext'])
+    @pytest.mark.parametrize('scheme', ['sha512_crypt', 'plaintext'])
+    def test_verify_wrapped_hash(self, scheme, security, security_utils_service):
+        password = 'password'
+        if scheme != 'plaintext':
+            password = security_utils_service.get_hmac(password)
+        inner_hash = security.pwd_context.handler(scheme).hash(password)
+
+        wrapped_hash = wrap_hash(security.pwd_context, inner_hash, rounds=1000)
+        assert is_wrapped_hash(wrapped_hash)
+        assert get_inner_scheme(wrapped_hash) == scheme
+        assert security_utils_service.password_needs_update(wrapped_hash)
+
+        assert security_utils_service.verify_password_async(
+            'password', wrapped_hash).result()
+        assert not security_utils_service.verify_password_async(
+            'wrong', wrapped_hash).result()
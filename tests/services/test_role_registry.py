@@ -0,0 +1,99 @@
+import pytest
+
+
+@pytest.mark.usefixtures('user')
+class TestRoleRegistry:
+    def test_bits_are_dense(self, db, user, role_registry):
+        bits = {role_registry.get_bit('ROLE_USER'),
+                role_registry.get_bit('ROLE_USER1')}
+        assert bits == {1, 2}
+        assert role_registry.get_bit('ROLE_UNKNOWN') is None
+
+    def test_bits_are_kept_and_reused(self, db, user, role_manager,
+                                      role_registry):
+        bit = role_registry.get_bit('ROLE_USER1')
+        role = role_manager.create(name='ROLE_OLD', commit=True)
+        assert role_registry.get_bit('ROLE_OLD') == 4
+        role_manager.delete(role, commit=True)
+        assert role_registry.get_bit('ROLE_OLD') is None
+        role_manager.create(name='ROLE_NEW', commit=True)
+        assert role_registry.get_bit('ROLE_NEW') == 4
+        assert role_registry.get_bit('ROLE_USER1') == bit
+
+    def test_masks(self, user, role_registry):
+        mask = role_registry.get_mask(['ROLE_USER', 'ROLE_USER1', 'ROLE_UNKNOWN'])
+        assert mask == user.role_mask
+        assert role_registry.get_role_names(mask) == {'ROLE_USER', 'ROLE_USER1'}
+        assert role_registry.get_mask([]) == 0
+
+    def test_loaded_once(self, db, user, count_queries, role_registry):
+        role_registry.get_mask(['ROLE_USER'])
+        with count_queries() as statements:
+            role_registry.get_mask(['ROLE_USER1'])
+            role_registry.get_bit('ROLE_USER')
+        assert statements == []
+
+    def test_reloaded_when_roles_change(self, db, user, role_manager,
+                                        role_registry):
+        assert role_registry.get_mask(['ROLE_NEW']) == 0
+        version = role_registry.version
+
+        role = role_manager.create(name='ROLE_NEW', commit=True)
+        assert role_registry.get_mask(['ROLE_NEW']) == 4
+        assert role_registry.version > version
+
+        role_manager.delete(role, commit=True)
+        assert role_registry.get_mask(['ROLE_NEW']) == 0
+
+    def test_unknown_role_names_reload(self, db, user, role_manager,
+                                       role_registry):
+        role_registry.get_mask(['ROLE_USER'])
+        role = role_manager.model(name='ROLE_ELSEWHERE')
+        db.session.add(role)  # bypasses the role manager (and its signal)
+        db.session.commit()
+
+        assert role_registry.get_bit('ROLE_ELSEWHERE') == 4
+
+    def test_unknown_role_names_reload_once(self, db, user, count_queries,
+                                            role_registry):
+        assert role_registry.get_bit('ROLE_UNKNOWN') is None
+        version = role_registry.version
+        with count_queries() as statements:
+            assert role_registry.get_bit('ROLE_UNKNOWN') is None
+        assert statements == []
+        assert role_registry.version == version
+
+    def test_version_unchanged_when_roles_unchanged(self, user, role_registry):
+        role_registry.get_mask(['ROLE_USER'])
+        version = role_registry.version
+        role_registry.refresh()
+        assert role_registry.version == version
+
+    def test_reloaded_when_roles_are_flushed(self, db, user, role_manager,
+                                             role_registry):
+        role_registry.get_mask(['ROLE_USER'])
+        role = role_manager.model(name='ROLE_FLUSHED')
+        db.session.add(role)  # bypasses the role manager (and its signal)
+        db.session.flush()
+        assert role_registry.get_mask(['ROLE_FLUSHED']) == 4
+
+        role.name = 'ROLE_RENAMED'
+        db.session.flush()
+        assert role_registry.get_role_names(4) == {'ROLE_RENAMED'}
+
+    def test_reloaded_after_ttl(self, db, user, role_manager, role_registry,
+                                timer):
+        role_registry.timer = timer
+        role_registry.refresh()
+        version = role_registry.version
+        # roles changed by another process
+        db.session.execute(role_manager.model.__table__.update()
+                           .where(role_manager.model.name == 'ROLE_USER1')
+                           .values(name='ROLE_ELSEWHERE'))
+
+        timer.now = 59
+        assert role_registry.get_mask(['ROLE_ELSEWHERE']) == 0
+        assert role_registry.version == version
+        timer.now = 60
+        assert role_registry.get_mask(['ROLE_ELSEWHERE']) != 0
+        assert role_registry.version > version
@@ -0,0 +1,123 @@
+import pytest
+
+from flask import _app_ctx_stack
+from flask_security_bundle import LocalUserCache, SharedUserCache
+
+CACHE_BACKENDS = [
+    pytest.param('local', marks=pytest.mark.options(SECURITY_USER_CACHE='local')),
+    pytest.param('shared', marks=pytest.mark.options(SECURITY_USER_CACHE='shared')),
+]
+
+
+def role_names(user):
+    return sorted(role.name for role in user.roles)
+
+
+@pytest.mark.usefixtures('user')
+class TestUserCache:
+    def test_disabled_by_default(self, security):
+        assert security.user_cache is None
+
+    @pytest.mark.parametrize('backend', CACHE_BACKENDS)
+    def test_backends(self, security, backend):
+        assert isinstance(security.user_cache, {'local': LocalUserCache,
+                                                'shared': SharedUserCache}[backend])
+
+    @pytest.mark.parametrize('backend', CACHE_BACKENDS)
+    def test_cached_user_needs_no_queries(self, db, user, count_queries,
+                                          security_utils_service, backend):
+        user_id = user.id
+        db.session.commit()
+        db.session.expunge_all()
+        assert role_names(security_utils_service.user_loader(user_id)) == \
+            ['ROLE_USER', 'ROLE_USER1']
+        db.session.expunge_all()
+
+        with count_queries() as statements:
+            user = security_utils_service.user_loader(user_id)
+            assert role_names(user) == ['ROLE_USER', 'ROLE_USER1']
+        assert statements == []
+        assert user in db.session
+
+    @pytest.mark.parametrize('backend', CACHE_BACKENDS)
+    def test_password_hash_is_loaded_when_needed(self, db, user, count_queries,
+                                                 security_utils_service, backend):
+        user_id, password_hash = user.id, user.password
+        db.session.commit()
+        security_utils_service.get_user(user_id)
+        db.session.expunge_all()
+
+        user = security_utils_service.get_user(user_id)
+        with count_queries() as statements:
+            assert user.password == password_hash
+        assert len(statements) == 1
+
+    @pytest.mark.options(SECURITY_USER_CACHE='local')
+    def test_identity_attribute_lookups_are_cached(self, db, user, count_queries,
+                                                   security_utils_service):
+        db.session.commit()
+        db.session.expunge_all()
+        security_utils_service.user_loader('user@example.com')
+        db.session.expunge_all()
+
+        with count_queries() as statements:
+            user = security_utils_service.user_loader('user@example.com')
+        assert user.email == 'user@example.com'
+        assert statements == []
+
+    @pytest.mark.options(SECURITY_USER_CACHE='local')
+    def test_evicted_when_password_changed(self, db, user, security,
+                                           security_service, security_utils_service):
+        db.session.commit()
+        security_utils_service.get_user(user.id)
+        assert security.user_cache.get(user.id) is not None
+
+        security_service.change_password(user, 'new password', send_email=False)
+        assert security.user_cache.get(user.id) is None
+        db.session.commit()
+        assert security.user_cache.get(user.id) is None
+
+    @pytest.mark.options(SECURITY_USER_CACHE='local')
+    def test_evicted_when_roles_changed(self, db, user, security,
+                                        security_utils_service):
+        user_id = user.id
+        db.session.commit()
+        db.session.expunge_all()
+        user = security_utils_service.get_user(user_id)
+        assert security.user_cache.get(user_id) is not None
+
+        user.roles.remove(user.roles[0])
+        db.session.commit()
+        assert security.user_cache.get(user_id) is None
+
+        db.session.expunge_all()
+        assert role_names(security_utils_service.get_user(user_id)) == ['ROLE_USER1']
+
+    @pytest.mark.options(SECURITY_USER_CACHE='local')
+    def test_evicted_when_role_renamed(self, db, user, security,
+                                       security_utils_service):
+        db.session.commit()
+        security_utils_service.get_user(user.id)
+
+        user.roles[0].name = 'ROLE_RENAMED'
+        db.session.commit()
+        assert security.user_cache.get(user.id) is None
+
+    def test_invalid_backend(self, app, security):
+        app.config['SECURITY_USER_CACHE'] = 'invalid'
+        with pytest.raises(ValueError):
+            security.init_app(app)
+
+    @pytest.mark.options(SECURITY_USER_CACHE='local')
+    def test_evicted_outside_of_app_context(self, db, user, security,
+                                            security_utils_service):
+        db.session.commit()
+        security_utils_service.get_user(user.id)
+
+        user.first_name = 'changed'
+        app_ctx = _app_ctx_stack.pop()
+        try:
+            db.session.commit()
+        finally:
+            _app_ctx_stack.push(app_ctx)
+        assert security.user_cache.get(user.id) is None
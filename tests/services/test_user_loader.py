@@ -0,0 +1,76 @@
+import pytest
+
+
+def load_user_and_role_names(security_utils_service, user_id):
+    user = security_utils_service.user_loader(user_id)
+    return sorted(role.name for role in user.roles)
+
+
+@pytest.mark.usefixtures('user')
+class TestUserLoaderStrategies:
+    @pytest.mark.parametrize('strategy, expected_queries', [
+        (None, 4),  # user, user_roles, and one per role
+        ('joined', 1),
+        ('selectin', 2),
+        ('subquery', 2),
+    ])
+    def test_query_counts(self, app, db, user, count_queries,
+                          security_utils_service, strategy, expected_queries):
+        app.config['SECURITY_USER_LOADER_OPTIONS'] = strategy
+        user_id = user.id
+        db.session.commit()
+        db.session.expunge_all()
+
+        with count_queries() as statements:
+            role_names = load_user_and_role_names(security_utils_service, user_id)
+
+        assert role_names == ['ROLE_USER', 'ROLE_USER1']
+        assert len(statements) == expected_queries, statements
+
+    @pytest.mark.options(SECURITY_USER_LOADER_OPTIONS='joined')
+    def test_load_by_identity_attribute(self, db, user, count_queries,
+                                        security_utils_service):
+        db.session.commit()
+        db.session.expunge_all()
+
+        with count_queries() as statements:
+            role_names = load_user_and_role_names(security_utils_service,
+                                                  'user@example.com')
+
+        assert role_names == ['ROLE_USER', 'ROLE_USER1']
+        assert len(statements) == 1, statements
+
+    def test_invalid_strategy(self, app, security):
+        app.config['SECURITY_USER_LOADER_OPTIONS'] = 'invalid'
+        with pytest.raises(ValueError):
+            security.init_app(app)
+
+
+@pytest.mark.options(SECURITY_USER_IDENTITY_ATTRIBUTES=['email', 'username'])
+class TestIdentityAttributeLookup:
+    @pytest.mark.users(dict(username='first', email='first@example.com'),
+                       dict(username='second', email='second@example.com'))
+    def test_single_query(self, db, users, count_queries, security_utils_service):
+        db.session.commit()
+        db.session.expunge_all()
+
+        with count_queries() as statements:
+            user = security_utils_service.user_loader('second')
+        assert user.email == 'second@example.com'
+        assert len(statements) == 1, statements
+
+        with count_queries() as statements:
+            assert security_utils_service.user_loader('nobody') is None
+        assert len(statements) == 1, statements
+
+    @pytest.mark.users(dict(username='a@example.com', email='b@example.com'),
+                       dict(username='b', email='a@example.com'))
+    def test_attribute_priority(self, db, users, security_utils_service):
+        db.session.commit()
+        assert security_utils_service.user_loader('a@example.com').username == 'b'
+
+    @pytest.mark.options(SECURITY_USER_IDENTITY_ATTRIBUTES=['email', 'first_name',
+                                                            'username'])
+    def test_unindexed_identity_attributes(self, security_utils_service):
+        assert security_utils_service.get_unindexed_identity_attributes() == \
+            ['first_name', 'username']
@@ -0,0 +1,157 @@
+import pytest
+
+from flask import session
+from flask_security_bundle.services.user_session_service import SESSION_ID_KEY
+
+
+@pytest.mark.usefixtures('user')
+@pytest.mark.options(SECURITY_SERVER_SIDE_SESSIONS=True)
+class TestUserSessionService:
+    def test_get_session(self, db, user, count_queries, user_session_service):
+        session_id = user_session_service.create_session(user)
+        db.session.commit()
+
+        with count_queries() as statements:
+            entry = user_session_service.get_session(session_id)
+        assert entry['user_id'] == user.id
+        assert entry['role_names'] == sorted(user.role_names)
+        assert not statements
+
+    def test_get_uncached_session(self, db, user, count_queries,
+                                  user_session_service):
+        session_id = user_session_service.create_session(user)
+        db.session.commit()
+        user_session_service._cache_delete(session_id)
+
+        with count_queries() as statements:
+            assert user_session_service.get_session(session_id)['user_id'] == user.id
+            assert user_session_service.get_session(session_id)['user_id'] == user.id
+        assert len(statements) == 1, statements
+
+    def test_revoke_session(self, db, user, user_session_service):
+        session_id = user_session_service.create_session(user)
+        db.session.commit()
+
+        user.first_name = 'pending'
+        user_session_service.revoke_session(session_id)
+        assert user_session_service.get_session(session_id) is None
+
+        # the current database session wasn't committed
+        db.session.rollback()
+        assert user.first_name == 'first'
+
+    def test_revoke_user_sessions(self, db, user, user_session_service):
+        session_ids = [user_session_service.create_session(user) for _ in range(3)]
+        db.session.commit()
+
+        assert user_session_service.revoke_user_sessions(user, commit=True) == 3
+        for session_id in session_ids:
+            assert user_session_service.get_session(session_id) is None
+
+
+@pytest.mark.usefixtures('user')
+@pytest.mark.options(SECURITY_SERVER_SIDE_SESSIONS=True)
+class TestSessionUserLoader:
+    def test_loads_user(self, app, db, user, security, user_session_service):
+        session_id = user_session_service.create_session(user)
+        db.session.commit()
+
+        with app.test_request_context('/'):
+            session[SESSION_ID_KEY] = session_id
+            assert security._session_user_loader(user.id) == user
+
+    def test_revoked_session(self, app, db, user, security, user_session_service):
+        session_id = user_session_service.create_session(user)
+        db.session.commit()
+        user_session_service.revoke_user_sessions(user, commit=True)
+
+        with app.test_request_context('/'):
+            session[SESSION_ID_KEY] = session_id
+            assert security._session_user_loader(user.id) is None
+
+    def test_password_change_revokes_session(self, app, db, user, security,
+                                             security_service, user_session_service):
+        session_id = user_session_service.create_session(user)
+        db.session.commit()
+        security_service.change_password(user, 'new password', send_email=False)
+        db.session.commit()
+
+        with app.test_request_context('/'):
+            session[SESSION_ID_KEY] = session_id
+            assert security._session_user_loader(user.id) is None
+        assert user_session_service.get_session(session_id) is None
+
+    def test_own_password_change_keeps_current_session(self, app, db, user, security,
+                                                       security_service,
+                                                       user_session_service):
+        session_id = user_session_service.create_session(user)
+        other_session_id = user_session_service.create_session(user)
+        db.session.commit()
+
+        with app.test_request_context('/'):
+            session[SESSION_ID_KEY] = session_id
+            assert security._session_user_loader(user.id) == user
+            security_service.change_password(user, 'new password', send_email=False)
+            db.session.commit()
+            assert security._session_user_loader(user.id) == user
+
+        entry = user_session_service.get_session(session_id)
+        assert entry['security_stamp'] == user.security_stamp
+        user_session_service._cache_delete(session_id)
+        assert user_session_service.get_session(session_id) == entry
+        assert user_session_service.get_session(other_session_id) is None
+
+    @pytest.mark.role(name='ROLE_ADMIN')
+    def test_own_role_change_keeps_current_session(self, app, db, user, role,
+                                                   security, user_session_service):
+        session_id = user_session_service.create_session(user)
+        db.session.commit()
+
+        with app.test_request_context('/'):
+            session[SESSION_ID_KEY] = session_id
+            assert security._session_user_loader(user.id) == user
+            user.roles.append(role)
+            db.session.commit()
+            assert security._session_user_loader(user.id) == user
+        entry = user_session_service.get_session(session_id)
+        assert 'ROLE_ADMIN' in entry['role_names']
+
+    def test_rolled_back_change_keeps_cached_session(self, app, db, user, security,
+                                                     security_service,
+                                                     user_session_service):
+        session_id = user_session_service.create_session(user)
+        db.session.commit()
+        entry = user_session_service.get_session(session_id)
+
+        with app.test_request_context('/'):
+            session[SESSION_ID_KEY] = session_id
+            security._session_user_loader(user.id)
+            security_service.change_password(user, 'new password', send_email=False)
+            db.session.flush()
+            db.session.rollback()
+        db.session.commit()
+        assert user_session_service.get_session(session_id) == entry
+
+    def test_role_change_revokes_session(self, app, db, user, security,
+                                         user_session_service):
+        session_id = user_session_service.create_session(user)
+        db.session.commit()
+        assert 'ROLE_USER' in user_session_service.get_session(session_id)['role_names']
+        user.roles.remove(user.roles[0])
+        db.session.commit()
+
+        with app.test_request_context('/'):
+            session[SESSION_ID_KEY] = session_id
+            assert security._session_user_loader(user.id) is None
+        assert user_session_service.get_session(session_id) is None
+
+    def test_role_rename_revokes_session(self, app, db, user, security,
+                                         user_session_service):
+        session_id = user_session_service.create_session(user)
+        db.session.commit()
+        user.roles[0].name = 'ROLE_RENAMED'
+        db.session.commit()
+
+        with app.test_request_context('/'):
+            session[SESSION_ID_KEY] = session_id
+            assert security._session_user_loader(user.id) is None
@@ -0,0 +1,44 @@
+from flask_security_bundle.cache import TTLCache
+
+
+class TestTTLCache:
+    def test_get_and_set(self):
+        cache = TTLCache(maxsize=2)
+        assert cache.get('a') is None
+        cache.set('a', 1)
+        assert cache.get('a') == 1
+        assert cache.stats() == dict(hits=1, misses=1, size=1, maxsize=2)
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert 'c' in cache
+
+    def test_entries_expire(self, timer):
+        cache = TTLCache(maxsize=2, ttl=10, timer=timer)
+        cache.set('a', 1)
+        timer.now = 9
+        assert cache.get('a') == 1
+        timer.now = 10
+        assert cache.get('a') is None
+        assert len(cache) == 0
+
+    def test_delete_where(self):
+        cache = TTLCache(maxsize=10)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.set('c', 1)
+        assert cache.delete_where(lambda key, value: value == 1) == 2
+        assert 'b' in cache
+        assert len(cache) == 1
+
+    def test_disabled(self):
+        cache = TTLCache(maxsize=0)
+        cache.set('a', 1)
+        assert cache.get('a') is None
+        assert cache.stats() == dict(hits=0, misses=0, size=0, maxsize=0)
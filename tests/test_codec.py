@@ -0,0 +1,37 @@
+import json
+import pytest
+
+from flask_security_bundle.codec import CompactSerializer
+
+
+@pytest.fixture()
+def serializer():
+    return CompactSerializer()
+
+
+class TestCompactSerializer:
+    @pytest.mark.parametrize('data', [
+        [],
+        {},
+        ['v2', '42', 'AbCdEfGhIjKlMnOpQrStUv'],
+        ['v2', '42', 'AbCdEfGhIjKlMnOpQrStUv',
+         {'roles': ['ROLE_ADMIN', 'ROLE_USER'], 'roles_version': '1a2b3c4d'}],
+        ['42', '$6$rounds=656000$saltsalt$hash/with.crypt+chars'],
+        [0, -1, 1, 2 ** 70, -2 ** 70, None, True, False],
+        ['', '0', '007', '-1', 'héllo', 'abc$defgh', 'ab+cdefg', 'abcdefgh_'],
+    ])
+    def test_round_trip(self, serializer, data):
+        assert serializer.loads(serializer.dumps(data)) == data
+
+    def test_shorter_than_json(self, serializer):
+        data = ['v2', '42', 'AbCdEfGhIjKlMnOpQrStUv']
+        assert len(serializer.dumps(data)) < len(json.dumps(data, separators=(',', ':')))
+
+    def test_loads_json(self, serializer):
+        assert serializer.loads(b'["42","abc"]') == ['42', 'abc']
+
+    @pytest.mark.parametrize('payload', [b'', b'\x02', b'\x01\x07\x02\x03',
+                                         b'\x01\x00\x00'])
+    def test_invalid_payloads(self, serializer, payload):
+        with pytest.raises((ValueError, IndexError)):
+            serializer.loads(payload)
@@ -0,0 +1,55 @@
+import pytest
+
+from passlib.context import CryptContext
+from threading import Thread
+
+from flask_security_bundle.hashing import (
+    HashingCapacityError, HashingLimiter, HashingPool)
+
+
+class TestHashingLimiter:
+    def test_unlimited_by_default(self):
+        limiter = HashingLimiter()
+        assert not limiter.enabled
+        for _ in range(10):
+            limiter.acquire()
+        assert limiter.stats() == dict(active=0, waiting=0, shed=0, max_concurrent=0)
+
+    def test_sheds_when_full(self):
+        limiter = HashingLimiter(max_concurrent=1, timeout=0, retry_after=3)
+        limiter.acquire()
+        with pytest.raises(HashingCapacityError) as e:
+            limiter.acquire()
+        assert e.value.retry_after == 3
+        assert limiter.stats() == dict(active=1, waiting=0, shed=1, max_concurrent=1)
+
+        limiter.release()
+        limiter.acquire()
+        assert limiter.stats() == dict(active=1, waiting=0, shed=1, max_concurrent=1)
+
+    def test_waits_for_a_free_slot(self):
+        limiter = HashingLimiter(max_concurrent=1, timeout=5)
+        limiter.acquire()
+
+        thread = Thread(target=limiter.acquire)
+        thread.start()
+        while not limiter.waiting:
+            pass
+        assert limiter.stats()['waiting'] == 1
+
+        limiter.release()
+        thread.join()
+        assert limiter.stats() == dict(active=1, waiting=0, shed=0, max_concurrent=1)
+
+
+class UnserializableContext(CryptContext):
+    def to_string(self, *args, **kwargs):
+        raise AssertionError('the context should not be serialized')
+
+
+class TestHashingPool:
+    def test_disabled_pool_does_not_serialize_context(self):
+        pool = HashingPool(UnserializableContext(schemes=['plaintext']))
+        assert not pool.enabled
+        assert pool.hash('secret').result() == 'secret'
+        assert pool.verify('secret', 'secret').result()
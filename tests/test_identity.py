@@ -0,0 +1,49 @@
+import pytest
+
+from flask import g
+from flask_principal import RoleNeed, UserNeed
+
+from flask_security_bundle.decorators import auth_required
+from flask_security_bundle.identity import LazyIdentity
+
+
+class TestLazyIdentity:
+    def test_loaded_on_first_access(self):
+        calls = []
+
+        def loader(identity):
+            calls.append(identity)
+            identity.provides.add(UserNeed(1))
+            identity.role_mask = 2
+
+        identity = LazyIdentity(1)
+        identity.defer(loader)
+        assert calls == []
+
+        assert identity.provides == {UserNeed(1)}
+        assert identity.role_mask == 2
+        assert identity.provides == {UserNeed(1)}
+        assert calls == [identity]
+
+    def test_without_loaders(self):
+        identity = LazyIdentity(1)
+        assert identity.provides == set()
+        assert identity.role_mask is None
+
+
+@pytest.mark.usefixtures('user')
+class TestIdentityLoading:
+    def test_needs_built_only_when_checked(self, app, user, security):
+        @auth_required
+        def method():
+            return g.identity
+
+        with app.test_request_context('/', headers={
+                'Authentication-Token': user.get_auth_token()}):
+            identity = method()
+            assert isinstance(identity, LazyIdentity)
+            assert identity._provides == set()
+
+            assert identity.provides == {UserNeed(user.id), RoleNeed('ROLE_USER'),
+                                         RoleNeed('ROLE_USER1')}
+            assert identity.role_mask == user.role_mask
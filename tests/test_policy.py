@@ -0,0 +1,54 @@
+import pytest
+
+from datetime import timedelta
+
+from flask_security_bundle.policy import SecurityPolicy, parse_within_delta
+
+CONFIG = dict(
+    SECRET_KEY='secret',
+    SECURITY_PASSWORD_HASH='bcrypt',
+    SECURITY_PASSWORD_SALT='salt',
+    SECURITY_PASSWORD_SINGLE_HASH=False,
+    SECURITY_PASSWORD_HASH_OPTIONS={'bcrypt': {'rounds': 12}},
+    SECURITY_CONFIRM_EMAIL_WITHIN='5 days',
+    SECURITY_RESET_PASSWORD_WITHIN='10 minutes',
+)
+
+
+class TestSecurityPolicy:
+    def test_from_config(self):
+        policy = SecurityPolicy.from_config(CONFIG)
+        assert policy.password_hash == 'bcrypt'
+        assert policy.password_salt == b'salt'
+        assert policy.secret_key == b'secret'
+        assert policy.double_hash is True
+        assert policy.hash_options == {'rounds': 12}
+        assert policy.within_deltas['SECURITY_CONFIRM_EMAIL_WITHIN'] == timedelta(days=5)
+        assert policy.max_ages['SECURITY_RESET_PASSWORD_WITHIN'] == 600
+
+    @pytest.mark.parametrize('overrides', [
+        dict(SECURITY_PASSWORD_HASH='plaintext'),
+        dict(SECURITY_PASSWORD_SINGLE_HASH=True, SECURITY_PASSWORD_SALT=None),
+    ])
+    def test_single_hash(self, overrides):
+        policy = SecurityPolicy.from_config(dict(CONFIG, **overrides))
+        assert policy.double_hash is False
+
+    def test_single_hash_with_salt_is_invalid(self):
+        with pytest.raises(RuntimeError):
+            SecurityPolicy.from_config(dict(CONFIG, SECURITY_PASSWORD_SINGLE_HASH=True))
+
+    def test_immutable(self):
+        policy = SecurityPolicy.from_config(CONFIG)
+        with pytest.raises(AttributeError):
+            policy.password_hash = 'plaintext'
+        with pytest.raises(AttributeError):
+            del policy.password_salt
+        with pytest.raises(AttributeError):
+            policy.foo = 'bar'
+        with pytest.raises(TypeError):
+            policy.hash_options['rounds'] = 4
+
+    def test_parse_within_delta(self):
+        assert parse_within_delta('5 days') == timedelta(days=5)
+        assert parse_within_delta('10 minutes') == timedelta(minutes=10)
@@ -0,0 +1,57 @@
+import pytest
+
+from flask_security_bundle.rehash import RehashQueue
+
+
+class TestRehashQueue:
+    def test_coalesces_by_user_id(self):
+        queue = RehashQueue(enabled=True)
+        queue.add(1, 'old-hash', 'password')
+        queue.add(2, 'old-hash', 'password')
+        queue.add(1, 'old-hash', 'password1')
+        assert queue.pending == 2
+
+        batches = []
+        assert queue.drain(lambda batch: batches.append(dict(batch)) or len(batch)) == 2
+        assert batches == [{2: ('old-hash', 'password'),
+                            1: ('old-hash', 'password1')}]
+        assert queue.stats() == dict(pending=0, upgraded=2)
+
+    def test_drains_in_batches(self):
+        queue = RehashQueue(enabled=True, batch_size=2)
+        for user_id in range(5):
+            queue.add(user_id, 'old-hash', 'password')
+
+        sizes = []
+        assert queue.drain(lambda batch: sizes.append(len(batch)) or len(batch)) == 5
+        assert sizes == [2, 2, 1]
+        assert queue.pending == 0
+
+    def test_concurrent_drain_returns_immediately(self):
+        queue = RehashQueue(enabled=True)
+        queue.add(1, 'old-hash', 'password')
+
+        def fn(batch):
+            assert queue.drain(fn) == 0
+            return len(batch)
+
+        assert queue.drain(fn) == 1
+
+    def test_failed_batch_is_requeued(self):
+        queue = RehashQueue(enabled=True, batch_size=2)
+        for user_id in range(3):
+            queue.add(user_id, 'old-hash', 'password')
+
+        def fn(batch):
+            queue.add(1, 'old-hash', 'password1')
+            raise RuntimeError
+
+        with pytest.raises(RuntimeError):
+            queue.drain(fn)
+        assert queue.stats() == dict(pending=3, upgraded=0)
+
+        batches = []
+        assert queue.drain(lambda batch: batches.append(dict(batch)) or len(batch)) == 3
+        assert batches == [{0: ('old-hash', 'password'),
+                            2: ('old-hash', 'password')},
+                           {1: ('old-hash', 'password1')}]
@@ -0,0 +1,56 @@
+import pytest
+
+from flask_security_bundle.user_cache import LocalStore, SharedUserCache
+
+
+class TestLocalStore:
+    def test_get_set_and_delete(self):
+        store = LocalStore()
+        assert store.get('a') is None
+        store.set('a', {'b': 1})
+        assert store.get('a') == {'b': 1}
+        assert store.get('a') is not store.get('a')
+        assert store.delete('a')
+        assert store.get('a') is None
+
+    def test_timeout(self, timer):
+        store = LocalStore(timer=timer)
+        store.set('a', 1, timeout=10)
+        store.set('b', 2)
+        timer.now = 10
+        assert store.get('a') is None
+        assert store.get('b') == 2
+
+
+class TestSharedUserCache:
+    def test_aliases(self):
+        store = LocalStore()
+        cache = SharedUserCache('secret', store=store, key_prefix='test:')
+        cache.set_id('email', 'a@a.com', 1)
+        assert cache.get_id('email', 'a@a.com') == 1
+        assert store.get('test:email:a@a.com') == 1
+        assert cache.get(1) is None
+
+    def test_secret_key_required(self):
+        with pytest.raises(ValueError):
+            SharedUserCache(None)
+
+    def test_entries_are_signed(self, user):
+        store = LocalStore()
+        cache = SharedUserCache('secret', store=store, key_prefix='test:')
+        cache.set(user)
+        assert cache.get(user.id).id == user.id
+
+        data = store.get(f'test:user:{user.id}')
+        store.set(f'test:user:{user.id}', data[:-1] + b'.')
+        assert cache.get(user.id) is None
+
+        store.set(f'test:user:{user.id}', data)
+        assert SharedUserCache('other', store=store, key_prefix='test:') \
+            .get(user.id) is None
+
+    def test_password_hash_is_not_cached(self, user):
+        cache = SharedUserCache('secret')
+        cache.set(user)
+        assert '_password' not in cache.get(user.id).__dict__
+        assert user.password
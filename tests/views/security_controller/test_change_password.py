@@ -115,3 +115,34 @@ class TestApiChangePassword:
         api_client.logout()
         api_client.login_with_creds(user.email, 'new password')
         assert current_user == user
+
+
+@pytest.mark.options(SECURITY_CHANGEABLE=True,
+                     SECURITY_HASHING_MAX_CONCURRENT=1,
+                     SECURITY_HASHING_QUEUE_TIMEOUT=0,
+                     SECURITY_HASHING_RETRY_AFTER=5)
+@pytest.mark.usefixtures('user')
+class TestChangePasswordAdmissionControl:
+    def test_html_change_password_is_shed(self, client, security):
+        client.login_user()
+        security.hashing_limiter.acquire()  # take the only slot
+        r = client.post('security_controller.change_password',
+                        data=dict(password='password',
+                                  new_password='new password',
+                                  new_password_confirm='new password'))
+        security.hashing_limiter.release()
+        assert r.status_code == 503
+        assert r.headers['Retry-After'] == '5'
+        assert 'Please try again in a moment.' in r.html
+
+    def test_json_change_password_is_shed(self, api_client, security):
+        api_client.login_user()
+        security.hashing_limiter.acquire()
+        r = api_client.post('security_api.change_password',
+                            data=dict(password='password',
+                                      new_password='new password',
+                                      new_password_confirm='new password'))
+        security.hashing_limiter.release()
+        assert r.status_code == 503
+        assert r.headers['Retry-After'] == '5'
+        assert 'Please try again in a moment.' in r.json['error']
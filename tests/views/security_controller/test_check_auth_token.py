@@ -0,0 +1,60 @@
+import pytest
+
+
+def check_token(api_client, token, method='GET', **headers):
+    return api_client.open('security_controller.check_auth_token', method=method,
+                           headers={'Authentication-Token': token, **headers})
+
+
+@pytest.mark.usefixtures('user')
+class TestCheckAuthToken:
+    def test_user_response(self, api_client, user):
+        r = check_token(api_client, user.get_auth_token())
+        assert r.status_code == 200
+        assert r.json['user']['id'] == user.id
+
+    def test_head(self, api_client, user):
+        r = check_token(api_client, user.get_auth_token(), method='HEAD')
+        assert r.status_code == 200
+        assert not r.data
+
+
+@pytest.mark.usefixtures('user')
+@pytest.mark.options(SECURITY_CHECK_AUTH_TOKEN_RESPONSE='minimal',
+                     SECURITY_TOKEN_FORMAT='hmac-v2',
+                     SECURITY_TOKEN_MAX_AGE=3600)
+class TestMinimalCheckAuthToken:
+    def test_minimal_response(self, api_client, user, security,
+                              security_utils_service):
+        token = user.get_auth_token()
+        _, signed_at = security.remember_token_serializer.loads(
+            token, return_timestamp=True)
+
+        r = check_token(api_client, token)
+        assert r.status_code == 200
+        assert r.json == {
+            'user_id': user.id,
+            'roles_version': security_utils_service.get_roles_version(user.role_names),
+            'expires_at': int(signed_at.timestamp()) + 3600,
+        }
+        assert r.headers['ETag']
+
+    def test_not_modified(self, api_client, user):
+        token = user.get_auth_token()
+        etag = check_token(api_client, token).headers['ETag']
+
+        r = check_token(api_client, token, **{'If-None-Match': etag})
+        assert r.status_code == 304
+        assert not r.data
+
+        r = check_token(api_client, token, **{'If-None-Match': '"stale"'})
+        assert r.status_code == 200
+
+    def test_head(self, api_client, user):
+        r = check_token(api_client, user.get_auth_token(), method='HEAD')
+        assert r.status_code == 200
+        assert r.headers['ETag']
+        assert not r.data
+
+    def test_invalid_token(self, api_client):
+        assert check_token(api_client, 'invalid').status_code == 401
@@ -1,6 +1,6 @@
 import pytest
 
-from flask_security_bundle import SecurityService, current_user
+from flask_security_bundle import SecurityService, current_user, login_shed
 from flask_unchained.bundles.sqlalchemy import SessionManager
 
 
@@ -78,3 +78,45 @@ class TestApiLogin:
                             data=dict(email=user.email, password='password'))
         assert r.status_code == 401
         assert 'Email requires confirmation.' == r.json['error']
+
+
+@pytest.mark.options(SECURITY_HASHING_MAX_CONCURRENT=1,
+                     SECURITY_HASHING_QUEUE_TIMEOUT=0,
+                     SECURITY_HASHING_RETRY_AFTER=5)
+@pytest.mark.usefixtures('user')
+class TestLoginAdmissionControl:
+    @pytest.fixture()
+    def shed(self, app, security):
+        shed = []
+
+        def on_login_shed(sender, **stats):
+            shed.append(stats)
+
+        security.hashing_limiter.acquire()  # take the only slot
+        with login_shed.connected_to(on_login_shed, sender=app):
+            yield shed
+        security.hashing_limiter.release()
+
+    def test_html_login_is_shed(self, client, templates, user, shed):
+        r = client.post('security_controller.login', data=dict(email=user.email,
+                                                               password='password'))
+        assert r.status_code == 503
+        assert r.headers['Retry-After'] == '5'
+        assert templates[0].template.name == 'security/login.html'
+        assert 'Please try again in a moment.' in r.html
+        assert shed == [dict(active=1, waiting=0, shed=1, max_concurrent=1)]
+
+    def test_json_login_is_shed(self, api_client, user, shed):
+        r = api_client.post('security_api.login',
+                            data=dict(email=user.email, password='password'))
+        assert r.status_code == 503
+        assert r.headers['Retry-After'] == '5'
+        assert 'Please try again in a moment.' in r.json['error']
+        assert len(shed) == 1
+
+    def test_token_auth_is_not_limited(self, api_client, user, shed):
+        r = api_client.get(
+            'security_controller.check_auth_token',
+            headers={'Authentication-Token': user.get_auth_token()})
+        assert r.status_code == 200
+        assert not shed
@@ -0,0 +1,85 @@
+import pytest
+
+
+@pytest.fixture()
+def verify(api_client, admin, api_key_service):
+    """
+    Returns a function to post tokens to the verify_auth_tokens view, with the
+    API key of a (gateway) user.
+    """
+    _, key = api_key_service.create_api_key(admin, name='gateway', commit=True)
+
+    def verify(tokens, **kwargs):
+        kwargs.setdefault('headers', {'X-Api-Key': key})
+        return api_client.post('security_controller.verify_auth_tokens',
+                               data=tokens, **kwargs)
+    return verify
+
+
+@pytest.mark.usefixtures('user')
+@pytest.mark.options(SECURITY_BATCH_TOKEN_VERIFICATION=True,
+                     SECURITY_TOKEN_FORMAT='hmac-v2')
+class TestVerifyAuthTokens:
+    def test_verifies_tokens(self, verify, user, admin):
+        r = verify([user.get_auth_token(), 'invalid', admin.get_auth_token()])
+        assert r.status_code == 200
+        assert r.json['results'] == [
+            {'user_id': user.id, 'roles': sorted(user.role_names),
+             'expires_at': None},
+            None,
+            {'user_id': admin.id, 'roles': sorted(admin.role_names),
+             'expires_at': None},
+        ]
+
+    def test_api_key_required(self, verify, user):
+        r = verify([user.get_auth_token()], headers={})
+        assert r.status_code == 401
+
+        r = verify([user.get_auth_token()],
+                   headers={'Authentication-Token': user.get_auth_token()})
+        assert r.status_code == 401
+
+    def test_accepts_an_object(self, verify, user):
+        r = verify({'tokens': [user.get_auth_token()]})
+        assert r.status_code == 200
+        assert r.json['results'][0]['user_id'] == user.id
+
+    @pytest.mark.options(SECURITY_TOKEN_MAX_AGE=3600)
+    def test_expires_at(self, verify, user, security):
+        token = user.get_auth_token()
+        _, signed_at = security.remember_token_serializer.loads(
+            token, return_timestamp=True)
+
+        r = verify([token])
+        assert r.json['results'][0]['expires_at'] == int(signed_at.timestamp()) + 3600
+
+    def test_loads_users_in_one_query(self, db, verify, user, admin, count_queries):
+        tokens = [user.get_auth_token(), admin.get_auth_token()] * 3
+        db.session.expunge_all()
+
+        with count_queries() as authentication_statements:
+            assert verify([]).status_code == 200
+        db.session.expunge_all()
+
+        with count_queries() as statements:
+            r = verify(tokens)
+        assert r.status_code == 200
+        assert [result['user_id'] for result in r.json['results']] == \
+            [user.id, admin.id] * 3
+        assert len(statements) == len(authentication_statements) + 1, statements
+
+    def test_invalidated_token(self, verify, user, security_service):
+        token = user.get_auth_token()
+        security_service.change_password(user, 'new password', send_email=False)
+
+        r = verify([token])
+        assert r.json['results'] == [None]
+
+    def test_bad_request(self, verify):
+        r = verify({'token': 'invalid'})
+        assert r.status_code == 400
+
+    @pytest.mark.options(SECURITY_BATCH_TOKEN_VERIFICATION_MAX_SIZE=2)
+    def test_too_many_tokens(self, verify, user):
+        r = verify([user.get_auth_token()] * 3)
+        assert r.status_code == 413